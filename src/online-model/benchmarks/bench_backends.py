@@ -0,0 +1,53 @@
+"""
+Cold start and per-call CPU latency of StepByStepPredictor backends across batch sizes.
+The checkpoint has to be exported first:
+    python -m cobot_ml.export <model_file> --window-length 50
+Run from src/online-model:
+    python -m benchmarks.bench_backends <model_file> --window-length 50
+"""
+import argparse
+import time
+import timeit
+
+import numpy as np
+import torch
+
+from cobot_ml import export
+from cobot_ml.inference_utilities import StepByStepPredictor
+
+
+def per_call_ms(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model_file")
+    parser.add_argument("--window-length", type=int, default=None)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--threads", type=int, default=1, help="Torch intra-op threads, DS1_v2 has a single vCPU")
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+
+    reference = torch.load(args.model_file, map_location="cpu")
+    window_length, features_count = export.input_size(reference, args.window_length)
+    columns = [str(idx) for idx in range(features_count)]
+
+    print(f"{'backend':>12} {'load [ms]':>10} " + " ".join(f"{f'B={b} [ms]':>12}" for b in args.batch_sizes))
+    for backend in (export.Backends.TORCH, export.Backends.TORCHSCRIPT, export.Backends.ONNX):
+        tick = time.perf_counter()
+        predictor = StepByStepPredictor(
+            export.exported_model_path(args.model_file, backend), "cpu", columns, lambda x: x, backend=backend
+        )
+        load_ms = (time.perf_counter() - tick) * 1e3
+        latencies = []
+        for batch_size in args.batch_sizes:
+            input_data = np.random.default_rng(0).normal(size=(batch_size, window_length, features_count))
+            input_data = input_data.astype(np.float32)
+            predictor.step(input_data)  # warm-up, TorchScript optimizes on the first calls
+            latencies.append(per_call_ms(lambda: predictor.step(input_data), number=max(5, 200 // batch_size)))
+        print(f"{backend:>12} {load_ms:>10.1f} " + " ".join(f"{latency:>12.3f}" for latency in latencies))
+
+
+if __name__ == "__main__":
+    main()
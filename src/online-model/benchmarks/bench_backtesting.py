@@ -0,0 +1,44 @@
+"""
+Wall time of a TimeSeriesSplit backtest of a small LSTM, folds run sequentially vs in worker processes.
+Speedup is bounded by the number of cores, a 10-fold backtest on a 32 core machine
+should take about as long as its longest fold.
+Run from src/online-model:
+    python -m benchmarks.bench_backtesting [--splits 4] [--workers 4]
+"""
+import argparse
+import functools
+
+import numpy as np
+
+from cobot_ml import models
+from cobot_ml.data.utilities import DsMode, prepare_dataset
+from cobot_ml.evaluation.model_selection import TimeSeriesSplit
+from cobot_ml.training.backtesting import TrainingConfig, run_backtest
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--splits", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--samples", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    time_steps = np.arange(args.samples)
+    values = np.column_stack([np.sin(time_steps / 50), rng.normal(size=(args.samples, 3))]).astype(np.float32)
+    model_factory = functools.partial(models.LSTM, features_count=4, hidden_size=32, forecast_length=5)
+    prepare_dataset_fn = functools.partial(prepare_dataset, input_steps=30, output_steps=5, ds_mode=DsMode.WITH_MPC)
+    config = TrainingConfig(number_of_epochs=2, patience=2)
+
+    for workers in (1, args.workers):
+        result = run_backtest(
+            values, TimeSeriesSplit(n_splits=args.splits), model_factory, prepare_dataset_fn, config,
+            max_workers=workers,
+        )
+        longest_fold = max(fold.total_time for fold in result.folds)
+        print(f"workers={workers}: wall {result.wall_time:.1f} s, longest fold {longest_fold:.1f} s, "
+              f"speedup {result.speedup:.2f}x, mae {result.summary()['mae']['mean']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
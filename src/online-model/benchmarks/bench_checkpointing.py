@@ -0,0 +1,52 @@
+"""
+Time the training loop is blocked per checkpoint: synchronous torch.save of deep copied state
+vs AsyncCheckpointer.save (CPU copy only, serialisation on a background thread).
+Run from src/online-model:
+    python -m benchmarks.bench_checkpointing
+"""
+import copy
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from cobot_ml import models
+from cobot_ml.training.checkpointing import AsyncCheckpointer
+
+
+def training_state(model: torch.nn.Module, optimizer: torch.optim.Optimizer) -> dict:
+    return {"model": model.state_dict(), "optimizer": optimizer.state_dict(), "train_logs": {"valid_loss": [0.1] * 100}}
+
+
+def main():
+    for hidden_size in (80, 512):
+        model = models.LSTM(features_count=24, hidden_size=hidden_size, n_layers=2, forecast_length=10)
+        optimizer = torch.optim.Adam(model.parameters())
+        model(torch.randn(8, 50, 24)).sum().backward()
+        optimizer.step()
+
+        with tempfile.TemporaryDirectory() as directory:
+            sync_path = os.path.join(directory, "sync.pt")
+            sync_timings = []
+            for _ in range(10):
+                tick = time.perf_counter()
+                torch.save(copy.deepcopy(training_state(model, optimizer)), sync_path)
+                sync_timings.append(time.perf_counter() - tick)
+
+            async_timings = []
+            with AsyncCheckpointer(directory) as checkpointer:
+                for _ in range(10):
+                    checkpointer.wait()  # an epoch of training would normally pass here
+                    tick = time.perf_counter()
+                    checkpointer.save(training_state(model, optimizer))
+                    async_timings.append(time.perf_counter() - tick)
+            size_mb = os.path.getsize(checkpointer.path) / 2 ** 20
+
+        print(f"hidden_size={hidden_size} ({size_mb:.1f} MB): loop blocked {np.median(sync_timings) * 1e3:.1f} ms "
+              f"sync vs {np.median(async_timings) * 1e3:.1f} ms async")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+DataLoader throughput of the list-backed TensorPairsDataset vs ContiguousTensorPairsDataset.
+Run from src/online-model:
+    python -m benchmarks.bench_dataloader
+"""
+import time
+
+import numpy as np
+import torch
+from torch.utils import data
+
+from cobot_ml.data import patchers
+from cobot_ml.data.datasets import ContiguousTensorPairsDataset, TensorPairsDataset, windows_to_tensors
+
+SAMPLES = 100_000
+FEATURES = 56
+INPUT_STEPS = 50
+OUTPUT_STEPS = 10
+BATCH_SIZE = 256
+
+
+def samples_per_second(loader: data.DataLoader) -> float:
+    tick = time.perf_counter()
+    count = sum(len(X) for X, _ in loader)
+    return count / (time.perf_counter() - tick)
+
+
+def main():
+    values = np.random.default_rng(0).normal(size=(SAMPLES, FEATURES)).astype(np.float32)
+    windows = patchers.window_view(values, INPUT_STEPS + OUTPUT_STEPS, stride=1)
+
+    tick = time.perf_counter()
+    patches = [torch.from_numpy(patch) for patch in patchers.patch_with_stride(values, INPUT_STEPS + OUTPUT_STEPS, 1)]
+    listed = TensorPairsDataset(
+        [patch[:INPUT_STEPS, 1:] for patch in patches], [patch[INPUT_STEPS:, 0] for patch in patches]
+    )
+    listed_build = time.perf_counter() - tick
+
+    tick = time.perf_counter()
+    contiguous = ContiguousTensorPairsDataset(*windows_to_tensors(windows, INPUT_STEPS, slice(1, None)))
+    contiguous_build = time.perf_counter() - tick
+
+    tick = time.perf_counter()
+    listed_targets = listed.get_unraveled_targets()
+    listed_unravel = time.perf_counter() - tick
+    tick = time.perf_counter()
+    contiguous_targets = contiguous.get_unraveled_targets()
+    contiguous_unravel = time.perf_counter() - tick
+    assert torch.equal(listed_targets, contiguous_targets)
+
+    print(f"{'dataset / loader':>36} {'build [s]':>10} {'unravel [s]':>12} {'samples/s':>12}")
+    rows = [
+        ("TensorPairsDataset / DataLoader", listed_build, listed_unravel,
+         data.DataLoader(listed, batch_size=BATCH_SIZE, shuffle=True)),
+        ("Contiguous / DataLoader", contiguous_build, contiguous_unravel,
+         data.DataLoader(contiguous, batch_size=BATCH_SIZE, shuffle=True)),
+        ("Contiguous / batch_loader", contiguous_build, contiguous_unravel,
+         contiguous.batch_loader(BATCH_SIZE, shuffle=True)),
+    ]
+    for name, build, unravel, loader in rows:
+        print(f"{name:>36} {build:>10.3f} {unravel:>12.3f} {samples_per_second(loader):>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+All forecasting metrics for many (model, channel, horizon) series: independent METRICS functions
+vs ForecastEvaluator with shared intermediates, per series and on stacked 2-D inputs.
+Run from src/online-model:
+    python -m benchmarks.bench_forecasting_metrics
+"""
+import time
+
+import numpy as np
+
+from cobot_ml.evaluation.forecasting_metrics import METRICS, ForecastEvaluator
+
+
+def timed(fn):
+    tick = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - tick
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'series':>7} {'length':>7} {'functions [s]':>14} {'evaluator [s]':>14} {'stacked [s]':>12} "
+          f"{'max rel diff':>13}")
+    for series_count, length in ((1000, 200), (200, 5000)):
+        actual = rng.normal(300, 70, size=(series_count, length))
+        predicted = actual + rng.normal(0, 10, size=(series_count, length))
+
+        independent, functions_s = timed(lambda: [
+            {name: metric(a, p) for name, metric in METRICS.items()} for a, p in zip(actual, predicted)
+        ])
+        _, evaluator_s = timed(lambda: [ForecastEvaluator(a, p).evaluate() for a, p in zip(actual, predicted)])
+        stacked, stacked_s = timed(lambda: ForecastEvaluator(actual, predicted).evaluate())
+
+        max_diff = max(
+            np.max(np.abs(stacked[name] - expected) / (np.abs(expected) + 1e-12))
+            for name in METRICS
+            for expected in [np.array([scores[name] for scores in independent])]
+        )
+        print(f"{series_count:>7} {length:>7} {functions_s:>14.3f} {evaluator_s:>14.3f} {stacked_s:>12.3f} "
+              f"{max_diff:>13.1e}")
+
+
+if __name__ == "__main__":
+    main()
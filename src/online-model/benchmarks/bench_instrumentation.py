@@ -0,0 +1,98 @@
+"""
+Stage latency breakdown of mpc_300_score.run under a stream of requests, as dumped for a local scraper,
+and the overhead of recording it.
+A randomly initialised LSTM stands in for the deployed checkpoint.
+Run from src/online-model:
+    python -m benchmarks.bench_instrumentation
+"""
+import contextlib
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from cobot_ml import models
+from cobot_ml.inference_utilities import WindowEncodings, encode_window
+from cobot_ml.instrumentation import METRICS, Formats, Stages
+
+MODEL_FILE = "model/with_MPC_no_weight_weighted_normal_up_to_300_model=LSTM,layers=2,forecast=10,input_length=50.pt"
+
+
+def make_requests(rng, count: int, features_count: int):
+    requests = []
+    for idx in range(count):
+        batch_size = 1 if idx % 4 else 8
+        windows = 331 + rng.normal(0, 50, (batch_size, 50, features_count))
+        encoding = WindowEncodings.JSON if idx % 2 else WindowEncodings.F32
+        requests.append({"record": [{"data": encode_window(windows, encoding)}], "encoding": encoding})
+    return requests
+
+
+def serve(score, requests) -> np.ndarray:
+    latencies = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for request in requests:
+            tick = time.perf_counter()
+            score.run(request)
+            latencies.append(time.perf_counter() - tick)
+    return np.array(latencies) * 1e3
+
+
+def main():
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(0)
+
+    tick = time.perf_counter()
+    for _ in range(100_000):
+        with METRICS.stage("overhead"):
+            pass
+    print(f"Recording a stage: {(time.perf_counter() - tick) / 100_000 * 1e6:.2f} us")
+    METRICS.reset()
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        os.makedirs(os.path.join(model_dir, "model"))
+        import mpc_300_score as score
+        model = models.LSTM(features_count=len(score.selected_columns), forecast_length=10, n_layers=2)
+        torch.save(model, os.path.join(model_dir, MODEL_FILE))
+        dump_path = os.path.join(model_dir, "metrics.prom")
+        os.environ.update({
+            "AZUREML_MODEL_DIR": model_dir,
+            "COBOT_METRICS_DUMP_PATH": dump_path,
+            "COBOT_METRICS_DUMP_INTERVAL_S": "0.2",
+            "COBOT_METRICS_FORMAT": Formats.PROMETHEUS,
+        })
+        score.init()
+        requests = make_requests(rng, 400, len(score.selected_columns))
+
+        METRICS.enabled = False
+        disabled = serve(score, requests)
+        METRICS.enabled = True
+        METRICS.reset()
+        enabled = serve(score, requests)
+        time.sleep(0.5)
+        METRICS.stop_periodic_dump()
+        with open(dump_path) as dump_file:
+            dumped = dump_file.read()
+
+    print(f"Request p50 / p99: {np.percentile(disabled, 50):.3f} / {np.percentile(disabled, 99):.3f} ms without "
+          f"metrics, {np.percentile(enabled, 50):.3f} / {np.percentile(enabled, 99):.3f} ms with metrics")
+    print(f"{'stage':>18} {'count':>6} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    stages = METRICS.to_json()["stages"]
+    for stage in (Stages.REQUEST, Stages.DECODE, Stages.ARRAY_BUILD, Stages.PREPROCESSING,
+                  Stages.TENSOR_CONVERSION, Stages.FORWARD, Stages.POSTPROCESSING):
+        summary = stages.get(stage, {"count": 0})
+        if summary["count"] == 0:
+            print(f"{stage:>18} {0:>6}")
+            continue
+        print(f"{stage:>18} {summary['count']:>6} {summary['mean_ms']:>8.3f} {summary['p50_ms']:>8.3f} "
+              f"{summary['p99_ms']:>8.3f} {summary['max_ms']:>8.3f}")
+    print(f"Counters: {METRICS.to_json()['counters']}")
+    print("Dumped Prometheus metrics (excerpt):")
+    print("\n".join(line for line in dumped.splitlines() if 'stage="forward"' in line or "_total" in line))
+
+
+if __name__ == "__main__":
+    main()
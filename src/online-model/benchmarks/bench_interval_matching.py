@@ -0,0 +1,43 @@
+"""
+Timing of searchsorted interval matching in KPBeginDifferencesForTP and get_group_*
+against the former nested / per-window loops (reference implementations and their parity
+tests are in tests/test_interval_matching.py).
+Run from src/online-model:
+    python -m benchmarks.bench_interval_matching
+"""
+import time
+
+import numpy as np
+
+from cobot_ml.decorators import ValidationLevels, validation_level
+from cobot_ml.utilities import get_windows_limits_idxs
+from tests.test_interval_matching import KP_METRICS, PAIRS, reference_kp_begin_differences
+
+
+def timed(fn) -> float:
+    tick = time.perf_counter()
+    fn()
+    return time.perf_counter() - tick
+
+
+def main():
+    rng = np.random.default_rng(0)
+    # long true windows vs a noisy detector emitting tens of thousands of short windows
+    samples_count = 1_000_000
+    y_true = np.repeat(rng.random(samples_count // 200) < 0.3, 200).astype(int)
+    y_pred = (rng.random(samples_count) < 0.05).astype(int)
+    print(f"true windows {len(get_windows_limits_idxs(y_true)[0])}, "
+          f"predicted windows {len(get_windows_limits_idxs(y_pred)[0])}")
+    print(f"{'metric':>12} {'reference [s]':>14} {'vectorized [s]':>15}")
+    metric = KP_METRICS["kp const"]
+    rows = [(name, lambda r=reference: r(y_true, y_pred), lambda v=vectorized: v(y_true, y_pred))
+            for name, (reference, vectorized) in PAIRS.items()]
+    rows.append(("kp const", lambda: reference_kp_begin_differences(metric, y_true, y_pred),
+                 lambda: metric(y_true, y_pred)))
+    with validation_level(ValidationLevels.OFF):
+        for name, reference, vectorized in rows:
+            print(f"{name:>12} {timed(reference):>14.3f} {timed(vectorized):>15.4f}")
+
+
+if __name__ == "__main__":
+    main()
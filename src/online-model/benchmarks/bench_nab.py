@@ -0,0 +1,78 @@
+"""
+NABScore on long label series with thousands of anomaly windows:
+vectorized implementation vs the former per-index Python loops (kept below as reference).
+Run from src/online-model:
+    python -m benchmarks.bench_nab [--reference-max-samples 10000000]
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from cobot_ml.decorators import ValidationLevels, validation_level
+from cobot_ml.evaluation.metrics import NABScore
+from cobot_ml.utilities import get_windows_limits_idxs
+
+
+def reference_score(nab: NABScore, y_true: np.ndarray, y_pred: np.ndarray) -> float:
+    starts, stops = get_windows_limits_idxs(y_true)
+    position_weights = np.array([-1.0 for _ in y_true])
+    for start, stop in zip(starts, stops):
+        length = stop - start
+        for idx in range(start, min(stop + 3 * length, len(y_true))):
+            position_weights[idx] = nab.position_weight(nab.calculate_relative_position(idx, length, start))
+
+    true_positives = np.zeros_like(y_pred)
+    false_positives = y_pred.copy()
+    false_negatives = np.zeros_like(y_pred)
+    for start, stop in zip(starts, stops):
+        detections = np.where(y_pred[start: stop + 1] == 1)[0]
+        if len(detections) > 0:
+            true_positives[start + detections[0]] = 1
+        else:
+            false_negatives[(start + stop) // 2] = 1
+        false_positives[start: stop + 1] = 0
+
+    scores = true_positives * position_weights * nab.weight_tp + false_positives * position_weights * nab.weight_fp
+    scores -= false_negatives * nab.weight_fn
+    probationary_length = min(math.floor(nab.probationary_percent * len(y_true)), nab.MAX_PROBATIONARY_LENGTH)
+    return scores[probationary_length:].sum()
+
+
+def labels(rng: np.random.Generator, samples_count: int, windows_count: int, max_window_length: int) -> np.ndarray:
+    y = np.zeros(samples_count, dtype=int)
+    for start in rng.choice(samples_count - max_window_length, windows_count, replace=False):
+        y[start: start + rng.integers(1, max_window_length)] = 1
+    return y
+
+
+def timed(fn):
+    tick = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - tick
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--reference-max-samples", type=int, default=10_000_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    nab = NABScore()
+    print(f"{'samples':>10} {'windows':>8} {'reference [s]':>14} {'vectorized [s]':>15} {'|diff|':>9}")
+    for samples_count, windows_count in ((100_000, 500), (1_000_000, 2_000), (10_000_000, 5_000)):
+        y_true = labels(rng, samples_count, windows_count, 200)
+        y_pred = labels(rng, samples_count, windows_count * 4, 20)
+        with validation_level(ValidationLevels.OFF):
+            score, vectorized_s = timed(lambda: nab(y_true, y_pred))
+            if samples_count <= args.reference_max_samples:
+                expected, reference_s = timed(lambda: reference_score(nab, y_true, y_pred))
+                reference, difference = f"{reference_s:.2f}", f"{abs(score - expected):.1e}"
+            else:
+                reference, difference = "-", "-"
+        print(f"{samples_count:>10} {windows_count:>8} {reference:>14} {vectorized_s:>15.3f} {difference:>9}")
+
+
+if __name__ == "__main__":
+    main()
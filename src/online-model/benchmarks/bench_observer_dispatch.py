@@ -0,0 +1,76 @@
+"""
+MovingStdDetector.predict latency with a slow observer (e.g. a database write) called synchronously
+in publish vs delivered by AsyncDispatcher with each backpressure policy.
+Run from src/online-model:
+    python -m benchmarks.bench_observer_dispatch
+"""
+import time
+
+import numpy as np
+
+from cobot_ml.detectors import MovingStdDetector
+from cobot_ml.observer import AsyncDispatcher, BackpressurePolicies
+
+
+def slow_observer(**attrs):
+    time.sleep(0.002)
+
+
+def run(detector, signals):
+    latencies = []
+    for X in signals:
+        tick = time.perf_counter()
+        detector.predict(X)
+        latencies.append(time.perf_counter() - tick)
+        # detector called at the pace of incoming requests
+        time.sleep(0.001)
+    return np.array(latencies) * 1e3
+
+
+def make_detector():
+    detector = MovingStdDetector(50, 0.5, 2.0)
+    detector.add_observer(MovingStdDetector.PublishedEvents.publish_stds, slow_observer)
+    detector.add_observer(MovingStdDetector.PublishedEvents.publish_detections, slow_observer)
+    return detector
+
+
+def check_delivery():
+    received, batches = [], []
+    with AsyncDispatcher(max_queue_size=8, policy=BackpressurePolicies.BLOCK, max_batch_size=16) as dispatcher:
+        detector = MovingStdDetector(5, 0.5, 2.0)
+        detector.set_dispatcher(dispatcher)
+        detector.add_observer(MovingStdDetector.PublishedEvents.publish_detections,
+                              lambda detections: received.append(detections))
+        detector.add_observer(MovingStdDetector.PublishedEvents.publish_stds, batches.append, batched=True)
+        expected = [detector.predict(np.random.normal(size=(100, 1))) for _ in range(200)]
+        dispatcher.flush()
+        stats = dispatcher.stats()
+    assert len(received) == len(expected), "events lost"
+    assert all(a is b for a, b in zip(received, expected)), "events reordered"
+    assert sum(len(batch) for batch in batches) == len(expected), "batched observer missed events"
+    assert stats.dropped == 0 and stats.failed == 0
+    print(f"block policy: {stats.delivered} events delivered in order, "
+          f"batched observer called {len(batches)} times, max queue depth {stats.max_queue_depth}")
+
+
+def main():
+    check_delivery()
+    signals = [np.random.normal(size=(2_000, 1)) for _ in range(300)]
+    print(f"{'dispatch':>24} {'p50 ms':>7} {'p99 ms':>7} {'max ms':>7} {'delivered':>9} {'dropped':>7} "
+          f"{'observer s':>10}")
+    latencies = run(make_detector(), signals)
+    print(f"{'synchronous':>24} {np.percentile(latencies, 50):>7.3f} {np.percentile(latencies, 99):>7.3f} "
+          f"{latencies.max():>7.3f} {2 * len(signals):>9} {0:>7} {'-':>10}")
+    for policy in (BackpressurePolicies.DROP_NEWEST, BackpressurePolicies.DROP_OLDEST, BackpressurePolicies.BLOCK):
+        with AsyncDispatcher(max_queue_size=64, policy=policy) as dispatcher:
+            detector = make_detector()
+            detector.set_dispatcher(dispatcher)
+            latencies = run(detector, signals)
+            dispatcher.flush()
+            stats = dispatcher.stats()
+        print(f"{'async ' + policy:>24} {np.percentile(latencies, 50):>7.3f} {np.percentile(latencies, 99):>7.3f} "
+              f"{latencies.max():>7.3f} {stats.delivered:>9} {stats.dropped:>7} {stats.observer_time:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Online detectors fed message by message through DetectorMultiplexer, with messages of many AGVs
+interleaved: parity with batch predict of each AGV signal, cost per message and memory held
+as the stream grows.
+Run from src/online-model:
+    python -m benchmarks.bench_online_detectors
+"""
+import functools
+import time
+import tracemalloc
+
+import numpy as np
+
+from cobot_ml.detectors import AllowedValuesDetector, DetectorMultiplexer, MinMaxDetector, MovingStdDetector
+
+EXPECTED_SEGMENTS = [4, 7, 9, 10, 12, 15, 16, 19, 20, 23, 24, 27, 36, 39, 41, 42, 44, 47, 48, 51, 52, 55, 56, 59, 60, 63]
+
+DETECTORS = {
+    "MinMaxDetector": functools.partial(MinMaxDetector, 250.0, 420.0),
+    "MovingStdDetector(50)": functools.partial(MovingStdDetector, 50, 1.0, 40.0),
+    "MovingStdDetector(500)": functools.partial(MovingStdDetector, 500, 1.0, 40.0),
+    "AllowedValuesDetector": functools.partial(AllowedValuesDetector, EXPECTED_SEGMENTS),
+}
+
+
+def make_stream(rng, messages_count: int, agv_count: int):
+    agv_ids = rng.integers(0, agv_count, messages_count)
+    values = 331 + 74 * np.sin(np.arange(messages_count) / 5000) + rng.normal(0, 8, messages_count)
+    values[rng.integers(0, messages_count, messages_count // 1000)] *= 3
+    return agv_ids, values
+
+
+def check_parity(rng, name, factory):
+    agv_ids, values = make_stream(rng, 50_000, 20)
+    if name == "AllowedValuesDetector":
+        values = rng.integers(0, 64, len(values)).astype(float)
+    detections = DetectorMultiplexer(factory).update_many(agv_ids, values)
+    for agv_id in np.unique(agv_ids):
+        is_agv = agv_ids == agv_id
+        expected = factory().predict(values[is_agv][:, None])
+        assert np.array_equal(detections[is_agv], expected), f"{name} differs from predict for AGV {agv_id}"
+
+
+def main():
+    rng = np.random.default_rng(0)
+    messages_count, agv_count = 1_000_000, 200
+    agv_ids, values = make_stream(rng, messages_count, agv_count)
+    # plain Python objects, as messages decoded from JSON
+    agv_ids, values = agv_ids.tolist(), values.tolist()
+
+    print(f"{messages_count} messages of {agv_count} AGVs")
+    print(f"{'detector':>23} {'parity':>6} {'us/message':>10} {'memory after 10%':>17} {'after 100%':>11}")
+    for name, factory in DETECTORS.items():
+        check_parity(rng, name, factory)
+        multiplexer = DetectorMultiplexer(factory)
+        update = multiplexer.update
+        tracemalloc.start()
+        for index, (agv_id, value) in enumerate(zip(agv_ids, values)):
+            update(agv_id, value)
+            if index == messages_count // 10:
+                memory_early = tracemalloc.get_traced_memory()[0]
+        memory_late = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        multiplexer = DetectorMultiplexer(factory)
+        update = multiplexer.update
+        tick = time.perf_counter()
+        for agv_id, value in zip(agv_ids, values):
+            update(agv_id, value)
+        elapsed = time.perf_counter() - tick
+        print(f"{name:>23} {'ok':>6} {elapsed / messages_count * 1e6:>10.2f} {memory_early / 1e3:>14.0f} kB "
+              f"{memory_late / 1e3:>8.0f} kB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+Per-call latency of the MPC preprocessing: StandardScaler path vs fused AffinePreprocessor.
+Run from src/online-model:
+    python -m benchmarks.bench_preprocessing
+"""
+import timeit
+
+import numpy as np
+
+from mpc_300_score import Preprocessor
+
+
+def per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    preprocessor = Preprocessor()
+    rng = np.random.default_rng(0)
+    mean = preprocessor.scaler.mean_
+    scale = preprocessor.scaler.scale_
+
+    print(f"{'batch':>6} {'scaler [us]':>12} {'affine [us]':>12} {'speedup':>8} {'max |diff|':>11}")
+    for batch_size in (1, 8, 64):
+        input_data = rng.normal(mean, scale, size=(batch_size, 50, len(mean)))
+        reference = preprocessor.scaler_preprocessing(input_data).astype(np.float32)
+        fused = preprocessor.preprocessing(input_data)
+        max_diff = np.abs(reference - fused).max()
+
+        number = max(100, 20000 // batch_size)
+        scaler_us = per_call_us(lambda: preprocessor.scaler_preprocessing(input_data), number)
+        affine_us = per_call_us(lambda: preprocessor.preprocessing(input_data), number)
+        print(f"{batch_size:>6} {scaler_us:>12.1f} {affine_us:>12.1f} {scaler_us / affine_us:>7.1f}x {max_diff:>11.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+"""
+Decode cost and payload size of the request encodings accepted by the MPC scoring scripts.
+Run from src/online-model:
+    python -m benchmarks.bench_request_decoding
+"""
+import timeit
+
+import numpy as np
+
+from cobot_ml.inference_utilities import WindowEncodings, encode_window, records_to_windows
+
+HISTORY_LENGTH = 50
+FEATURE_COUNT = 56
+
+
+def per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'windows':>8} {'encoding':>9} {'payload [B]':>12} {'decode [us]':>12}")
+    for window_count in (1, 16):
+        windows = rng.normal(size=(window_count, HISTORY_LENGTH, FEATURE_COUNT)) * 1000
+        for encoding in (WindowEncodings.JSON, WindowEncodings.F32, WindowEncodings.NPY):
+            if encoding == WindowEncodings.JSON:
+                # formatPredictionPayload sends one JSON window per record
+                records = [{"data": encode_window(window, encoding)} for window in windows]
+            else:
+                records = [{"data": encode_window(windows, encoding)}]
+            payload_size = sum(len(record["data"]) for record in records)
+            decode_us = per_call_us(
+                lambda: records_to_windows(records, HISTORY_LENGTH, FEATURE_COUNT, encoding), number=200
+            )
+            print(f"{window_count:>8} {encoding:>9} {payload_size:>12} {decode_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
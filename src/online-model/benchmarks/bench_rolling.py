@@ -0,0 +1,81 @@
+"""
+Rolling statistics checks of all MPC signals at once with RollingStatisticsDetector vs a pandas
+pipeline per signal (as MovingStdDetector used to run): parity and throughput.
+Run from src/online-model:
+    python -m benchmarks.bench_rolling
+"""
+import time
+
+import numpy as np
+import pandas as pd
+
+from cobot_ml import rolling
+from cobot_ml.detectors import RollingCheck, RollingStatisticsDetector
+
+CHECKS = [
+    RollingCheck(rolling.Statistics.STD, window_size=50, min=0.5, max=8.0),
+    RollingCheck(rolling.Statistics.ZSCORE, window_size=50, min=-4.0, max=4.0),
+    RollingCheck(rolling.Statistics.MIN, window_size=200, min=-40.0),
+    RollingCheck(rolling.Statistics.MAX, window_size=200, max=40.0),
+    RollingCheck(rolling.Statistics.MEAN, window_size=1000, min=-20.0, max=20.0),
+    RollingCheck(rolling.Statistics.EWMA, min=-15.0, max=15.0, alpha=0.05),
+]
+
+
+def pandas_statistic(series: pd.Series, check: RollingCheck) -> np.ndarray:
+    if check.statistic == rolling.Statistics.EWMA:
+        return series.ewm(alpha=check.alpha, adjust=False).mean().values
+    window = series.rolling(check.window_size)
+    if check.statistic == rolling.Statistics.ZSCORE:
+        return ((series - window.mean()) / window.std()).values
+    return getattr(window, check.statistic)().values
+
+
+def pandas_per_feature(X: np.ndarray) -> np.ndarray:
+    detections = np.zeros(X.shape, dtype=int)
+    for feature in range(X.shape[1]):
+        series = pd.Series(X[:, feature])
+        for check in CHECKS:
+            values = pandas_statistic(series, check)
+            detections[:, feature] |= (values < check.min) | (values > check.max)
+    return detections
+
+
+def make_signals(rng, samples_count: int, features_count: int) -> np.ndarray:
+    X = rng.normal(0, 1, (samples_count, features_count)).cumsum(axis=0) * 0.05
+    X += rng.normal(0, 2, (samples_count, features_count))
+    spikes_count = max(1, samples_count // 400)
+    X[rng.integers(0, samples_count, spikes_count), rng.integers(0, features_count, spikes_count)] += 60
+    return X
+
+
+def main():
+    rng = np.random.default_rng(0)
+    features_count = 56
+    detector = RollingStatisticsDetector(CHECKS)
+    print(f"{features_count} signals, {len(CHECKS)} checks (windows up to 1000)")
+    print(f"{'samples':>8} {'pandas ms':>10} {'engine ms':>10} {'speedup':>8} {'detections':>10} {'mismatches':>10}")
+    for samples_count, repeats in ((1_000, 20), (10_000, 5), (200_000, 1)):
+        X = make_signals(rng, samples_count, features_count)
+        tick = time.perf_counter()
+        for _ in range(repeats):
+            detections = detector.predict_per_feature(X)
+        engine_time = (time.perf_counter() - tick) / repeats
+        tick = time.perf_counter()
+        for _ in range(repeats):
+            expected = pandas_per_feature(X)
+        pandas_time = (time.perf_counter() - tick) / repeats
+        mismatches = int(np.sum(detections != expected))
+        print(f"{samples_count:>8} {pandas_time * 1e3:>10.1f} {engine_time * 1e3:>10.1f} "
+              f"{pandas_time / engine_time:>7.1f}x {int(detections.sum()):>10} {mismatches:>10}")
+
+    X = make_signals(rng, 100_000, features_count)
+    for window_size in (10, 100, 1000, 10000):
+        tick = time.perf_counter()
+        statistics = rolling.RollingStatistics(X, window_size)
+        statistics.std, statistics.min, statistics.max
+        print(f"100000 samples, window {window_size:>5}: std + min + max in {time.perf_counter() - tick:.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+SCINet tree with vectorized interleaving of even / odd sub-series vs the original implementation
+(per node permutes and a Python loop of unsqueezed slices joined with torch.cat): forward latency
+of cobot_ml.models.SCINet and SCINet2. Parity with the original is tested in tests/test_scinet.py.
+Run from src/online-model:
+    python -m benchmarks.bench_scinet
+"""
+import time
+
+import torch
+
+from cobot_ml import models
+from tests.test_scinet import use_reference_tree
+
+
+def measure(model, x, repeats):
+    with torch.no_grad():
+        for _ in range(3):
+            model(x)
+        tick = time.perf_counter()
+        for _ in range(repeats):
+            model(x)
+    return (time.perf_counter() - tick) / repeats * 1e3
+
+
+def main():
+    torch.manual_seed(0)
+    features_count, forecast_length = 24, 10
+    print(f"{'model':>8} {'window':>6} {'batch':>5} {'reference ms':>12} {'vectorized ms':>13} {'speedup':>7}")
+    for model_class in (models.SCINet, models.SCINet2):
+        for window_length, batch_size in ((16, 1), (64, 1), (64, 256), (256, 64)):
+            model = model_class(features_count, forecast_length, window_length).eval()
+            reference = model_class(features_count, forecast_length, window_length).eval()
+            reference.load_state_dict(model.state_dict())
+            use_reference_tree(reference)
+            x = torch.randn(batch_size, window_length, features_count)
+            with torch.no_grad():
+                assert torch.allclose(model(x), reference(x), atol=1e-6), "forward pass mismatch"
+            repeats = max(10, 2000 // batch_size)
+            reference_ms, vectorized_ms = measure(reference, x, repeats), measure(model, x, repeats)
+            print(f"{model_class.__name__:>8} {window_length:>6} {batch_size:>5} {reference_ms:>12.3f} "
+                  f"{vectorized_ms:>13.3f} {reference_ms / vectorized_ms:>6.2f}x")
+
+    model = models.SCINet(features_count, forecast_length, 64).eval()
+    try:
+        traced = torch.jit.trace(model, torch.randn(1, 64, features_count))
+        x = torch.randn(1, 64, features_count)
+        with torch.no_grad():
+            assert torch.allclose(traced(x), model(x), atol=1e-6)
+        print(f"TorchScript (traced) SCINet, window 64, batch 1: {measure(traced, x, 500):.3f} ms")
+    except Exception as err:
+        print(f"TorchScript tracing failed: {err}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Throughput of mpc_300_score.run with the former print logging of every request and payload
+vs queued logging with payloads of a sample of requests (and of all of them), written to a file
+as stdout of a deployment would be. Behaviour of the queued logging is tested in tests/test_scoring_logging.py.
+A randomly initialised LSTM stands in for the deployed checkpoint.
+Run from src/online-model:
+    python -m benchmarks.bench_scoring_logging
+"""
+import contextlib
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from cobot_ml import models, scoring_logging
+from cobot_ml.inference_utilities import records_to_windows
+from benchmarks.bench_instrumentation import MODEL_FILE, make_requests
+
+
+def legacy_run(score, Inputs):
+    # logging of the scoring script before queued logging
+    print("Received request")
+    print("Received raw data")
+    print(Inputs)
+    input_data, decoded = records_to_windows(Inputs["record"], history_length=50,
+                                             feature_count=len(score.selected_columns), encoding=Inputs["encoding"])
+    print("Input data")
+    print(input_data)
+    output_data = score.model_wrapper.step(input_data[decoded])
+    print(output_data[:, 0])
+    print("Finished")
+    return ((output_data[:, 0] * 73.6188028) + 331.105838).tolist()
+
+
+def serve(run, requests, log_path) -> float:
+    with open(log_path, "w") as log_file, contextlib.redirect_stdout(log_file):
+        tick = time.perf_counter()
+        for request in requests:
+            run(request)
+        return len(requests) / (time.perf_counter() - tick)
+
+
+def main():
+    torch.manual_seed(0)
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        os.makedirs(os.path.join(model_dir, "model"))
+        import mpc_300_score as score
+        model = models.LSTM(features_count=len(score.selected_columns), forecast_length=10, n_layers=2)
+        torch.save(model, os.path.join(model_dir, MODEL_FILE))
+        os.environ["AZUREML_MODEL_DIR"] = model_dir
+        os.environ["COBOT_METRICS"] = "0"
+        score.init()
+        requests = make_requests(rng, 400, len(score.selected_columns))
+        log_path = os.path.join(model_dir, "stdout.log")
+
+        print(f"{'logging':>28} {'requests/s':>10} {'log MB':>7}")
+        throughput = serve(lambda request: legacy_run(score, request), requests, log_path)
+        print(f"{'print every payload':>28} {throughput:>10.1f} {os.path.getsize(log_path) / 1e6:>7.2f}")
+        for name, sample_rate, format in (("queued, 1% payloads", 0.01, scoring_logging.LogFormats.TEXT),
+                                          ("queued json, 1% payloads", 0.01, scoring_logging.LogFormats.JSON),
+                                          ("queued, every payload", 1.0, scoring_logging.LogFormats.TEXT)):
+            random.seed(0)
+            with open(log_path, "w") as log_file:
+                score.request_logging = scoring_logging.configure(sample_rate=sample_rate, format=format,
+                                                                  stream=log_file)
+                throughput = serve(score.run, requests, os.devnull)
+                score.request_logging.close()
+            print(f"{name:>28} {throughput:>10.1f} {os.path.getsize(log_path) / 1e6:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
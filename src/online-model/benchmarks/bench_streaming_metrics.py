@@ -0,0 +1,48 @@
+"""
+Streaming forecasting metrics fed in chunks vs batch forecasting_metrics on the whole series:
+accuracy, throughput and memory held by the accumulator.
+Run from src/online-model:
+    python -m benchmarks.bench_streaming_metrics
+"""
+import time
+
+import numpy as np
+
+from cobot_ml.evaluation import forecasting_metrics
+from cobot_ml.evaluation.streaming_metrics import KeyedStreamingMetrics, StreamingForecastMetrics
+
+
+def main():
+    rng = np.random.default_rng(0)
+    samples_count, chunk_size = 5_000_000, 10_000
+    actual = 331 + 74 * np.sin(np.arange(samples_count) / 500) + rng.normal(0, 5, samples_count)
+    predicted = actual + rng.normal(0, 8, samples_count)
+
+    accumulator = StreamingForecastMetrics()
+    tick = time.perf_counter()
+    for start in range(0, samples_count, chunk_size):
+        accumulator.update(actual[start: start + chunk_size], predicted[start: start + chunk_size])
+    elapsed = time.perf_counter() - tick
+    snapshot = accumulator.snapshot()
+
+    print(f"{samples_count} samples in chunks of {chunk_size}: {samples_count / elapsed / 1e6:.1f} M samples/s, "
+          f"sketch buckets {len(accumulator.abs_error_sketch.buckets)} + "
+          f"{len(accumulator.abs_percentage_error_sketch.buckets)}")
+    print(f"{'metric':>7} {'batch':>14} {'streaming':>14} {'rel diff':>9}")
+    for name in ("me", "mae", "mse", "rmse", "mpe", "mape", "smape", "mase", "mdae", "mdape"):
+        expected = forecasting_metrics.METRICS[name](actual, predicted)
+        print(f"{name:>7} {expected:>14.6g} {snapshot[name]:>14.6g} "
+              f"{abs(snapshot[name] - expected) / abs(expected):>9.1e}")
+
+    keyed = KeyedStreamingMetrics()
+    agv_ids = rng.integers(0, 50, samples_count // chunk_size)
+    tick = time.perf_counter()
+    for agv_id, start in zip(agv_ids, range(0, samples_count, chunk_size)):
+        keyed.update(int(agv_id), actual[start: start + chunk_size], predicted[start: start + chunk_size])
+    total = keyed.total()
+    print(f"{len(keyed.accumulators)} AGVs: {time.perf_counter() - tick:.2f} s, fleet mae {total['mae']:.6g}, "
+          f"mdae {total['mdae']:.6g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Small hyperparameter sweep of LSTM / GRU networks with median stopping, reporting pruned trials,
+dataset builds saved by the per-worker cache and the best trials from the store.
+Run from src/online-model:
+    python -m benchmarks.bench_sweep [--workers 2]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from cobot_ml.data.utilities import DsMode
+from cobot_ml.training import sweep
+from cobot_ml.training.backtesting import TrainingConfig
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--samples", type=int, default=8_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    time_steps = np.arange(args.samples)
+    values = np.column_stack([np.sin(time_steps / 50), rng.normal(size=(args.samples, 3))]).astype(np.float32)
+    trials = sweep.grid(
+        model=["LSTM", "GRU"], n_layers=[1, 2], hidden_size=[8, 32], forecast=[5], input_length=[20, 40]
+    )
+    config = TrainingConfig(number_of_epochs=6, patience=3)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = sweep.SweepStore(os.path.join(directory, "sweeps.sqlite"))
+        tick = time.perf_counter()
+        results = sweep.run_sweep(
+            "bench", values, trials, store, DsMode.WITH_MPC, config, max_workers=args.workers
+        )
+        elapsed = time.perf_counter() - tick
+
+    statuses = [result["status"] for result in results]
+    completed, pruned = statuses.count(sweep.TrialStatus.COMPLETED), statuses.count(sweep.TrialStatus.PRUNED)
+    epochs_run = sum(result["epoch_count"] + 1 for result in results)
+    dataset_keys = {(params["input_length"], params["forecast"]) for params in trials}
+    print(f"{len(trials)} trials in {elapsed:.1f} s with {args.workers} workers: {completed} completed, "
+          f"{pruned} pruned, {epochs_run} of {len(trials) * config.number_of_epochs} epochs run")
+    print(f"datasets built at most {len(dataset_keys) * args.workers} times instead of {len(trials)}")
+    for result in results[:3]:
+        print(f"{result['best_valid_loss']:.5f} {result['name']} hidden_size={result['params']['hidden_size']}")
+
+
+if __name__ == "__main__":
+    main()
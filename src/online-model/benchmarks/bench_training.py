@@ -0,0 +1,66 @@
+"""
+Training throughput of runners.run_training with FastPath switches enabled one by one and all together.
+Run from src/online-model:
+    python -m benchmarks.bench_training [--no-compile]
+"""
+import argparse
+
+import numpy as np
+import torch
+from torch.utils import data
+
+from cobot_ml import models
+from cobot_ml.training import runners
+from cobot_ml.training.runners import FastPath
+
+
+def train(dataset: data.Dataset, fast_path: FastPath, epochs: int):
+    torch.manual_seed(0)
+    model = models.LSTM(features_count=dataset.tensors[0].shape[-1], hidden_size=80, forecast_length=10)
+    _, train_logs = runners.run_training(
+        model,
+        torch.nn.MSELoss(),
+        torch.optim.Adam(model.parameters()),
+        data.DataLoader(dataset, batch_size=256, shuffle=True, pin_memory=fast_path.non_blocking),
+        data.DataLoader(dataset, batch_size=1024),
+        number_of_epochs=epochs,
+        patience=epochs,
+        fast_path=fast_path,
+    )
+    return train_logs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-compile", action="store_true")
+    parser.add_argument("--epochs", type=int, default=3)
+    args = parser.parse_args()
+
+    generator = torch.Generator().manual_seed(0)
+    dataset = data.TensorDataset(
+        torch.randn(16384, 50, 24, generator=generator), torch.randn(16384, 10, generator=generator)
+    )
+    variants = {
+        "eager fp32": FastPath(),
+        "device_loss": FastPath(device_loss=True),
+        "cheap_snapshots": FastPath(cheap_snapshots=True),
+        "bf16_autocast": FastPath(bf16_autocast=True),
+        "non_blocking": FastPath(non_blocking=torch.cuda.is_available()),
+    }
+    if not args.no_compile:
+        variants["compile"] = FastPath(compile=True)
+    variants["all"] = FastPath(
+        compile=not args.no_compile, bf16_autocast=True, non_blocking=torch.cuda.is_available(),
+        device_loss=True, cheap_snapshots=True,
+    )
+
+    results = {name: train(dataset, fast_path, args.epochs) for name, fast_path in variants.items()}
+    print(f"{'variant':>16} {'samples/s':>10} {'final train loss':>17}")
+    for name, train_logs in results.items():
+        # first epoch includes compilation, report the steady state
+        print(f"{name:>16} {np.median(train_logs['samples_per_second'][1:]):>10.0f} "
+              f"{train_logs['train_loss'][-1]:>17.5f}")
+
+
+if __name__ == "__main__":
+    main()
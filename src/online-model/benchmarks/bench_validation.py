@@ -0,0 +1,55 @@
+"""
+Overhead of validation decorators on multi-million-sample label series, per validation level.
+Run from src/online-model:
+    python -m benchmarks.bench_validation
+"""
+import time
+
+import numpy as np
+
+from cobot_ml import decorators
+from cobot_ml.decorators import ValidationLevels, validation_level
+from cobot_ml.evaluation import metrics
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        tick = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - tick)
+    return min(timings)
+
+
+@decorators.accepts_binary_array(input_index=0)
+@decorators.accepts_binary_array(input_index=1)
+@decorators.inputs_have_equal_shapes(0, 1)
+@decorators.returns_binary_array
+def group_stack(y_true: np.ndarray, y_pred: np.ndarray) -> np.ndarray:
+    """
+    Checks stacked as on NABScore.get_true_positives, around a function doing no work.
+    """
+    return y_pred
+
+
+def main():
+    rng = np.random.default_rng(0)
+    levels = (ValidationLevels.FULL, ValidationLevels.CHEAP, ValidationLevels.OFF)
+    print(f"{'samples':>10} {'function':>26} " + " ".join(f"{level + ' [ms]':>11}" for level in levels))
+    for samples_count in (1_000_000, 5_000_000):
+        y_true = (rng.random(samples_count) < 0.01).astype(int)
+        y_pred = (rng.random(samples_count) < 0.01).astype(int)
+        for name, fn in (
+                ("checks only", lambda: group_stack(y_true, y_pred)),
+                ("undecorated", lambda: group_stack.__wrapped__.__wrapped__.__wrapped__.__wrapped__(y_true, y_pred)),
+                ("calculateConfusionMatrix", lambda: metrics.calculateConfusionMatrix(y_true, y_pred)),
+        ):
+            timings = []
+            for level in levels:
+                with validation_level(level):
+                    timings.append(best_of(fn) * 1e3)
+            print(f"{samples_count:>10} {name:>26} " + " ".join(f"{timing:>11.2f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
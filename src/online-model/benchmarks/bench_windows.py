@@ -0,0 +1,78 @@
+"""
+Anomaly window extraction: former element-by-element loop vs np.diff run-length encoding,
+interval masks and the cached_windows evaluation pass.
+Run from src/online-model:
+    python -m benchmarks.bench_windows
+"""
+import time
+
+import numpy as np
+
+from cobot_ml import utilities
+from cobot_ml.decorators import ValidationLevels, validation_level
+from cobot_ml.evaluation import metrics
+
+
+def reference_windows_limits_idxs(y: np.ndarray):
+    anomalies_start = []
+    anomalies_stop = []
+    previous = False
+    for idx, is_anomaly in enumerate(y):
+        if not previous and is_anomaly:
+            anomalies_start.append(idx)
+        elif previous and not is_anomaly:
+            anomalies_stop.append(idx - 1)
+        previous = is_anomaly
+    if previous:
+        anomalies_stop.append(len(y) - 1)
+    return anomalies_start, anomalies_stop
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        tick = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - tick)
+    return min(timings)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'samples':>10} {'operation':>22} {'before [ms]':>12} {'after [ms]':>11}")
+    for samples_count in (1_000_000, 10_000_000):
+        y_true = np.repeat(rng.random(samples_count // 50) < 0.05, 50).astype(int)
+        y_pred = (rng.random(samples_count) < 0.001).astype(int)
+        starts, stops = utilities.get_windows_limits_idxs(y_true)
+        expected = reference_windows_limits_idxs(y_true)
+        assert np.array_equal(starts, expected[0]) and np.array_equal(stops, expected[1])
+
+        ranges = list(zip(starts, stops + 1))
+        assert np.array_equal(
+            utilities.create_01_mask_in_ranges(samples_count, ranges),
+            utilities.create_01_mask_from_intervals(samples_count, starts, stops + 1),
+        )
+
+        def uncached_f1():
+            precision = metrics.Precision()(y_true, y_pred)
+            recall = metrics.Recall()(y_true, y_pred)
+            return precision, recall
+
+        rows = (
+            ("windows limits",
+             lambda: reference_windows_limits_idxs(y_true),
+             lambda: utilities.get_windows_limits_idxs(y_true)),
+            ("mask from intervals",
+             lambda: utilities.create_01_mask_in_ranges(samples_count, ranges),
+             lambda: utilities.create_01_mask_from_intervals(samples_count, starts, stops + 1)),
+            ("f1 uncached / cached",
+             uncached_f1,
+             lambda: metrics.FScore()(y_true, y_pred)),
+        )
+        with validation_level(ValidationLevels.OFF):
+            for name, before, after in rows:
+                print(f"{samples_count:>10} {name:>22} {best_of(before) * 1e3:>12.1f} {best_of(after) * 1e3:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
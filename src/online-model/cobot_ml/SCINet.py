@@ -9,14 +9,16 @@ import numpy as np
 
 
 class Splitting(nn.Module):
+    """Splits the last (time) dimension of B, D, T input into even and odd steps."""
+
     def __init__(self):
         super(Splitting, self).__init__()
 
     def even(self, x):
-        return x[:, ::2, :]
+        return x[..., ::2]
 
     def odd(self, x):
-        return x[:, 1::2, :]
+        return x[..., 1::2]
 
     def forward(self, x):
         '''Returns the odd and even part'''
@@ -104,10 +106,8 @@ class Interactor(nn.Module):
         else:
             (x_even, x_odd) = x
 
+        # x_even, x_odd: B, D, T (the tree works channels first, as convolutions expect)
         if self.modified:
-            x_even = x_even.permute(0, 2, 1)
-            x_odd = x_odd.permute(0, 2, 1)
-
             d = x_odd.mul(torch.exp(self.phi(x_even)))
             c = x_even.mul(torch.exp(self.psi(x_odd)))
 
@@ -117,9 +117,6 @@ class Interactor(nn.Module):
             return (x_even_update, x_odd_update)
 
         else:
-            x_even = x_even.permute(0, 2, 1)
-            x_odd = x_odd.permute(0, 2, 1)
-
             d = x_odd - self.P(x_even)
             c = x_even + self.U(d)
 
@@ -145,7 +142,7 @@ class LevelSCINet(nn.Module):
 
     def forward(self, x):
         (x_even_update, x_odd_update) = self.interact(x)
-        return x_even_update.permute(0, 2, 1), x_odd_update.permute(0, 2, 1)  # even: B, T, D odd: B, T, D
+        return x_even_update, x_odd_update  # even: B, D, T odd: B, D, T
 
 
 class SCINet_Tree(nn.Module):
@@ -168,18 +165,12 @@ class SCINet_Tree(nn.Module):
                                                 INN)
 
     def zip_up_the_pants(self, even, odd):
-        even = even.permute(1, 0, 2)
-        odd = odd.permute(1, 0, 2)  # L, B, D
-        even_len = even.shape[0]
-        odd_len = odd.shape[0]
-        mlen = min((odd_len, even_len))
-        _ = []
-        for i in range(mlen):
-            _.append(even[i].unsqueeze(0))
-            _.append(odd[i].unsqueeze(0))
-        if odd_len < even_len:
-            _.append(even[-1].unsqueeze(0))
-        return torch.cat(_, 0).permute(1, 0, 2)  # B, L, D
+        # even: B, D, L_even, odd: B, D, L_odd, with L_odd == L_even or L_even - 1
+        odd_len = odd.shape[-1]
+        zipped = torch.stack((even[..., :odd_len], odd), dim=-1).reshape(*odd.shape[:-1], 2 * odd_len)
+        if odd_len < even.shape[-1]:
+            zipped = torch.cat((zipped, even[..., odd_len:]), dim=-1)
+        return zipped  # B, D, L
 
     def forward(self, x):
         x_even_update, x_odd_update = self.workingblock(x)
@@ -204,9 +195,10 @@ class EncoderTree(nn.Module):
             INN=INN)
 
     def forward(self, x):
-        x = self.SCINet_Tree(x)
+        # B, T, D -> B, D, T for the whole tree, instead of permuting at every node
+        x = self.SCINet_Tree(x.permute(0, 2, 1))
 
-        return x
+        return x.permute(0, 2, 1)
 
 
 class SCINet(nn.Module):
@@ -48,6 +48,154 @@ class TensorPairsDataset(data.Dataset):
         return torch.hstack([torch.tensor(real_values), self.targets[-1]])
 
 
+class ContiguousTensorPairsDataset(TensorPairsDataset):
+    """
+    TensorPairsDataset holding all inputs and all targets in two contiguous tensors.
+    Takes the same arguments (lists of equally shaped tensors) or already stacked tensors.
+    Indexing with a list or tensor of indices gathers a whole batch at once, batch_loader()
+    builds a DataLoader which fetches batches that way, skipping per-sample collation.
+    :param inputs: List of input tensors or tensor of shape (n_samples, ...)
+    :param targets: List of target tensors or tensor of shape (n_samples, ...)
+    """
+
+    def __init__(
+            self,
+            inputs: typing.Union[typing.List[torch.Tensor], torch.Tensor],
+            targets: typing.Union[typing.List[torch.Tensor], torch.Tensor],
+    ):
+        super().__init__(inputs, targets)
+        self.inputs = _stacked(inputs)
+        self.targets = _stacked(targets)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (list, tuple, np.ndarray)):
+            idx = torch.as_tensor(idx)
+        return self.inputs[idx], self.targets[idx]
+
+    def batch_loader(
+            self, batch_size: int, shuffle: bool = False, drop_last: bool = False, **kwargs
+    ) -> data.DataLoader:
+        """
+        DataLoader yielding (inputs, targets) batches gathered straight from the contiguous storage.
+        """
+        sampler = data.RandomSampler(self) if shuffle else data.SequentialSampler(self)
+        batch_sampler = data.BatchSampler(sampler, batch_size=batch_size, drop_last=drop_last)
+        return data.DataLoader(self, sampler=batch_sampler, batch_size=None, **kwargs)
+
+    def get_unraveled_targets(self) -> torch.Tensor:
+        """
+        Return first value from each sample (but all values from the last
+        sample). Used to build 1D vector of real values.
+        """
+        return torch.cat([self.targets[:-1, 0], self.targets[-1]])
+
+
+def batch_loader(dataset: data.Dataset, batch_size: int, shuffle: bool = False, **kwargs) -> data.DataLoader:
+    """
+    DataLoader over the dataset, gathering whole batches at once when it is a ContiguousTensorPairsDataset
+    (a plain per-sample DataLoader over it is slower than over the list-backed TensorPairsDataset).
+    """
+    if isinstance(dataset, ContiguousTensorPairsDataset):
+        return dataset.batch_loader(batch_size, shuffle=shuffle, **kwargs)
+    return data.DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, **kwargs)
+
+
+def _stacked(tensors: typing.Union[typing.List[torch.Tensor], torch.Tensor]) -> torch.Tensor:
+    if isinstance(tensors, torch.Tensor):
+        return tensors
+    if len(tensors) == 0:
+        return torch.empty(0)
+    return torch.stack(tensors)
+
+
+def windows_to_tensors(
+        windows: np.ndarray, input_steps: int, input_columns, target_column: int = 0, target_windows: np.ndarray = None
+) -> typing.Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Splits (n_windows, window_length, n_features) windows, e.g. from patchers.window_view,
+    into contiguous float32 input and target tensors with a single copy each.
+    """
+    target_windows = windows if target_windows is None else target_windows
+    X = np.ascontiguousarray(windows[:, :input_steps, input_columns], dtype=np.float32)
+    y = np.ascontiguousarray(target_windows[:, input_steps:, target_column], dtype=np.float32)
+    return torch.from_numpy(X), torch.from_numpy(y)
+
+
+class WindowsDataset(data.Dataset):
+    """
+    Dataset of sliding windows indexed lazily over a single float32 copy of the channel,
+    so memory use does not grow with the number of windows.
+    Item idx holds input_steps rows of input_columns starting at idx * stride as input,
+    and the following output_steps values of target_column as target.
+    With output_steps=0 items are inputs only, as expected by runners.run_prediction.
+    :param values: Channel values in shape (n_samples, n_features)
+    :param input_steps: Length of input window
+    :param output_steps: Length of target sequence
+    :param input_columns: Columns fed to the model (index, list of indices or slice)
+    :param target_column: Column holding predicted values
+    :param target_values: Array to take targets from, defaults to values
+    :param stride: Step between consecutive windows
+    """
+
+    def __init__(
+            self,
+            values: np.ndarray,
+            input_steps: int,
+            output_steps: int,
+            input_columns: typing.Union[int, typing.List[int], slice] = slice(None),
+            target_column: int = 0,
+            target_values: np.ndarray = None,
+            stride: int = 1,
+    ):
+        assert stride > 0, "Stride should be positive"
+        values = np.asarray(values)
+        target_values = values if target_values is None else np.asarray(target_values)
+        assert len(values) == len(target_values), "Values and target values should have the same length"
+        if isinstance(input_columns, int):
+            input_columns = [input_columns]
+
+        self.inputs = np.ascontiguousarray(values[:, input_columns], dtype=np.float32)
+        self.targets = np.ascontiguousarray(target_values[:, target_column], dtype=np.float32)
+        self.input_steps = input_steps
+        self.output_steps = output_steps
+        self.stride = stride
+
+        window_length = input_steps + output_steps
+        self.length = max(0, (len(self.inputs) - window_length) // stride + 1)
+        if self.length == 0:
+            warnings.warn("Empty input provided, add data to dataset!")
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self.length
+        if not 0 <= idx < self.length:
+            raise IndexError(f"Window {idx} out of range")
+        start = idx * self.stride
+        X = torch.from_numpy(self.inputs[start: start + self.input_steps])
+        if self.output_steps == 0:
+            return X
+        y = torch.from_numpy(self.targets[start + self.input_steps: start + self.input_steps + self.output_steps])
+        return X, y
+
+    def input_windows(self) -> np.ndarray:
+        """
+        Returns read-only (n_windows, input_steps, n_input_features) view over all inputs.
+        """
+        return patchers.window_view(self.inputs, self.input_steps, self.stride)[: self.length]
+
+    def get_unraveled_targets(self) -> torch.Tensor:
+        """
+        Return first value from each sample (but all values from the last
+        sample). Used to build 1D vector of real values.
+        """
+        targets = patchers.window_view(self.targets[self.input_steps:], self.output_steps, self.stride)
+        targets = torch.from_numpy(np.ascontiguousarray(targets[: self.length]))
+        return torch.hstack([targets[:-1, 0], targets[-1]])
+
+
 class DatasetInputData:
     implementations = {}
 
@@ -175,13 +323,14 @@ def prepare_dataset(
         channel_values: np.ndarray,
         input_steps: int,
         output_steps: int,
-) -> TensorPairsDataset:
-    def tensor_from(input: np.ndarray):
-        return torch.from_numpy(input.astype(np.float32))
-
-    patches = patchers.patch(channel_values, input_steps + output_steps, step=1)
-    X, y = [(tensor_from(patch[:input_steps, 1:]), tensor_from(patch[input_steps:, 0])) for patch in patches]
-    return TensorPairsDataset(X, y)
+        lazy: bool = False,
+) -> typing.Union[TensorPairsDataset, WindowsDataset]:
+    if lazy:
+        return WindowsDataset(channel_values, input_steps, output_steps, slice(1, None))
+
+    windows = patchers.window_view(channel_values, input_steps + output_steps, stride=1)
+    X, y = windows_to_tensors(windows, input_steps, slice(1, None))
+    return ContiguousTensorPairsDataset(X, y)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import typing
 
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 
 def patch_with_stride(
@@ -29,3 +30,19 @@ def patch(arr: np.ndarray, patch_len: int, step: int) -> typing.Iterator[np.ndar
     assert step > 0, "Stride should be positive"
     for idx in range(0, len(arr) - patch_len + 1, step):
         yield arr[idx: idx + patch_len]
+
+
+def window_view(arr: np.ndarray, patch_len: int, stride: int = 1) -> np.ndarray:
+    """
+    Function returns read-only view of shape (n_patches, patch_len, *arr.shape[1:])
+    over patches created with given stride. It holds the same values as
+    np.array(patch_with_stride(arr, patch_len, stride)) without copying the data.
+    :param arr: Array to patch
+    :param patch_len: Length of patch
+    :param stride: Step for patches
+    """
+    assert stride > 0, "Stride should be positive"
+    if len(arr) < patch_len:
+        return np.empty((0, patch_len, *arr.shape[1:]), dtype=arr.dtype)
+    windows = sliding_window_view(arr, patch_len, axis=0)
+    return np.moveaxis(windows, -1, 1)[::stride]
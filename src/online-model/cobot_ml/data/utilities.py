@@ -16,30 +16,30 @@ class DsMode(Enum):
     WITHOUT_MPC = 3
 
 
+def _input_columns(ds_mode: DsMode):
+    if ds_mode == DsMode.UNIVARIATE:
+        return [0]
+    elif ds_mode == DsMode.WITH_MPC:
+        return slice(None)
+    return slice(1, None)
+
+
 def prepare_dataset(
         channel_values: typing.Union[pd.DataFrame, np.ndarray],
         input_steps: int,
         output_steps: int,
         ds_mode: DsMode,
         pad_beginning: bool = False,
-) -> dss.TensorPairsDataset:
+        lazy: bool = False,
+) -> typing.Union[dss.TensorPairsDataset, dss.WindowsDataset]:
     if pad_beginning:
         channel_values = detectors.pad_beginning(channel_values, input_steps)
+    if lazy:
+        return dss.WindowsDataset(np.asarray(channel_values), input_steps, output_steps, _input_columns(ds_mode))
 
-    patches = patchers.patch_with_stride(
-        channel_values, input_steps + output_steps, stride=1
-    )
-
-    patches = [torch.from_numpy(patch.astype(np.float32)) for patch in patches]
-    if ds_mode == DsMode.UNIVARIATE:
-        X = [patch[:input_steps, [0]] for patch in patches]
-    elif ds_mode == DsMode.WITH_MPC:
-        X = [patch[:input_steps, :] for patch in patches]
-    else:
-        X = [patch[:input_steps, 1:] for patch in patches]
-    y = [patch[input_steps:, 0] for patch in patches]
-    # y = [patch[input_steps:, :] for patch in patches]
-    return dss.TensorPairsDataset(X, y)
+    windows = patchers.window_view(np.asarray(channel_values), input_steps + output_steps, stride=1)
+    X, y = dss.windows_to_tensors(windows, input_steps, _input_columns(ds_mode))
+    return dss.ContiguousTensorPairsDataset(X, y)
 
 
 def prepare_dataset_with_original(
@@ -49,24 +49,18 @@ def prepare_dataset_with_original(
         output_steps: int,
         ds_mode: DsMode,
         pad_beginning: bool = False,
-) -> dss.TensorPairsDataset:
+        lazy: bool = False,
+) -> typing.Union[dss.TensorPairsDataset, dss.WindowsDataset]:
     _, columns, values, original_values = dataset.channel(channel_name)
     if pad_beginning:
         values = detectors.pad_beginning(values, input_steps)
         original_values = detectors.pad_beginning(original_values, input_steps)
+    if lazy:
+        return dss.WindowsDataset(
+            values, input_steps, output_steps, _input_columns(ds_mode), target_values=original_values
+        )
 
-    patches = patchers.patch_with_stride(values, input_steps + output_steps, stride=1)
-    original_patches = patchers.patch_with_stride(original_values, input_steps + output_steps, stride=1)
-
-    def to_torch(x: np.ndarray):
-        return torch.from_numpy(x.astype(np.float32))
-
-    if ds_mode == DsMode.UNIVARIATE:
-        X = [to_torch(patch[:input_steps, [0]]) for patch in patches]
-    elif ds_mode == DsMode.WITH_MPC:
-        X = [to_torch(patch[:input_steps, :]) for patch in patches]
-    else:
-        X = [to_torch(patch[:input_steps, 1:]) for patch in patches]
-
-    y = [to_torch(original_patch[input_steps:, 0]) for original_patch in original_patches]
-    return dss.TensorPairsDataset(X, y)
+    windows = patchers.window_view(values, input_steps + output_steps, stride=1)
+    original_windows = patchers.window_view(original_values, input_steps + output_steps, stride=1)
+    X, y = dss.windows_to_tensors(windows, input_steps, _input_columns(ds_mode), target_windows=original_windows)
+    return dss.ContiguousTensorPairsDataset(X, y)
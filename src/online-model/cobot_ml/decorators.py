@@ -1,20 +1,106 @@
+"""
+Validation decorators of detectors and metrics inputs and outputs.
+Amount of validation is controlled with a level:
+    off - no checks, decorators applied while the level is off return the undecorated function
+    cheap - only O(1) checks of dimensions and shapes, and of scalar outputs
+    full - additionally scans whole arrays for binary / probability values (default)
+The level is read from COBOT_ML_VALIDATION environment variable at import,
+can be changed globally with set_validation_level or locally with validation_level context.
+"""
+import contextlib
+import contextvars
+import functools
+import os
+
 import numpy as np
 
 
-def returns_binary(f):
+class ValidationLevels:
+    OFF = "off"
+    CHEAP = "cheap"
+    FULL = "full"
+
+
+_LEVEL_RANKS = {ValidationLevels.OFF: 0, ValidationLevels.CHEAP: 1, ValidationLevels.FULL: 2}
+
+
+def _checked_level(level: str) -> str:
+    if level not in _LEVEL_RANKS:
+        raise ValueError(f"Cannot handle [{level}]")
+    return level
+
+
+_global_level = _checked_level(os.environ.get("COBOT_ML_VALIDATION", ValidationLevels.FULL).lower())
+_local_level = contextvars.ContextVar("cobot_ml_validation_level", default=None)
+
+
+def get_validation_level() -> str:
+    local_level = _local_level.get()
+    return _global_level if local_level is None else local_level
+
+
+def set_validation_level(level: str):
     """
-    Adds asserts to check if output is binary.
+    Sets validation level for all threads. Functions decorated while the level was off
+    stay unchecked, to validate them set the level before importing their modules.
     """
+    global _global_level
+    _global_level = _checked_level(level)
+
 
+@contextlib.contextmanager
+def validation_level(level: str):
+    """
+    Temporarily overrides validation level in the current thread / context, e.g.
+        with validation_level(ValidationLevels.OFF):
+            score = NABScore()(y_true, y_pred)
+    """
+    token = _local_level.set(_checked_level(level))
+    try:
+        yield
+    finally:
+        _local_level.reset(token)
+
+
+def _validated(f, level: str, check_inputs=None, check_output=None):
+    """
+    Wraps f with checks run only when the current validation level is at least level.
+    """
+    if get_validation_level() == ValidationLevels.OFF:
+        return f
+    required_rank = _LEVEL_RANKS[level]
+
+    @functools.wraps(f)
     def wrapper(*args, **kwargs):
+        if _LEVEL_RANKS[get_validation_level()] < required_rank:
+            return f(*args, **kwargs)
+        if check_inputs is not None:
+            check_inputs(args)
         output = f(*args, **kwargs)
+        if check_output is not None:
+            check_output(output)
+        return output
+
+    return wrapper
+
+
+def _is_binary(x) -> bool:
+    x = np.asarray(x)
+    return bool(np.logical_or(x == 0, x == 1).all())
+
+
+def returns_binary(f):
+    """
+    Adds asserts to check if output is binary.
+    """
+
+    def check_output(output):
         assert output in [
             0,
             1,
         ], f"{f.__name__} should return binary value (int or bool)"
-        return output
 
-    return wrapper
+    return _validated(f, ValidationLevels.CHEAP, check_output=check_output)
 
 
 def returns_binary_array(f):
@@ -22,14 +108,10 @@ def returns_binary_array(f):
     Adds asserts to check if output is a binary array.
     """
 
-    def wrapper(*args, **kwargs):
-        output = f(*args, **kwargs)
-        assert np.isin(
-            output, [0, 1, 0.0, 1.0]
-        ).all(), f"{f.__name__} should return binary array"
-        return output
+    def check_output(output):
+        assert _is_binary(output), f"{f.__name__} should return binary array"
 
-    return wrapper
+    return _validated(f, ValidationLevels.FULL, check_output=check_output)
 
 
 def returns_probability(f):
@@ -37,12 +119,10 @@ def returns_probability(f):
     Adds asserts to check if output is a probability value.
     """
 
-    def wrapper(*args, **kwargs):
-        output = f(*args, **kwargs)
+    def check_output(output):
         assert 0.0 <= output <= 1.0, f"{f.__name__} should return value in 0-1 range"
-        return output
 
-    return wrapper
+    return _validated(f, ValidationLevels.CHEAP, check_output=check_output)
 
 
 def returns_probability_array(f):
@@ -50,14 +130,12 @@ def returns_probability_array(f):
     Adds asserts to check if output is a probability array.
     """
 
-    def wrapper(*args, **kwargs):
-        output = f(*args, **kwargs)
+    def check_output(output):
         assert np.logical_and(
             0 <= output, 1 >= output
         ).all(), "Probabilities should be between 0 and 1"
-        return output
 
-    return wrapper
+    return _validated(f, ValidationLevels.FULL, check_output=check_output)
 
 
 def accepts_one_dimensional_input(input_index=0):
@@ -66,13 +144,12 @@ def accepts_one_dimensional_input(input_index=0):
         Adds asserts to check if input has only one dimension.
         """
 
-        def wrapper(*args, **kwargs):
+        def check_inputs(args):
             assert (
                 args[input_index].ndim == 1
             ), f"{f.__name__} input should be one dimensional"
-            return f(*args, **kwargs)
 
-        return wrapper
+        return _validated(f, ValidationLevels.CHEAP, check_inputs=check_inputs)
 
     return decorator
 
@@ -80,16 +157,13 @@ def accepts_one_dimensional_input(input_index=0):
 def accepts_binary_array(input_index=0):
     def decorator(f):
         """
-        Adds asserts to check if input has only one dimension.
+        Adds asserts to check if input is a binary array.
         """
 
-        def wrapper(*args, **kwargs):
-            assert np.isin(
-                args[input_index], [0.0, 1.0, 0, 1]
-            ).all(), f"{f.__name__} input should be binary"
-            return f(*args, **kwargs)
+        def check_inputs(args):
+            assert _is_binary(args[input_index]), f"{f.__name__} input should be binary"
 
-        return wrapper
+        return _validated(f, ValidationLevels.FULL, check_inputs=check_inputs)
 
     return decorator
 
@@ -100,14 +174,13 @@ def inputs_have_equal_shapes(*input_idxs):
         Adds asserts to check if inputs have the same shapes.
         """
 
-        def wrapper(*args, **kwargs):
+        def check_inputs(args):
             shapes = [args[input_idx].shape for input_idx in input_idxs]
             assert all(
                 [shape == shapes[0] for shape in shapes]
             ), f"{f.__name__} inputs should have equal shapes"
-            return f(*args, **kwargs)
 
-        return wrapper
+        return _validated(f, ValidationLevels.CHEAP, check_inputs=check_inputs)
 
     return decorator
 
@@ -118,12 +191,11 @@ def accepts_single_feature(input_index=0):
         Adds asserts to check if input contain single feature.
         """
 
-        def wrapper(*args, **kwargs):
+        def check_inputs(args):
             assert (
                 args[input_index].shape[1] == 1
             ), f"{f.__name__} input should have a single feature"
-            return f(*args, **kwargs)
 
-        return wrapper
+        return _validated(f, ValidationLevels.CHEAP, check_inputs=check_inputs)
 
     return decorator
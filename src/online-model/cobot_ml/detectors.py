@@ -2,14 +2,19 @@
 Module contains implementations of anomaly detectors.
 """
 import abc
+import array
+import collections
+import dataclasses
+import math
+import typing
 
 import numpy as np
-import pandas as pd
 import torch
 from torch.utils import data
 
-from cobot_ml import decorators
+from cobot_ml import decorators, rolling
 from cobot_ml.data import patchers
+from cobot_ml.data.datasets import WindowsDataset
 from cobot_ml.observer import Observable
 from cobot_ml.training.runners import run_prediction
 
@@ -34,9 +39,22 @@ class BinaryDetector(BaseDetector, abc.ABC):
         :param X: Input data for detection in shape (n_samples, n_features)
         :return: 1D array with predictions (int)
         """
-        predictions = np.array([self._predict_sample(sample) for sample in X])
+        predictions = self._predict_batch(X)
+        if predictions is None:
+            predictions = np.array([self._predict_sample(sample) for sample in X])
         return predictions
 
+    def _predict_batch(self, X: np.ndarray) -> typing.Optional[np.ndarray]:
+        """
+        Optional vectorized counterpart of _predict_sample. Detectors able to process all
+        samples at once should override it, as it skips the per-sample Python loop and checks.
+        Prediction of every sample must depend only on that sample, as in _predict_sample.
+        :param X: Input data for detection in shape (n_samples, n_features)
+        :return: 1D array with predictions (int) or None if the detector
+            predicts sample by sample only
+        """
+        return None
+
     @abc.abstractmethod
     @decorators.accepts_one_dimensional_input(input_index=1)
     @decorators.returns_binary
@@ -59,9 +77,22 @@ class ProbabilityDetector(BaseDetector, abc.ABC):
         :param X: Input data for detection in shape (n_samples, n_features)
         :return: 1D array with predictions (float)
         """
-        predictions = np.array([self._predict_sample(sample) for sample in X])
+        predictions = self._predict_batch(X)
+        if predictions is None:
+            predictions = np.array([self._predict_sample(sample) for sample in X])
         return predictions
 
+    def _predict_batch(self, X: np.ndarray) -> typing.Optional[np.ndarray]:
+        """
+        Optional vectorized counterpart of _predict_sample. Detectors able to process all
+        samples at once should override it, as it skips the per-sample Python loop and checks.
+        Prediction of every sample must depend only on that sample, as in _predict_sample.
+        :param X: Input data for detection in shape (n_samples, n_features)
+        :return: 1D array with predictions (float) or None if the detector
+            predicts sample by sample only
+        """
+        return None
+
     @abc.abstractmethod
     @decorators.accepts_one_dimensional_input(input_index=1)
     @decorators.returns_probability
@@ -99,8 +130,46 @@ class Thresholded(BinaryDetector):
         prediction = 1 if self.threshold >= probability else 0
         return prediction
 
+    def _predict_batch(self, X: np.ndarray) -> np.ndarray:
+        """
+        Thresholds probabilities of all samples at once. Falls back to per-sample
+        predictions of the wrapped detector if it does not implement _predict_batch.
+        :param X: Input data for detection in shape (n_samples, n_features)
+        :return: 1D array with predictions (int)
+        """
+        probabilities = self.detector.predict(X)
+        return (self.threshold >= probabilities).astype(int)
+
+
+class OnlineDetector(abc.ABC):
+    """
+    Detector consuming a signal sample by sample, e.g. messages of a stream, with state bounded
+    regardless of the stream length. Detections of consecutive update calls are equal to
+    predictions of the whole signal at once.
+    """
+
+    @abc.abstractmethod
+    def update(self, sample: typing.Union[float, np.ndarray]) -> int:
+        """
+        :param sample: Next sample of the signal, a number or an array with a single feature
+        :return: Detection of the sample (0,1)
+        """
+        pass
+
+    def reset(self):
+        """
+        Forgets the signal seen so far.
+        """
+        pass
+
+
+def _sample_value(sample: typing.Union[float, np.ndarray]) -> float:
+    if isinstance(sample, (np.ndarray, list, tuple)):
+        return float(sample[0])
+    return sample
 
-class MinMaxDetector(BaseDetector):
+
+class MinMaxDetector(BaseDetector, OnlineDetector):
     """
     Standard detection for over the limit values.
     :param min: Lower bound of correct values range.
@@ -124,18 +193,27 @@ class MinMaxDetector(BaseDetector):
         :param X: Input for detection
         :return: Prediction in the form of int number (0,1)
         """
-        detections = np.zeros_like(X, dtype=np.int)
+        detections = np.zeros_like(X, dtype=int)
         detections[X < self.min] = 1
         detections[X > self.max] = 1
         detections = detections.flatten()
         self.publish(self.PublishedEvents.publish_detections, detections=detections)
         return detections
 
+    def update(self, sample: typing.Union[float, np.ndarray]) -> int:
+        value = _sample_value(sample)
+        return 1 if value < self.min or value > self.max else 0
+
 
-class MovingStdDetector(BaseDetector):
+class MovingStdDetector(BaseDetector, OnlineDetector):
     """
     Detector detect an anomaly if moving standard deviation
     is not in a given range
+    In update the last window_size samples are kept in a circular buffer, with their mean and sum
+    of squared deviations updated in O(1) and recomputed exactly once per buffer cycle,
+    so that rounding errors do not accumulate over the stream.
+    As in predict, windows holding nan or inf values are not detected, the running sums skip them
+    and are recomputed once the last such value leaves the window.
     :param min: Lower bound of correct moving standard deviation range.
     :param max: Upper bound of correct moving standard deviation  range.
     """
@@ -150,21 +228,225 @@ class MovingStdDetector(BaseDetector):
         self.min = min
         self.max = max
         self.min_max_detector = MinMaxDetector(min, max)
+        self.reset()
 
     @decorators.accepts_single_feature(input_index=1)
     def predict(self, X: np.ndarray):
-        stds = pd.Series(X.flatten()).rolling(self.window_size).std().values
-        stds = np.expand_dims(stds, 1)
+        stds = rolling.rolling_std(X, self.window_size)
         detections = self.min_max_detector.predict(stds)
         self.publish(self.PublishedEvents.publish_detections, detections=detections)
         self.publish(self.PublishedEvents.publish_stds, stds=stds)
         return detections
 
+    def reset(self):
+        self._window = array.array("d", [0.0]) * self.window_size
+        self._position = 0
+        self._count = 0
+        self._mean = 0.0
+        self._squared_deviations = 0.0
+        self._non_finite = 0
+
+    def update(self, sample: typing.Union[float, np.ndarray]) -> int:
+        value = _sample_value(sample)
+        window_size = self.window_size
+        filled = self._count == window_size
+        removed = self._window[self._position]
+        had_non_finite = self._non_finite > 0
+        if not math.isfinite(value):
+            self._non_finite += 1
+        if filled and not math.isfinite(removed):
+            self._non_finite -= 1
+        if self._non_finite > 0:
+            if not filled:
+                self._count += 1
+        elif had_non_finite:
+            # the last non finite value has just left the (full) window
+            self._window[self._position] = value
+            self._recompute()
+        elif not filled:
+            # Welford's algorithm until the window is full
+            self._count += 1
+            delta = value - self._mean
+            self._mean += delta / self._count
+            self._squared_deviations += delta * (value - self._mean)
+        else:
+            mean = self._mean + (value - removed) / window_size
+            self._squared_deviations += (value - removed) * (value - mean + removed - self._mean)
+            self._mean = mean
+        self._window[self._position] = value
+        self._position += 1
+        if self._position == window_size:
+            self._position = 0
+            if self._non_finite == 0:
+                self._recompute()
+        if self._count < window_size or window_size < 2 or self._non_finite > 0:
+            return 0
+        std = math.sqrt(max(self._squared_deviations, 0.0) / (window_size - 1))
+        return 1 if std < self.min or std > self.max else 0
+
+    def _recompute(self):
+        self._mean = math.fsum(self._window) / self.window_size
+        self._squared_deviations = math.fsum((value - self._mean) ** 2 for value in self._window)
+
+
+class AllowedValuesDetector(BaseDetector, OnlineDetector):
+    """
+    Detects samples with values out of a set of allowed ones,
+    e.g. segments of the route AGVs are reported on (as the segment stream job does).
+    :param allowed_values: Correct values of the signal
+    """
+
+    class PublishedEvents:
+        publish_detections = "Publish detections"
+
+    def __init__(self, allowed_values: typing.Iterable[float]):
+        super().__init__()
+        self.allowed_values = frozenset(allowed_values)
+
+    @decorators.accepts_single_feature(input_index=1)
+    def predict(self, X: np.ndarray):
+        detections = (~np.isin(X, list(self.allowed_values))).astype(int).flatten()
+        self.publish(self.PublishedEvents.publish_detections, detections=detections)
+        return detections
+
+    def update(self, sample: typing.Union[float, np.ndarray]) -> int:
+        return 0 if _sample_value(sample) in self.allowed_values else 1
+
+
+class DetectorMultiplexer:
+    """
+    Routes interleaved samples of many sources (e.g. messages of AGVs, keyed by agv_id)
+    to independent states of an online detector.
+    :param detector_factory: Creates the detector of a source seen for the first time,
+        e.g. functools.partial(MovingStdDetector, 50, 0.1, 10.0)
+    :param max_sources: Memory bound, when exceeded the least recently updated source is forgotten
+    """
+
+    def __init__(self, detector_factory: typing.Callable[[], OnlineDetector], max_sources: int = None):
+        self.detector_factory = detector_factory
+        self.max_sources = max_sources
+        self.detectors: typing.Dict[typing.Hashable, OnlineDetector] = collections.OrderedDict()
+
+    def update(self, source: typing.Hashable, sample: typing.Union[float, np.ndarray]) -> int:
+        """
+        :param source: Key of the signal the sample belongs to
+        :param sample: Next sample of the source signal
+        :return: Detection of the sample (0,1)
+        """
+        detector = self.detectors.get(source)
+        if detector is None:
+            detector = self.detectors[source] = self.detector_factory()
+            if self.max_sources is not None and len(self.detectors) > self.max_sources:
+                self.detectors.popitem(last=False)
+        elif self.max_sources is not None:
+            self.detectors.move_to_end(source)
+        return detector.update(sample)
+
+    def update_many(self, sources: typing.Sequence[typing.Hashable], samples: np.ndarray) -> np.ndarray:
+        """
+        Updates with a batch of interleaved messages, in order.
+        :return: 1D array with detections (int)
+        """
+        return np.fromiter(
+            (self.update(source, sample) for source, sample in zip(sources, samples)), dtype=int, count=len(samples)
+        )
+
+    def reset(self, source: typing.Hashable = None):
+        """
+        Forgets the signal of a source, or of all sources if not given.
+        """
+        if source is None:
+            self.detectors.clear()
+        else:
+            self.detectors.pop(source, None)
+
+
+@dataclasses.dataclass(frozen=True)
+class RollingCheck:
+    """
+    Check of RollingStatisticsDetector, detecting samples with a rolling statistic out of a given range.
+    :param statistic: One of cobot_ml.rolling.Statistics
+    :param window_size: Number of samples in the window (ignored by Statistics.EWMA)
+    :param min: Lower bound of correct statistic values, a number or one per feature
+    :param max: Upper bound of correct statistic values, a number or one per feature
+    :param alpha: Smoothing factor of Statistics.EWMA
+    """
+    statistic: str
+    window_size: int = 1
+    min: typing.Union[float, np.ndarray] = -np.inf
+    max: typing.Union[float, np.ndarray] = np.inf
+    alpha: float = None
+
+    def name(self) -> str:
+        if self.statistic == rolling.Statistics.EWMA:
+            return f"{self.statistic}_{self.alpha}"
+        return f"{self.statistic}_{self.window_size}"
+
+
+class RollingStatisticsDetector(BaseDetector):
+    """
+    Runs rolling statistic checks on all features of the input at once, e.g. the same checks
+    on every MPC signal, instead of a MovingStdDetector per signal.
+    Samples without a full window behind them are not detected.
+    Statistics of checks with equal windows share intermediate results.
+    :param checks: Checks run on every feature, a sample of a feature is detected if any of them fails
+    """
+
+    class PublishedEvents:
+        publish_detections = "Publish detections"
+        publish_statistics = "Publish statistics"
+
+    def __init__(self, checks: typing.Sequence[RollingCheck]):
+        super().__init__()
+        assert len(checks) > 0, "At least one check is required"
+        for check in checks:
+            assert np.all(np.asarray(check.min) < np.asarray(check.max)), "Lower bound cannot be higher than upper"
+            if check.statistic == rolling.Statistics.EWMA:
+                assert check.alpha is not None, "EWMA check requires alpha"
+        self.checks = list(checks)
+
+    def predict_per_feature(self, X: np.ndarray) -> np.ndarray:
+        """
+        :param X: Input data for detection in shape (n_samples, n_features)
+        :return: Predictions (int) in shape (n_samples, n_features)
+        """
+        statistics_by_window = {}
+        statistics = {}
+        detections = np.zeros(X.shape, dtype=bool)
+        for check in self.checks:
+            if check.window_size not in statistics_by_window:
+                statistics_by_window[check.window_size] = rolling.RollingStatistics(X, check.window_size)
+            values = statistics_by_window[check.window_size].get(
+                check.statistic, **({"alpha": check.alpha} if check.statistic == rolling.Statistics.EWMA else {})
+            )
+            statistics[check.name()] = values
+            # nan (no full window yet) fails neither comparison
+            detections |= (values < check.min) | (values > check.max)
+        detections = detections.astype(int)
+        self.publish(self.PublishedEvents.publish_detections, detections=detections)
+        self.publish(self.PublishedEvents.publish_statistics, statistics=statistics)
+        return detections
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        :param X: Input data for detection in shape (n_samples, n_features)
+        :return: 1D array with predictions (int), 1 where any feature is detected
+        """
+        return self.predict_per_feature(X).max(axis=1, initial=0)
+
 
 class Predictor:
-    def __init__(self, model: torch.nn.Module, input_window_size: int):
+    """
+    :param model: Network predicting next values of the signal
+    :param input_window_size: Number of past samples fed to the network
+    :param lazy: Build model inputs batch by batch from a single copy of the signal
+        instead of materialising all windows up front
+    """
+
+    def __init__(self, model: torch.nn.Module, input_window_size: int, lazy: bool = False):
         self.model = model
         self.input_window_size = input_window_size
+        self.lazy = lazy
 
     def predict_signal_with_model(
             self, signal: np.ndarray, batch_size: int = 256
@@ -175,9 +457,15 @@ class Predictor:
         :param batch_size: Size of a batch.
         :return: Predicted signal.
         """
-        tensors = self._preprocess_input_tensors(signal)
-        data_loader = data.DataLoader(tensors, batch_size=batch_size)
-        model_predictions = run_prediction(self.model, data_loader)
+        device = next(self.model.parameters()).device
+        if self.lazy:
+            windows = WindowsDataset(pad_beginning(signal, self.input_window_size), self.input_window_size, 0)
+            data_loader = data.DataLoader(windows, batch_size=batch_size)
+            model_predictions = run_prediction(self.model, data_loader, device=device)
+        else:
+            tensors = self._preprocess_input_tensors(signal)
+            data_loader = data.DataLoader(tensors, batch_size=batch_size)
+            model_predictions = run_prediction(self.model, data_loader)
         return self._postprocess_network_predictions(model_predictions)
 
     def _preprocess_input_tensors(self, X: np.ndarray) -> torch.Tensor:
@@ -187,11 +475,10 @@ class Predictor:
         :return: Padded, and patched tensors.
         """
         X_padded = pad_beginning(X, self.input_window_size)
-        patches = patchers.patch_with_stride(X_padded, self.input_window_size, stride=1)
+        windows = patchers.window_view(X_padded, self.input_window_size, stride=1)
         tensors = (
-            torch.from_numpy(np.array(patches))
+            torch.from_numpy(np.ascontiguousarray(windows, dtype=np.float32))
             .to(next(self.model.parameters()).device)
-            .float()
         )
         return tensors
 
@@ -1,3 +1,5 @@
+import functools
+
 import numpy as np
 
 EPSILON = 1e-10
@@ -292,11 +294,166 @@ METRICS = {
 }
 
 
+class ForecastEvaluator:
+    """
+    Evaluates many metrics of a single (actual, predicted) pair, computing shared intermediates
+    (errors, percentage errors, naive benchmark errors, ...) only once, on first use.
+    Stacked series are evaluated at once, with reductions along the time axis,
+    e.g. for inputs of shape (n_series, horizon) every metric is an array of shape (n_series,).
+    For one dimensional inputs results are equal to the functions in METRICS called with defaults.
+    :param actual: Real values
+    :param predicted: Predicted values, of the same shape as actual
+    :param axis: Time axis of actual and predicted
+    :param seasonality: Shift of the naive forecasting benchmark (mase, rmsse, relative errors)
+    """
+
+    def __init__(self, actual: np.ndarray, predicted: np.ndarray, axis: int = -1, seasonality: int = 1):
+        actual, predicted = np.asarray(actual), np.asarray(predicted)
+        assert actual.shape == predicted.shape, \
+            f"actual {actual.shape} and predicted {predicted.shape} should have equal shapes"
+        self.actual = np.moveaxis(actual, axis, -1)
+        self.predicted = np.moveaxis(predicted, axis, -1)
+        self.seasonality = seasonality
+
+    def evaluate(self, metrics=tuple(METRICS)) -> dict:
+        """
+        :param metrics: Names of metrics as in METRICS
+        :return: Mapping from metric name to its value (or array of values for stacked series)
+        """
+        return {name: self.metric(name) for name in metrics}
+
+    def metric(self, name: str):
+        if name not in _SHARED_METRICS:
+            raise ValueError(f"Cannot handle [{name}]")
+        return _SHARED_METRICS[name](self)
+
+    @functools.cached_property
+    def error(self):
+        return _error(self.actual, self.predicted)
+
+    @functools.cached_property
+    def abs_error(self):
+        return np.abs(self.error)
+
+    @functools.cached_property
+    def squared_error(self):
+        return np.square(self.error)
+
+    @functools.cached_property
+    def percentage_error(self):
+        return self.error / (self.actual + EPSILON)
+
+    @functools.cached_property
+    def abs_percentage_error(self):
+        return np.abs(self.percentage_error)
+
+    @functools.cached_property
+    def symmetric_percentage_error(self):
+        return 2.0 * self.abs_error / ((np.abs(self.actual) + np.abs(self.predicted)) + EPSILON)
+
+    @functools.cached_property
+    def actual_deviation(self):
+        return self.actual - np.mean(self.actual, axis=-1, keepdims=True)
+
+    @functools.cached_property
+    def naive_error(self):
+        """ Error of the naive forecasting benchmark, aligned with actual[..., seasonality:] """
+        return self.actual[..., self.seasonality:] - self.actual[..., :-self.seasonality]
+
+    @functools.cached_property
+    def naive_mae(self):
+        return np.mean(np.abs(self.naive_error), axis=-1, keepdims=True)
+
+    @functools.cached_property
+    def relative_error(self):
+        return self.error[..., self.seasonality:] / (self.naive_error + EPSILON)
+
+    @functools.cached_property
+    def abs_relative_error(self):
+        return np.abs(self.relative_error)
+
+    @functools.cached_property
+    def bounded_relative_error(self):
+        abs_err = self.abs_error[..., self.seasonality:]
+        return abs_err / (abs_err + np.abs(self.naive_error) + EPSILON)
+
+    @functools.cached_property
+    def mae(self):
+        return np.mean(self.abs_error, axis=-1)
+
+    @functools.cached_property
+    def mape(self):
+        return np.mean(self.abs_percentage_error, axis=-1)
+
+    @functools.cached_property
+    def mse(self):
+        return np.mean(self.squared_error, axis=-1)
+
+    @functools.cached_property
+    def mbrae(self):
+        return np.mean(self.bounded_relative_error, axis=-1)
+
+
+def _std_around(values: np.ndarray, center: np.ndarray):
+    return np.sqrt(np.sum(np.square(values - np.expand_dims(center, -1)), axis=-1) / (values.shape[-1] - 1))
+
+
+def _geometric_mean_last_axis(values: np.ndarray):
+    return np.exp(np.log(values).mean(axis=-1))
+
+
+_SHARED_METRICS = {
+    'mse': lambda e: e.mse,
+    'rmse': lambda e: np.sqrt(e.mse),
+    'nrmse': lambda e: np.sqrt(e.mse) / (e.actual.max(axis=-1) - e.actual.min(axis=-1)),
+    'me': lambda e: np.mean(e.error, axis=-1),
+    'mae': lambda e: e.mae,
+    'mad': lambda e: e.mae,
+    'gmae': lambda e: _geometric_mean_last_axis(e.abs_error),
+    'mdae': lambda e: np.median(e.abs_error, axis=-1),
+    'mpe': lambda e: np.mean(e.percentage_error, axis=-1),
+    'mape': lambda e: e.mape,
+    'mdape': lambda e: np.median(e.abs_percentage_error, axis=-1),
+    'smape': lambda e: np.mean(e.symmetric_percentage_error, axis=-1),
+    'smdape': lambda e: np.median(e.symmetric_percentage_error, axis=-1),
+    'maape': lambda e: np.mean(np.arctan(e.abs_percentage_error), axis=-1),
+    'mase': lambda e: e.mae / e.naive_mae[..., 0],
+    'std_ae': lambda e: _std_around(e.error, e.mae),
+    'std_ape': lambda e: _std_around(e.percentage_error, e.mape),
+    'rmspe': lambda e: np.sqrt(np.mean(np.square(e.percentage_error), axis=-1)),
+    'rmdspe': lambda e: np.sqrt(np.median(np.square(e.percentage_error), axis=-1)),
+    'rmsse': lambda e: np.sqrt(np.mean(np.square(e.abs_error / e.naive_mae), axis=-1)),
+    'inrse': lambda e: np.sqrt(np.sum(e.squared_error, axis=-1) / np.sum(np.square(e.actual_deviation), axis=-1)),
+    'rrse': lambda e: np.sqrt(np.sum(e.squared_error, axis=-1) / np.sum(np.square(e.actual_deviation), axis=-1)),
+    'mre': lambda e: np.mean(e.relative_error, axis=-1),
+    'rae': lambda e: np.sum(e.abs_error, axis=-1) / (np.sum(np.abs(e.actual_deviation), axis=-1) + EPSILON),
+    'mrae': lambda e: np.mean(e.abs_relative_error, axis=-1),
+    'mdrae': lambda e: np.median(e.abs_relative_error, axis=-1),
+    'gmrae': lambda e: _geometric_mean_last_axis(e.abs_relative_error),
+    'mbrae': lambda e: e.mbrae,
+    'umbrae': lambda e: e.mbrae / (1 - e.mbrae),
+    'mda': lambda e: np.mean(
+        (np.sign(np.diff(e.actual, axis=-1)) == np.sign(np.diff(e.predicted, axis=-1))).astype(int), axis=-1
+    ),
+}
+
+
 def evaluate(actual: np.ndarray, predicted: np.ndarray, metrics=('mae', 'mse', 'smape', 'umbrae')):
+    """
+    Metrics of two 1D series of equal length share intermediates through ForecastEvaluator,
+    other inputs are passed to the functions in METRICS as they are (broadcast, reduced to scalars).
+    Metrics which cannot be computed are nan.
+    """
+    if isinstance(actual, np.ndarray) and isinstance(predicted, np.ndarray) \
+            and actual.ndim == 1 and actual.shape == predicted.shape:
+        compute = ForecastEvaluator(actual, predicted).metric
+    else:
+        def compute(name):
+            return METRICS[name](actual, predicted)
     results = {}
     for name in metrics:
         try:
-            results[name] = METRICS[name](actual, predicted)
+            results[name] = compute(name)
         except Exception as err:
             results[name] = np.nan
             print('Unable to compute metric {0}: {1}'.format(name, err))
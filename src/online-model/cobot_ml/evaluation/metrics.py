@@ -5,8 +5,41 @@ from dataclasses import dataclass
 import numpy as np
 
 from cobot_ml import decorators
-from cobot_ml import utilities
-from cobot_ml.utilities import get_windows_limits_idxs
+from cobot_ml.utilities import cached_windows, get_windows_limits_idxs
+
+
+def _first_detections(y_pred: np.ndarray, windows_starts_idxs: np.ndarray, windows_stop_idxs: np.ndarray):
+    """
+    Returns indices of first detection (y_pred == 1) within each window,
+    windows without detections are marked with -1.
+    """
+    detections_idxs = np.flatnonzero(y_pred == 1)
+    first_detections = np.full(len(windows_starts_idxs), -1)
+    candidates = np.searchsorted(detections_idxs, windows_starts_idxs)
+    has_candidate = candidates < len(detections_idxs)
+    candidates_idxs = detections_idxs[candidates[has_candidate]]
+    detected = candidates_idxs <= windows_stop_idxs[has_candidate]
+    first_detections[np.flatnonzero(has_candidate)[detected]] = candidates_idxs[detected]
+    return first_detections
+
+
+def _first_overlapping_windows(
+        windows_starts_idxs: np.ndarray,
+        windows_stop_idxs: np.ndarray,
+        other_starts_idxs: np.ndarray,
+        other_stop_idxs: np.ndarray,
+):
+    """
+    Returns position of the first of other (sorted, disjoint) windows overlapping each window,
+    windows without any overlap are marked with -1. Runs in O((T + P) log P) with np.searchsorted.
+    """
+    overlapping = np.full(len(windows_starts_idxs), -1)
+    # first of other windows which does not end before the window start
+    candidates = np.searchsorted(other_stop_idxs, windows_starts_idxs)
+    has_candidate = candidates < len(other_stop_idxs)
+    overlaps = other_starts_idxs[candidates[has_candidate]] <= windows_stop_idxs[has_candidate]
+    overlapping[np.flatnonzero(has_candidate)[overlaps]] = candidates[has_candidate][overlaps]
+    return overlapping
 
 
 class BaseMetric(abc.ABC):
@@ -55,11 +88,8 @@ class NABScore(BaseMetric):
         :param y_pred: Array with predictions
         """
         true_positives = np.zeros_like(y_pred)
-        windows_starts_idxs, windows_stop_idxs = get_windows_limits_idxs(y_true)
-        for window_start, window_stop in zip(windows_starts_idxs, windows_stop_idxs):
-            detections = np.where(y_pred[window_start: window_stop + 1] == 1)
-            if len(detections[0]) > 0:
-                true_positives[window_start + detections[0][0]] = 1
+        first_detections = _first_detections(y_pred, *get_windows_limits_idxs(y_true))
+        true_positives[first_detections[first_detections >= 0]] = 1
         return true_positives
 
     def __init__(
@@ -79,30 +109,37 @@ class NABScore(BaseMetric):
 
     @decorators.accepts_binary_array(input_index=1)
     @decorators.accepts_binary_array(input_index=2)
+    @decorators.inputs_have_equal_shapes(1, 2)
     def calculate_score(self, y_true: np.ndarray, y_pred: np.ndarray):
         """
         Returns nab score for given labels and predictions.
+        Only scored time steps (true, false positives and false negatives) are gathered,
+        instead of building full-length score arrays.
         :param y_true: Array with labels
         :param y_pred: Array with predictions
         """
-        position_weights = self.calculate_position_weights(y_true)
-
-        true_positives = self.get_true_positives(y_true, y_pred)
-        false_positives = self.get_false_positives(y_true, y_pred)
-        false_negatives = self.get_false_negatives(y_true, y_pred)
-
-        scores = np.zeros_like(y_pred, dtype=np.float64)
-        scores += true_positives * position_weights * self.weight_tp
-        scores += false_positives * position_weights * self.weight_fp
-        scores -= false_negatives * self.weight_fn
+        with cached_windows():
+            position_weights = self.calculate_position_weights(y_true)
+            windows_starts_idxs, windows_stop_idxs = get_windows_limits_idxs(y_true)
+        first_detections = _first_detections(y_pred, windows_starts_idxs, windows_stop_idxs)
+        undetected = first_detections < 0
+        true_positives_idxs = first_detections[~undetected]
+        false_positives_idxs = np.flatnonzero((y_pred == 1) & (np.asarray(y_true) == 0))
+        false_negatives_idxs = (windows_starts_idxs[undetected] + windows_stop_idxs[undetected]) // 2
 
         probationary_length = min(
             math.floor(self.probationary_percent * len(y_true)),
             self.MAX_PROBATIONARY_LENGTH,
         )
-        scores = scores[probationary_length:]
-        score = scores.sum()
-
+        true_positives_idxs = true_positives_idxs[true_positives_idxs >= probationary_length]
+        false_positives_idxs = false_positives_idxs[false_positives_idxs >= probationary_length]
+        false_negatives_count = np.count_nonzero(false_negatives_idxs >= probationary_length)
+
+        score = (
+                position_weights[true_positives_idxs].sum() * self.weight_tp
+                + position_weights[false_positives_idxs].sum() * self.weight_fp
+                - false_negatives_count * self.weight_fn
+        )
         return score
 
     @staticmethod
@@ -117,9 +154,7 @@ class NABScore(BaseMetric):
         :param y_pred: Array with predictions
         """
         false_positives = y_pred.copy()
-        windows_starts_idxs, windows_stop_idxs = get_windows_limits_idxs(y_true)
-        for window_start, window_stop in zip(windows_starts_idxs, windows_stop_idxs):
-            false_positives[window_start: window_stop + 1] = 0
+        false_positives[np.asarray(y_true) != 0] = 0
         return false_positives
 
     @staticmethod
@@ -135,10 +170,8 @@ class NABScore(BaseMetric):
         """
         false_negatives = np.zeros_like(y_pred)
         windows_starts_idxs, windows_stop_idxs = get_windows_limits_idxs(y_true)
-        for window_start, window_stop in zip(windows_starts_idxs, windows_stop_idxs):
-            detections = np.where(y_pred[window_start: window_stop + 1] == 1)
-            if len(detections[0]) == 0:
-                false_negatives[(window_start + window_stop) // 2] = 1
+        undetected = _first_detections(y_pred, windows_starts_idxs, windows_stop_idxs) < 0
+        false_negatives[(windows_starts_idxs[undetected] + windows_stop_idxs[undetected]) // 2] = 1
         return false_negatives
 
     @staticmethod
@@ -152,6 +185,16 @@ class NABScore(BaseMetric):
         else:
             return -1.0
 
+    @staticmethod
+    def position_weights(positions: np.ndarray) -> np.ndarray:
+        """
+        Vectorized position_weight.
+        :param positions: Relative positions in anomaly window
+        """
+        weights = 2 / (1.0 + np.exp(5.0 * positions)) - 1.0
+        weights[(positions < -3.0) | (positions > 3.0)] = -1.0
+        return weights
+
     @staticmethod
     def calculate_relative_position(
             idx_in_series: int, window_length: int, window_start: int
@@ -169,21 +212,18 @@ class NABScore(BaseMetric):
         Returns array with position weights for all time steps in sequence.
         :param y_true: Array with labels
         """
-        position_weights = np.array([-1.0 for _ in y_true])
-        windows_starts_idxs, windows_stop_idxs = utilities.get_windows_limits_idxs(
-            y_true
-        )
-        for window_start, window_stop in zip(windows_starts_idxs, windows_stop_idxs):
-            window_length = window_stop - window_start
-            window_influence_range = window_stop + 3 * window_length
-            if window_influence_range > len(y_true):
-                window_influence_range = len(y_true)
-            for idx_in_series in range(window_start, window_influence_range):
-                relative_position = self.calculate_relative_position(
-                    idx_in_series, window_length, window_start
-                )
-                position_w = self.position_weight(relative_position)
-                position_weights[idx_in_series] = position_w
+        position_weights = np.full(len(y_true), -1.0)
+        windows_starts_idxs, windows_stop_idxs = get_windows_limits_idxs(y_true)
+        window_lengths = windows_stop_idxs - windows_starts_idxs
+        influence_stops = np.minimum(windows_stop_idxs + 3 * window_lengths, len(y_true))
+        # later windows override influence of the earlier ones, one slice per window keeps that order
+        for window_start, window_length, influence_stop in zip(
+                windows_starts_idxs.tolist(), window_lengths.tolist(), influence_stops.tolist()
+        ):
+            if influence_stop <= window_start:
+                continue
+            relative_positions = -3.0 + 3.0 * (np.arange(influence_stop - window_start) / window_length)
+            position_weights[window_start:influence_stop] = self.position_weights(relative_positions)
         return position_weights
 
 
@@ -214,14 +254,7 @@ def get_group_true_positives(y_true: np.ndarray, y_pred: np.ndarray):
     :param y_pred: Array with predictions
     """
     begs, ends = get_windows_limits_idxs(y_true)
-    tp = 0
-    for start, stop in zip(begs, ends):
-        if start == stop:
-            if y_pred[start] == 1:
-                tp += 1
-        elif 1 in y_pred[start: stop + 1]:
-            tp += 1
-    return tp
+    return int(np.count_nonzero(_first_detections(y_pred, begs, ends) >= 0))
 
 
 @decorators.accepts_binary_array(input_index=0)
@@ -235,14 +268,7 @@ def get_group_false_positives(y_true: np.ndarray, y_pred: np.ndarray) -> int:
     :param y_pred: Array with predictions
     """
     begs, ends = get_windows_limits_idxs(y_pred)
-    fp = 0
-    for start, stop in zip(begs, ends):
-        if start == stop:
-            if y_true[start] == 0:
-                fp += 1
-        elif 1 not in y_true[start: stop + 1]:
-            fp += 1
-    return fp
+    return int(np.count_nonzero(_first_detections(y_true, begs, ends) < 0))
 
 
 @decorators.accepts_binary_array(input_index=0)
@@ -256,14 +282,7 @@ def get_group_false_negatives(y_true: np.ndarray, y_pred: np.ndarray) -> int:
     :param y_pred: Array with predictions
     """
     begs, ends = get_windows_limits_idxs(y_true)
-    fn = 0
-    for start, stop in zip(begs, ends):
-        if start == stop:
-            if y_pred[start] == 0:
-                fn += 1
-        elif 1 not in y_pred[start: stop + 1]:
-            fn += 1
-    return fn
+    return int(np.count_nonzero(_first_detections(y_pred, begs, ends) < 0))
 
 
 @dataclass
@@ -278,9 +297,10 @@ class ConfusionMatrix:
 @decorators.inputs_have_equal_shapes(0, 1)
 def calculateConfusionMatrix(y_true: np.ndarray, y_pred: np.ndarray) -> ConfusionMatrix:
     confusion_matrix = ConfusionMatrix()
-    confusion_matrix.true_positives = get_group_true_positives(y_true, y_pred)
-    confusion_matrix.false_positives = get_group_false_positives(y_true, y_pred)
-    confusion_matrix.false_negatives = get_group_false_negatives(y_true, y_pred)
+    with cached_windows():
+        confusion_matrix.true_positives = get_group_true_positives(y_true, y_pred)
+        confusion_matrix.false_positives = get_group_false_positives(y_true, y_pred)
+        confusion_matrix.false_negatives = get_group_false_negatives(y_true, y_pred)
     return confusion_matrix
 
 
@@ -337,8 +357,9 @@ class FScore(BaseMetric):
         self.epsilon = epsilon
 
     def __call__(self, y_true: np.ndarray, y_pred: np.ndarray):
-        precision = self.precision(y_true, y_pred)
-        recall = self.recall(y_true, y_pred)
+        with cached_windows():
+            precision = self.precision(y_true, y_pred)
+            recall = self.recall(y_true, y_pred)
         score = (1 + self.beta ** 2) * (
                 (precision * recall) / (self.beta ** 2 * precision + recall + self.epsilon)
         )
@@ -356,7 +377,7 @@ class Weigths:
         return np.exp(-((expected - actual) ** 2) / (2 * std ** 2))
 
     def _weight_triangle(self, expected: float, actual: float, width: float) -> float:
-        return max(0, 1 - abs(expected - actual) / width)
+        return np.maximum(0, 1 - np.abs(expected - actual) / width)
 
     def __init__(self, type: str, width: float):
         _weights = {
@@ -396,16 +417,11 @@ class KPBeginDifferencesForTP(BaseMetric):
         yt_beg, yt_end = get_windows_limits_idxs(y_true)
         yp_beg, yp_end = get_windows_limits_idxs(y_pred)
 
-        at_least_one_TP = False
-        result = 0
-        for t_beg, t_end in zip(yt_beg, yt_end):
-            for p_beg, p_end in zip(yp_beg, yp_end):
-                overlap = range(max(t_beg, p_beg), min(t_end, p_end) + 1)
-                if len(overlap) > 0:
-                    result += self.weight(t_beg, p_beg) * abs(t_beg - p_beg)
-                    at_least_one_TP = True
-                    break
-        if not at_least_one_TP:
+        first_overlapping = _first_overlapping_windows(yt_beg, yt_end, yp_beg, yp_end)
+        true_positives = first_overlapping >= 0
+        if not true_positives.any():
             return len(y_true)
 
-        return result
+        t_beg = yt_beg[true_positives]
+        p_beg = yp_beg[first_overlapping[true_positives]]
+        return np.sum(self.weight(t_beg, p_beg) * np.abs(t_beg - p_beg))
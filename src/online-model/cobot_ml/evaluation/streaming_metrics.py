@@ -0,0 +1,206 @@
+"""
+Incremental counterparts of cobot_ml.evaluation.forecasting_metrics, fed with chunks of
+(actual, predicted) values and holding bounded memory, e.g. to monitor predictions of the MPC
+endpoint against momentary power consumption landing later in agv_data.
+Mean based metrics are exact, medians are approximated with a log-bucket quantile sketch.
+"""
+import collections
+import math
+import typing
+
+import numpy as np
+
+from cobot_ml.evaluation.forecasting_metrics import EPSILON
+
+
+class QuantileSketch:
+    """
+    Quantile sketch of non-negative values with log-spaced buckets (as in DDSketch),
+    quantiles are estimated within relative_accuracy of the true value.
+    :param relative_accuracy: Relative error of estimated quantiles
+    :param max_buckets: Memory bound, when exceeded lowest buckets are collapsed together
+    :param min_value: Values below it are counted as zeros, non-finite values are skipped
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048, min_value: float = 1e-9):
+        assert 0 < relative_accuracy < 1, "Relative accuracy should be in (0, 1) range"
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.min_value = min_value
+        self.buckets = collections.Counter()
+        self.zero_count = 0
+
+    @property
+    def count(self) -> int:
+        return self.zero_count + sum(self.buckets.values())
+
+    def update(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        positive = values[values >= self.min_value]
+        self.zero_count += len(values) - len(positive)
+        indices, counts = np.unique(np.ceil(np.log(positive) / self.log_gamma).astype(np.int64), return_counts=True)
+        self.buckets.update(dict(zip(indices.tolist(), counts.tolist())))
+        self._collapse()
+
+    def merge(self, other: "QuantileSketch"):
+        assert self.gamma == other.gamma, "Only sketches with equal accuracy can be merged"
+        self.buckets.update(other.buckets)
+        self.zero_count += other.zero_count
+        self._collapse()
+
+    def _collapse(self):
+        if len(self.buckets) <= self.max_buckets:
+            return
+        indices = sorted(self.buckets)
+        collapsed = indices[: len(indices) - self.max_buckets + 1]
+        self.buckets[collapsed[-1]] += sum(self.buckets.pop(index) for index in collapsed[:-1])
+
+    def quantile(self, q: float) -> float:
+        """
+        :param q: Quantile in 0-1 range
+        :return: Estimated quantile, nan if the sketch is empty
+        """
+        total = self.count
+        if total == 0:
+            return np.nan
+        rank = q * (total - 1)
+        if rank < self.zero_count:
+            return 0.0
+        seen = self.zero_count
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class StreamingForecastMetrics:
+    """
+    Accumulates forecasting metrics over consecutive chunks of a single series.
+    Naive forecasting benchmark of MASE is continued across chunks with the last
+    seasonality actual values.
+    Pairs with a non-finite actual or predicted value are left out of all metrics (as if they were
+    removed from the series) and counted in non_finite_count.
+    :param seasonality: Shift of the naive forecasting benchmark
+    :param relative_accuracy: Relative accuracy of approximate medians (mdae, mdape)
+    """
+
+    def __init__(self, seasonality: int = 1, relative_accuracy: float = 0.01):
+        self.seasonality = seasonality
+        self.relative_accuracy = relative_accuracy
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.non_finite_count = 0
+        self.sums = collections.Counter()
+        self.naive_count = 0
+        self.naive_abs_error_sum = 0.0
+        self.last_actual = np.empty(0)
+        self.abs_error_sketch = QuantileSketch(self.relative_accuracy)
+        self.abs_percentage_error_sketch = QuantileSketch(self.relative_accuracy)
+
+    def update(self, actual: np.ndarray, predicted: np.ndarray):
+        """
+        :param actual: Chunk of real values, following the previous chunk in time
+        :param predicted: Predictions of actual values
+        """
+        actual = np.asarray(actual, dtype=np.float64).ravel()
+        predicted = np.asarray(predicted, dtype=np.float64).ravel()
+        assert actual.shape == predicted.shape, "actual and predicted should have equal shapes"
+        finite = np.isfinite(actual) & np.isfinite(predicted)
+        if not finite.all():
+            self.non_finite_count += len(finite) - int(finite.sum())
+            actual, predicted = actual[finite], predicted[finite]
+        error = actual - predicted
+        abs_error = np.abs(error)
+        percentage_error = error / (actual + EPSILON)
+        abs_percentage_error = np.abs(percentage_error)
+
+        self.count += len(actual)
+        self.sums.update({
+            "error": error.sum(),
+            "abs_error": abs_error.sum(),
+            "squared_error": np.square(error).sum(),
+            "percentage_error": percentage_error.sum(),
+            "abs_percentage_error": abs_percentage_error.sum(),
+            "symmetric_percentage_error": (
+                    2.0 * abs_error / ((np.abs(actual) + np.abs(predicted)) + EPSILON)
+            ).sum(),
+        })
+        self.abs_error_sketch.update(abs_error)
+        self.abs_percentage_error_sketch.update(abs_percentage_error)
+
+        history = np.concatenate((self.last_actual, actual))
+        naive_abs_error = np.abs(history[self.seasonality:] - history[:-self.seasonality])
+        self.naive_count += len(naive_abs_error)
+        self.naive_abs_error_sum += naive_abs_error.sum()
+        self.last_actual = history[-self.seasonality:]
+
+    def merge(self, other: "StreamingForecastMetrics"):
+        """
+        Adds statistics of another accumulator, e.g. to aggregate a fleet of AGVs.
+        Naive benchmark of the merged accumulator is not continued with new chunks.
+        """
+        self.count += other.count
+        self.non_finite_count += other.non_finite_count
+        self.sums.update(other.sums)
+        self.naive_count += other.naive_count
+        self.naive_abs_error_sum += other.naive_abs_error_sum
+        self.last_actual = np.empty(0)
+        self.abs_error_sketch.merge(other.abs_error_sketch)
+        self.abs_percentage_error_sketch.merge(other.abs_percentage_error_sketch)
+
+    def snapshot(self) -> typing.Dict[str, float]:
+        """
+        Current values of metrics, named as in forecasting_metrics.METRICS (nan if undefined),
+        with counts of accumulated and of skipped non-finite pairs.
+        """
+        if self.count == 0:
+            return {"count": 0, "non_finite_count": self.non_finite_count}
+        mean = {name: total / self.count for name, total in self.sums.items()}
+        naive_mae = self.naive_abs_error_sum / self.naive_count if self.naive_count else np.nan
+        return {
+            "count": self.count,
+            "non_finite_count": self.non_finite_count,
+            "me": mean["error"],
+            "mae": mean["abs_error"],
+            "mse": mean["squared_error"],
+            "rmse": math.sqrt(mean["squared_error"]),
+            "mpe": mean["percentage_error"],
+            "mape": mean["abs_percentage_error"],
+            "smape": mean["symmetric_percentage_error"],
+            "mase": mean["abs_error"] / naive_mae,
+            "mdae": self.abs_error_sketch.quantile(0.5),
+            "mdape": self.abs_percentage_error_sketch.quantile(0.5),
+        }
+
+
+class KeyedStreamingMetrics:
+    """
+    StreamingForecastMetrics kept separately for each key (e.g. AGV id).
+    :param accumulator_kwargs: Passed to StreamingForecastMetrics of each key
+    """
+
+    def __init__(self, **accumulator_kwargs):
+        self.accumulator_kwargs = accumulator_kwargs
+        self.accumulators: typing.Dict[typing.Hashable, StreamingForecastMetrics] = {}
+
+    def update(self, key: typing.Hashable, actual: np.ndarray, predicted: np.ndarray):
+        if key not in self.accumulators:
+            self.accumulators[key] = StreamingForecastMetrics(**self.accumulator_kwargs)
+        self.accumulators[key].update(actual, predicted)
+
+    def snapshot(self) -> typing.Dict[typing.Hashable, typing.Dict[str, float]]:
+        return {key: accumulator.snapshot() for key, accumulator in self.accumulators.items()}
+
+    def total(self) -> typing.Dict[str, float]:
+        """
+        Metrics of all keys together.
+        """
+        total = StreamingForecastMetrics(**self.accumulator_kwargs)
+        for accumulator in self.accumulators.values():
+            total.merge(accumulator)
+        return total.snapshot()
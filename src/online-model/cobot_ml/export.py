@@ -0,0 +1,194 @@
+"""
+Export of trained cobot_ml.models networks to TorchScript and ONNX, so that
+served artifacts do not depend on the cobot_ml.models source and can be run
+without eager PyTorch (e.g. by onnxruntime).
+
+Usage (from src/online-model):
+    python -m cobot_ml.export model/mpc_200_model.pt --window-length 50
+"""
+import argparse
+import inspect
+import os
+import typing
+
+import numpy as np
+import torch
+from torch import nn
+
+from cobot_ml import models
+
+
+class Backends:
+    TORCH = "torch"
+    TORCHSCRIPT = "torchscript"
+    ONNX = "onnx"
+
+
+EXPORTED_SUFFIXES = {
+    Backends.TORCHSCRIPT: ".torchscript.pt",
+    Backends.ONNX: ".onnx",
+}
+
+
+def exported_model_path(model_file: str, backend: str) -> str:
+    """
+    Returns path of the artifact exported for a given backend next to the original checkpoint.
+    """
+    if backend == Backends.TORCH:
+        return model_file
+    if backend not in EXPORTED_SUFFIXES:
+        raise ValueError(f"Cannot handle [{backend}]")
+    return os.path.splitext(model_file)[0] + EXPORTED_SUFFIXES[backend]
+
+
+def input_size(model: nn.Module, window_length: int = None) -> typing.Tuple[int, int]:
+    """
+    Returns (window_length, features_count) of windows accepted by the model.
+    :param model: One of the cobot_ml.models networks
+    :param window_length: History length, required for recurrent networks
+    """
+    if isinstance(model, (models.SCINet, models.SCINet2)):
+        return model.scinet.input_len, model.scinet.input_dim
+    if isinstance(model, (models.LSTM, models.GRU, models.BiLSTM, models.BiGRU)):
+        assert window_length is not None, f"Window length is required to export {model}"
+        return window_length, model.rnn.input_size
+    raise ValueError(f"Cannot handle [{type(model).__name__}]")
+
+
+def sample_windows(
+        model: nn.Module, window_length: int = None, batch_size: int = 8, seed: int = 0
+) -> torch.Tensor:
+    """
+    Random standard normal windows matching the model input, used for tracing and parity checks.
+    """
+    length, features_count = input_size(model, window_length)
+    generator = torch.Generator().manual_seed(seed)
+    return torch.randn(batch_size, length, features_count, generator=generator)
+
+
+def export_torchscript(model: nn.Module, example_input: torch.Tensor, path: str) -> torch.jit.ScriptModule:
+    """
+    Traces the model with example_input and saves the TorchScript module to path.
+    """
+    model.eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input)
+    traced = torch.jit.freeze(traced)
+    torch.jit.save(traced, path)
+    return traced
+
+
+def export_onnx(model: nn.Module, example_input: torch.Tensor, path: str, opset_version: int = 13):
+    """
+    Exports the model to ONNX with a dynamic batch dimension.
+    """
+    model.eval()
+    kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # keep the TorchScript based exporter on PyTorch versions defaulting to dynamo
+        kwargs["dynamo"] = False
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            example_input,
+            path,
+            input_names=["input"],
+            output_names=["output"],
+            dynamic_axes={"input": {0: "batch"}, "output": {0: "batch"}},
+            opset_version=opset_version,
+            **kwargs,
+        )
+
+
+class OnnxModule:
+    """
+    Minimal stand-in for nn.Module running an exported ONNX model with onnxruntime on CPU.
+    Accepts and returns torch tensors, so it can replace the model in StepByStepPredictor.
+    """
+
+    def __init__(self, model_file: str, intra_op_threads: int = 0):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        self.session = onnxruntime.InferenceSession(
+            model_file, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x: torch.Tensor) -> torch.Tensor:
+        x = x.detach().cpu().numpy().astype(np.float32, copy=False)
+        return torch.from_numpy(self.session.run(None, {self.input_name: x})[0])
+
+    def to(self, device):
+        assert torch.device(device).type == "cpu", "ONNX backend runs on CPU only"
+        return self
+
+    def eval(self):
+        return self
+
+
+def load_model(model_file: str, device: str, backend: str = Backends.TORCH):
+    """
+    Loads a model for inference with a given backend.
+    :param model_file: Checkpoint (torch) or exported artifact (torchscript, onnx)
+    :param device: Device to load the model to
+    :param backend: One of Backends
+    """
+    if backend == Backends.TORCH:
+        return torch.load(model_file, map_location=device)
+    if backend == Backends.TORCHSCRIPT:
+        return torch.jit.load(model_file, map_location=device)
+    if backend == Backends.ONNX:
+        return OnnxModule(model_file)
+    raise ValueError(f"Cannot handle [{backend}]")
+
+
+def check_parity(reference: nn.Module, candidate, inputs: torch.Tensor, atol: float = 1e-4) -> float:
+    """
+    Compares outputs of the exported candidate with the reference model.
+    :return: Maximum absolute difference of outputs
+    """
+    with torch.no_grad():
+        expected = reference(inputs)
+        actual = candidate(inputs)
+    max_diff = float((expected - actual).abs().max())
+    assert max_diff <= atol, f"Exported model differs from the reference by {max_diff} (> {atol})"
+    return max_diff
+
+
+def export_all(
+        model_file: str, window_length: int = None, backends=(Backends.TORCHSCRIPT, Backends.ONNX), atol: float = 1e-4
+) -> typing.Dict[str, float]:
+    """
+    Exports checkpoint to all given backends and checks their parity on sample windows.
+    :return: Mapping from backend to maximum absolute difference against the checkpoint
+    """
+    model = torch.load(model_file, map_location="cpu")
+    model.eval()
+    example_input = sample_windows(model, window_length, seed=0)
+    check_inputs = [sample_windows(model, window_length, batch_size=batch_size, seed=1)
+                    for batch_size in (1, 32)]
+
+    differences = {}
+    for backend in backends:
+        path = exported_model_path(model_file, backend)
+        if backend == Backends.TORCHSCRIPT:
+            export_torchscript(model, example_input, path)
+        else:
+            export_onnx(model, example_input, path)
+        exported = load_model(path, "cpu", backend)
+        differences[backend] = max(check_parity(model, exported, inputs, atol) for inputs in check_inputs)
+        print(f"Exported {model} to {path}, max abs difference {differences[backend]:.2e}")
+    return differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model_file", help="Checkpoint saved with torch.save(model)")
+    parser.add_argument("--window-length", type=int, default=None, help="History length of recurrent networks")
+    parser.add_argument("--backends", nargs="+", default=[Backends.TORCHSCRIPT, Backends.ONNX])
+    parser.add_argument("--atol", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    export_all(args.model_file, args.window_length, args.backends, args.atol)
@@ -1,6 +1,14 @@
+import base64
+import collections
+import io
 import json
+import logging
+import os
+import queue
+import threading
 import time
 import typing
+from concurrent.futures import Future
 
 # import evaluation.forecasting_metrics as fm
 import numpy as np
@@ -8,11 +16,15 @@ import pandas as pd
 import torch
 from torch.utils import data
 
-from cobot_ml import detectors
+from cobot_ml import detectors, export, models
 from cobot_ml.data import datasets, patchers
 from cobot_ml.data.datasets import DatasetInputData
+from cobot_ml.instrumentation import METRICS, Counters, Stages
+from cobot_ml.scoring_logging import LOGGER_NAME
 from cobot_ml.training import runners
 
+logger = logging.getLogger(LOGGER_NAME)
+
 
 def dumps_file(path, _object):
     with open(path, "w") as params_file:
@@ -40,15 +52,14 @@ def prepare_dataset(
         channel_values: typing.Union[pd.DataFrame, np.ndarray],
         input_steps: int,
         output_steps: int,
-) -> datasets.TensorPairsDataset:
+        lazy: bool = False,
+) -> typing.Union[datasets.TensorPairsDataset, datasets.WindowsDataset]:
     channel_values = detectors.pad_beginning(channel_values, input_steps)
-    patches = patchers.patch_with_stride(
-        channel_values, input_steps + output_steps, stride=1
-    )
-    patches = [torch.from_numpy(patch.astype(np.float32)) for patch in patches]
-    X = [patch[:input_steps, 1:] for patch in patches]
-    y = [patch[input_steps:, 0] for patch in patches]
-    return datasets.TensorPairsDataset(X, y)
+    if lazy:
+        return datasets.WindowsDataset(np.asarray(channel_values), input_steps, output_steps, slice(1, None))
+    windows = patchers.window_view(np.asarray(channel_values), input_steps + output_steps, stride=1)
+    X, y = datasets.windows_to_tensors(windows, input_steps, slice(1, None))
+    return datasets.ContiguousTensorPairsDataset(X, y)
 
 
 def run_prediction(model_path: str,
@@ -70,7 +81,7 @@ def run_prediction(model_path: str,
     beg = time.time()
     predictions = runners.run_inference(
         model,
-        data.DataLoader(ds, batch_size=batch_size),
+        datasets.batch_loader(ds, batch_size),
         device=device,
     )
     fin = time.time()
@@ -100,13 +111,22 @@ from typing import List, Callable
 
 
 class StepByStepPredictor:
+    """
+    :param model_file: Path to the model, a pickled cobot_ml.models network for the "torch" backend
+        or an artifact produced by cobot_ml.export for "torchscript" and "onnx"
+    :param device: Device to run the model on ("onnx" runs on CPU only)
+    :param columns: Names of expected features
+    :param preprocessing: Function applied to [B, H, F] input before it is fed to the model
+    :param backend: One of cobot_ml.export.Backends
+    """
 
     def __init__(self,
                  model_file: str, device: str,
                  columns: List[str],
                  preprocessing: Callable[[np.ndarray], np.ndarray],
+                 backend: str = export.Backends.TORCH,
                  ):
-        self.model = torch.load(model_file, map_location=device)
+        self.model = export.load_model(model_file, device, backend)
         self.model.to(device)
         self.model.eval()
 
@@ -116,8 +136,8 @@ class StepByStepPredictor:
 
         self.feature_count = len(columns)
 
-        print(f"Model loaded from {model_file} to device {device}.")
-        print(f"Feature count: {self.feature_count}.")
+        logger.info("Model loaded from %s to device %s (%s backend).", model_file, device, backend)
+        logger.info("Feature count: %d.", self.feature_count)
 
     def get_columns(self):
         """
@@ -140,10 +160,467 @@ class StepByStepPredictor:
         _, _, F = input_data.shape
         assert F == self.feature_count, f"Expected {self.feature_count} features, got {F}."
 
-        preprocessed_data = self.preprocessing(input_data)
+        with METRICS.stage(Stages.PREPROCESSING):
+            preprocessed_data = self.preprocessing(input_data)
+
+        with METRICS.stage(Stages.TENSOR_CONVERSION):
+            input_tensor = torch.from_numpy(preprocessed_data).float().to(self.device)
+        # copying the output to host waits for the device, so it is timed with the forward pass
+        with METRICS.stage(Stages.FORWARD), torch.no_grad():
+            output = self.model(input_tensor).cpu().numpy()
+        METRICS.increment(Counters.BATCHES)
+        METRICS.increment(Counters.WINDOWS, len(input_data))
+        return output
+
+
+class AffinePreprocessor:
+    """
+    StandardScaler transform followed by per-feature weighting, folded into
+    a single (x - mean) * (weight / scale) operation.
+    Results are written into preallocated buffers (one per thread and input shape)
+    which are reused by the next call, so callers must consume or copy the output
+    before preprocessing another input on the same thread.
+
+    :param mean: Per-feature mean (StandardScaler.mean_)
+    :param scale: Per-feature scale (StandardScaler.scale_)
+    :param weights: Per-feature weights applied after scaling, None for no weighting
+    :param dtype: Dtype of produced arrays
+    """
+
+    MAX_BUFFERED_SHAPES = 8
+
+    def __init__(self, mean, scale, weights=None, dtype=np.float32):
+        mean = np.asarray(mean, dtype=np.float64)
+        factor = 1.0 / np.asarray(scale, dtype=np.float64)
+        if weights is not None:
+            factor = factor * np.asarray(weights, dtype=np.float64)
+        assert mean.shape == factor.shape, "Mean, scale and weights should have equal lengths"
+        self.mean = mean
+        self.factor = factor.astype(dtype)
+        self.dtype = dtype
+        self._local = threading.local()
+
+    @classmethod
+    def from_scaler(cls, scaler, weights=None, dtype=np.float32) -> "AffinePreprocessor":
+        return cls(scaler.mean_, scaler.scale_, weights, dtype)
+
+    def __call__(self, input_data: np.ndarray) -> np.ndarray:
+        """
+        :param input_data: Array with features in the last dimension, e.g. [B, H, F]
+        :return: Preprocessed array of the same shape
+        """
+        buffer = self._buffer(input_data.shape)
+        np.subtract(input_data, self.mean, out=buffer)
+        np.multiply(buffer, self.factor, out=buffer)
+        return buffer
+
+    def _buffer(self, shape) -> np.ndarray:
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(shape)
+        if buffer is None:
+            if len(buffers) >= self.MAX_BUFFERED_SHAPES:
+                buffers.clear()
+            buffer = buffers[shape] = np.empty(shape, dtype=self.dtype)
+        return buffer
+
+
+class _StreamState:
+    """
+    Per-AGV history kept by StreamingPredictor: ring buffer of preprocessed rows,
+    timestamp of the newest row and optionally the carried recurrent hidden state.
+    """
+
+    def __init__(self, history_length: int, feature_count: int):
+        self.rows = np.zeros((history_length, feature_count), dtype=np.float32)
+        self.head = 0
+        self.count = 0
+        self.last_ts = None
+        self.hidden = None
+        self.steps_since_resync = 0
+
+    def push(self, rows: np.ndarray):
+        history_length = len(self.rows)
+        if len(rows) >= history_length:
+            self.rows[:] = rows[-history_length:]
+            self.head = 0
+            self.count = history_length
+            return
+        end = self.head + len(rows)
+        if end <= history_length:
+            self.rows[self.head: end] = rows
+        else:
+            split = history_length - self.head
+            self.rows[self.head:] = rows[:split]
+            self.rows[: end - history_length] = rows[split:]
+        self.head = end % history_length
+        self.count = min(self.count + len(rows), history_length)
+
+    def window(self) -> np.ndarray:
+        """ Buffered rows in temporal order, shape [H, F] """
+        return np.concatenate([self.rows[self.head:], self.rows[: self.head]])
+
+
+class StreamingPredictor:
+    """
+    Stateful counterpart of StepByStepPredictor for streams in which consecutive
+    requests of the same AGV overlap in all but the newest samples.
+    It keeps a ring buffer of preprocessed rows per agv_id, so callers only send
+    samples the predictor has not seen yet. When the stream has a gap or goes
+    back in time the history is dropped and the caller has to send a full window again.
+
+    With carry_state enabled (unidirectional LSTM / GRU from cobot_ml.models only)
+    the recurrent hidden state is carried forward and only new rows are run through
+    the network. The network then sees more than history_length samples, which is
+    not identical to the windowed computation used in training, so every
+    resync_every updates the state is rebuilt from the buffered window.
+
+    :param predictor: StepByStepPredictor providing model, preprocessing and device
+    :param history_length: History window size (H) the model was trained with
+    :param max_gap: Largest tolerated spacing between consecutive timestamps (seconds)
+    :param carry_state: Carry hidden state between updates instead of recomputing the window
+    :param resync_every: Number of carried updates after which the window is recomputed
+    """
+
+    def __init__(
+            self,
+            predictor: StepByStepPredictor,
+            history_length: int,
+            max_gap: float = 1.5,
+            carry_state: bool = False,
+            resync_every: typing.Optional[int] = None,
+    ):
+        model = predictor.model
+        if carry_state and not (isinstance(model, (models.LSTM, models.GRU)) and not model.rnn.bidirectional):
+            raise ValueError(f"Cannot carry hidden state of [{model}], only unidirectional LSTM and GRU are supported")
+        self.predictor = predictor
+        self.history_length = history_length
+        self.max_gap = max_gap
+        self.carry_state = carry_state
+        self.resync_every = history_length if resync_every is None else resync_every
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def reset(self, agv_id=None):
+        """ Drops history of given AGV, or of all AGVs when agv_id is None """
+        with self._lock:
+            if agv_id is None:
+                self._states.clear()
+            else:
+                self._states.pop(agv_id, None)
+
+    def update(
+            self, agv_id, timestamps: typing.Sequence[float], samples: np.ndarray
+    ) -> typing.Optional[np.ndarray]:
+        """
+        Appends newest samples of an AGV and returns prediction for the updated window.
+        :param agv_id: Identifier of the stream
+        :param timestamps: Timestamps of samples in seconds, ascending
+        :param samples: Raw (not preprocessed) samples in shape [N, F]
+        :return: Array of size [output_size] or None when less than
+            history_length consecutive samples are known for the AGV.
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64).reshape(-1)
+        if len(timestamps) == 0:
+            return None
+        samples = np.asarray(samples).reshape(len(timestamps), -1)
+        assert samples.shape[1] == self.predictor.feature_count, \
+            f"Expected {self.predictor.feature_count} features, got {samples.shape[1]}."
+
+        with self._lock:
+            state = self._states.get(agv_id)
+            if state is None:
+                state = _StreamState(self.history_length, self.predictor.feature_count)
+                self._states[agv_id] = state
+
+            deltas = np.diff(timestamps)
+            broken = np.flatnonzero((deltas <= 0) | (deltas > self.max_gap))
+            if len(broken) > 0:
+                # keep only the newest consecutive run of samples
+                timestamps = timestamps[broken[-1] + 1:]
+                samples = samples[broken[-1] + 1:]
+                self._restart(state)
+            elif state.last_ts is not None and not 0 < timestamps[0] - state.last_ts <= self.max_gap:
+                self._restart(state)
+
+            with METRICS.stage(Stages.PREPROCESSING):
+                rows = self.predictor.preprocessing(samples[np.newaxis])[0].astype(np.float32)
+            state.push(rows)
+            state.last_ts = timestamps[-1]
+            if state.count < self.history_length:
+                return None
+
+            carry = (
+                    self.carry_state
+                    and state.hidden is not None
+                    and len(rows) < self.history_length
+                    and state.steps_since_resync < self.resync_every
+            )
+            if carry:
+                state.steps_since_resync += 1
+                return self._forward(rows, state)
+            state.hidden = None
+            state.steps_since_resync = 0
+            return self._forward(state.window(), state)
+
+    @staticmethod
+    def _restart(state: _StreamState):
+        state.count = 0
+        state.head = 0
+        state.hidden = None
+
+    def _forward(self, rows: np.ndarray, state: _StreamState) -> np.ndarray:
+        model = self.predictor.model
+        with METRICS.stage(Stages.TENSOR_CONVERSION):
+            input_tensor = torch.from_numpy(rows[np.newaxis]).to(self.predictor.device)
+        METRICS.increment(Counters.BATCHES)
+        METRICS.increment(Counters.WINDOWS)
+        with METRICS.stage(Stages.FORWARD), torch.no_grad():
+            if not self.carry_state:
+                return model(input_tensor)[0].cpu().numpy()
+            out, state.hidden = model.rnn(input_tensor, state.hidden)
+            return model.linear(out[:, -1, :])[0].cpu().numpy()
+
+    def step_records(
+            self, records: typing.List[typing.Dict], encoding: str = "json"
+    ) -> typing.List[typing.Optional[np.ndarray]]:
+        """
+        Runs update() for request records carrying "agv_id", "ts" (single timestamp
+        or list, epoch seconds or ISO strings) and "data" (encoded row or rows, see WindowEncodings).
+        Records that fail to decode reset the history of their AGV (if it is given) and yield None.
+        """
+        outputs = []
+        METRICS.increment(Counters.RECORDS, len(records))
+        for idx, record in enumerate(records):
+            try:
+                with METRICS.stage(Stages.DECODE):
+                    timestamps = _timestamps_to_seconds(record["ts"])
+                    samples = decode_window(record["data"], encoding)
+                outputs.append(self.update(record["agv_id"], timestamps, samples))
+            except Exception as e:
+                logger.warning("Encountered error in record %d, history dropped: %r", idx, e)
+                METRICS.increment(Counters.FAILED_RECORDS)
+                agv_id = record.get("agv_id") if isinstance(record, dict) else None
+                # reset(None) would drop history of every AGV
+                if agv_id is not None:
+                    self.reset(agv_id)
+                outputs.append(None)
+        return outputs
+
+
+def _timestamps_to_seconds(timestamps) -> np.ndarray:
+    timestamps = np.atleast_1d(np.asarray(timestamps))
+    if np.issubdtype(timestamps.dtype, np.number):
+        return timestamps.astype(np.float64)
+    return pd.to_datetime(timestamps, utc=True).asi8 / 1e9
+
+
+class BatchingPredictor:
+    """
+    Coalesces concurrent step() calls into batched forward passes of the wrapped predictor.
+    Requests are collected by a background worker for up to max_wait_ms or until
+    max_batch_size windows are pending, run through a single predictor.step() call
+    and the results are fanned back out to the waiting callers.
+
+    :param predictor: Predictor exposing step() and get_columns(), e.g. StepByStepPredictor
+    :param max_batch_size: Number of windows after which a batch is flushed immediately
+    :param max_wait_ms: Maximum time the first request of a batch waits for company
+    :param report_every: Print batch size distribution every report_every batches (0 disables)
+    """
+
+    def __init__(self, predictor, max_batch_size: int = 32, max_wait_ms: float = 5.0, report_every: int = 1000):
+        assert max_batch_size > 0, "Batch size should be positive"
+        assert max_wait_ms >= 0, "Waiting time cannot be negative"
+        self.predictor = predictor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.report_every = report_every
+
+        self._requests = queue.Queue()
+        self._batch_sizes = collections.Counter()
+        self._stats_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._serve, name="BatchingPredictor", daemon=True)
+        self._worker.start()
 
-        input_tensor = torch.from_numpy(preprocessed_data).float().to(self.device)
-        with torch.no_grad():
-            output_tensor = self.model(input_tensor)
+    def get_columns(self):
+        return self.predictor.get_columns()
 
-        return output_tensor.cpu().numpy()
+    def step(self, input_data: np.ndarray) -> np.ndarray:
+        """
+        Same contract as StepByStepPredictor.step(), blocks until the batch
+        containing input_data has been processed.
+        """
+        assert len(input_data.shape) == 3, "Input data should be a 3D array [B, H, F]."
+        future = Future()
+        self._requests.put((input_data, future))
+        return future.result()
+
+    def batch_size_distribution(self) -> typing.Dict[int, int]:
+        """
+        Returns mapping from achieved batch size (in windows) to number of forward passes.
+        """
+        with self._stats_lock:
+            return dict(sorted(self._batch_sizes.items()))
+
+    def close(self):
+        self._requests.put(None)
+        self._worker.join()
+
+    def _serve(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            pending = [request]
+            pending_count = len(request[0])
+            deadline = time.monotonic() + self.max_wait
+            closing = False
+            while pending_count < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                    break
+                pending.append(request)
+                pending_count += len(request[0])
+            self._run_batch(pending, pending_count)
+            if closing:
+                return
+
+    def _run_batch(self, pending, batch_size: int):
+        try:
+            batch = np.concatenate([input_data for input_data, _ in pending])
+            output = self.predictor.step(batch)
+            assert len(output) == batch_size, f"Predictor returned {len(output)} results for {batch_size} windows"
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for input_data, future in pending:
+            future.set_result(output[offset: offset + len(input_data)])
+            offset += len(input_data)
+
+        with self._stats_lock:
+            self._batch_sizes[batch_size] += 1
+            batches_done = sum(self._batch_sizes.values())
+        if self.report_every and batches_done % self.report_every == 0:
+            logger.info("Batch size distribution after %d batches: %s", batches_done, self.batch_size_distribution())
+
+
+def batching_from_env(predictor):
+    """
+    Wraps predictor with BatchingPredictor when COBOT_BATCH_MAX_SIZE is set to a value above 1.
+    COBOT_BATCH_MAX_WAIT_MS controls how long a batch is held open (default 5 ms).
+    """
+    max_batch_size = int(os.getenv("COBOT_BATCH_MAX_SIZE", "1"))
+    if max_batch_size <= 1:
+        return predictor
+    max_wait_ms = float(os.getenv("COBOT_BATCH_MAX_WAIT_MS", "5"))
+    logger.info("Request batching enabled: max_batch_size=%d, max_wait_ms=%s.", max_batch_size, max_wait_ms)
+    return BatchingPredictor(predictor, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+
+class WindowEncodings:
+    """
+    Encodings of "data" in request records, selected by Inputs["encoding"].
+    JSON: JSON encoded nested list (default, as sent by formatPredictionPayload)
+    F32: base64 of little-endian uint32 header [ndim, *shape] followed by little-endian float32 values
+    NPY: base64 of an .npy file (without pickled objects)
+    """
+    JSON = "json"
+    F32 = "f32"
+    NPY = "npy"
+
+
+def encode_window(window: np.ndarray, encoding: str = WindowEncodings.F32) -> str:
+    """
+    Encodes window (or batch of windows) for the "data" field of a request record.
+    """
+    if encoding == WindowEncodings.JSON:
+        return json.dumps(np.asarray(window).tolist())
+    if encoding == WindowEncodings.F32:
+        window = np.ascontiguousarray(window, dtype="<f4")
+        header = np.array([window.ndim, *window.shape], dtype="<u4")
+        return base64.b64encode(header.tobytes() + window.tobytes()).decode("ascii")
+    if encoding == WindowEncodings.NPY:
+        buffer = io.BytesIO()
+        np.save(buffer, np.asarray(window, dtype="<f4"), allow_pickle=False)
+        return base64.b64encode(buffer.getvalue()).decode("ascii")
+    raise ValueError(f"Cannot handle [{encoding}]")
+
+
+def decode_window(payload: str, encoding: str = WindowEncodings.JSON) -> np.ndarray:
+    """
+    Decodes "data" field of a request record. Binary encodings are returned as
+    read-only views over the base64-decoded bytes, without copying the values.
+    """
+    if encoding == WindowEncodings.JSON:
+        # as assigning to the float input array did: null becomes nan, non numeric strings raise
+        return np.asarray(json.loads(payload), dtype=np.float64)
+    raw = base64.b64decode(payload)
+    if encoding == WindowEncodings.F32:
+        ndim = int(np.frombuffer(raw, dtype="<u4", count=1)[0])
+        shape = tuple(int(dim) for dim in np.frombuffer(raw, dtype="<u4", count=ndim, offset=4))
+        return np.frombuffer(raw, dtype="<f4", count=int(np.prod(shape)), offset=4 * (ndim + 1)).reshape(shape)
+    if encoding == WindowEncodings.NPY:
+        stream = io.BytesIO(raw)
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+        assert not dtype.hasobject, "Object arrays are not accepted"
+        values = np.frombuffer(raw, dtype=dtype, count=int(np.prod(shape)), offset=stream.tell())
+        return values.reshape(shape, order="F" if fortran_order else "C")
+    raise ValueError(f"Cannot handle [{encoding}]")
+
+
+def records_to_windows(
+        records: typing.List[typing.Dict],
+        history_length: int,
+        feature_count: int,
+        encoding: str = WindowEncodings.JSON,
+) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """
+    Builds a [B, H, F] input array from request records. Each record holds
+    a single [H, F] window or a [N, H, F] batch of windows in "data".
+    :param records: Records as received in Inputs["record"]
+    :param history_length: Expected history window size (H)
+    :param feature_count: Expected number of features (F)
+    :param encoding: One of WindowEncodings
+    :return: Input array and boolean mask of windows that were decoded successfully,
+        a record that failed to decode is represented by a single zeroed window.
+        A request with a single binary encoded record is returned without copying.
+    """
+    windows = []
+    decoded = []
+    METRICS.increment(Counters.RECORDS, len(records))
+    for idx, record in enumerate(records):
+        try:
+            with METRICS.stage(Stages.DECODE):
+                window = decode_window(record["data"], encoding)
+            if window.ndim == 2:
+                window = window[np.newaxis]
+            assert window.shape[1:] == (history_length, feature_count), \
+                f"Expected windows of shape {(history_length, feature_count)}, got {window.shape[1:]}"
+            windows.append(window)
+            decoded.append(np.ones(len(window), dtype=bool))
+        except Exception as e:
+            logger.warning("Encountered error in record %d, fallback to 0: %r", idx, e)
+            METRICS.increment(Counters.FAILED_RECORDS)
+            windows.append(np.zeros((1, history_length, feature_count)))
+            decoded.append(np.zeros(1, dtype=bool))
+    if len(windows) == 0:
+        return np.zeros((0, history_length, feature_count)), np.zeros(0, dtype=bool)
+    if len(windows) == 1:
+        return windows[0], decoded[0]
+    with METRICS.stage(Stages.ARRAY_BUILD):
+        return np.concatenate(windows), np.concatenate(decoded)
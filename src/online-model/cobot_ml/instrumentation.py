@@ -0,0 +1,305 @@
+"""
+In-process latency histograms and counters of request handling stages (decoding, preprocessing,
+forward pass, ...), dumped periodically to a file in Prometheus text format or JSON for a local scraper.
+Recording a latency costs a few integer operations, so stages of every request are timed.
+Only the standard library is used, so that scoring scripts can import it without further dependencies.
+
+Example:
+    with instrumentation.METRICS.stage(Stages.FORWARD):
+        output = model(input_tensor)
+    instrumentation.METRICS.increment(Counters.REQUESTS)
+"""
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import typing
+
+from cobot_ml.scoring_logging import LOGGER_NAME
+
+logger = logging.getLogger(LOGGER_NAME)
+
+
+class Stages:
+    REQUEST = "request"
+    DECODE = "decode"
+    ARRAY_BUILD = "array_build"
+    PREPROCESSING = "preprocessing"
+    TENSOR_CONVERSION = "tensor_conversion"
+    FORWARD = "forward"
+    POSTPROCESSING = "postprocessing"
+
+
+class Counters:
+    REQUESTS = "requests"
+    RECORDS = "records"
+    FAILED_RECORDS = "failed_records"
+    WINDOWS = "windows"
+    BATCHES = "batches"
+
+
+class Formats:
+    PROMETHEUS = "prometheus"
+    JSON = "json"
+
+
+# upper bounds (seconds) of Prometheus histogram buckets
+PROMETHEUS_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class LatencyHistogram:
+    """
+    Histogram of latencies with log-linear buckets (as in HdrHistogram): values are counted
+    in microseconds, exactly below 2 ** significant_bits and with relative error below
+    2 ** (1 - significant_bits) above, with memory independent of the number of values.
+    :param significant_bits: Resolution of buckets, 7 gives 1.6% relative error
+    """
+
+    def __init__(self, significant_bits: int = 7):
+        assert significant_bits > 1, "At least two significant bits are required"
+        self.significant_bits = significant_bits
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * ((64 - self.significant_bits + 2) << (self.significant_bits - 1))
+            self.count = 0
+            self.sum = 0.0
+            self.min = float("inf")
+            self.max = 0.0
+
+    def _index(self, microseconds: int) -> int:
+        shift = max(microseconds.bit_length() - self.significant_bits, 0)
+        return (shift << (self.significant_bits - 1)) + (microseconds >> shift)
+
+    def _upper_bound(self, index: int) -> int:
+        """
+        Largest value (whole microseconds) counted in the bucket.
+        """
+        if index < 1 << self.significant_bits:
+            return index
+        shift = (index >> (self.significant_bits - 1)) - 1
+        return ((index - (shift << (self.significant_bits - 1)) + 1) << shift) - 1
+
+    def record(self, seconds: float):
+        microseconds = int(seconds * 1e6) if seconds > 0 else 0
+        index = self._index(microseconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q: float) -> float:
+        """
+        :param q: Percentile in 0-100 range
+        :return: Upper bound (seconds) of the bucket holding the percentile, nan if empty
+        """
+        with self._lock:
+            if self.count == 0:
+                return float("nan")
+            rank = max(1, int(q / 100 * self.count + 0.5))
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    # values are truncated to whole microseconds
+                    return min((self._upper_bound(index) + 1) / 1e6, self.max)
+        return self.max
+
+    def cumulative_counts(self, bounds: typing.Sequence[float]) -> typing.List[int]:
+        """
+        :param bounds: Ascending upper bounds in seconds
+        :return: Number of values below each bound (at the resolution of buckets)
+        """
+        with self._lock:
+            cumulative = list(itertools.accumulate(self.counts))
+        return [cumulative[self._index(int(bound * 1e6))] for bound in bounds]
+
+    def summary(self) -> typing.Dict[str, float]:
+        """
+        Count and latencies in milliseconds.
+        """
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": self.sum / self.count * 1e3,
+            "min_ms": self.min * 1e3,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p90_ms": self.percentile(90) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+            "p999_ms": self.percentile(99.9) * 1e3,
+            "max_ms": self.max * 1e3,
+        }
+
+
+class _StageTimer:
+    __slots__ = ("histogram", "tick")
+
+    def __init__(self, histogram: LatencyHistogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.tick = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.record(time.perf_counter() - self.tick)
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+class Metrics:
+    """
+    Registry of stage latency histograms and counters.
+    :param prefix: Prefix of exported metric names
+    :param enabled: With False stages and counters are not recorded
+    """
+
+    def __init__(self, prefix: str = "cobot", enabled: bool = True):
+        self.prefix = prefix
+        self.enabled = enabled
+        self.histograms: typing.Dict[str, LatencyHistogram] = {}
+        self.counters: typing.Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._dump_thread = None
+        self._dump_stop = threading.Event()
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram())
+        return histogram
+
+    def stage(self, stage: str):
+        """
+        Context manager recording latency of its body as the given stage.
+        """
+        if not self.enabled:
+            return _NO_TIMER
+        return _StageTimer(self.histogram(stage))
+
+    def record(self, stage: str, seconds: float):
+        if self.enabled:
+            self.histogram(stage).record(seconds)
+
+    def increment(self, counter: str, value: int = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def _snapshot(self):
+        with self._lock:
+            return sorted(self.histograms.items()), sorted(self.counters.items())
+
+    def to_json(self) -> typing.Dict:
+        histograms, counters = self._snapshot()
+        return {
+            "timestamp": time.time(),
+            "stages": {stage: histogram.summary() for stage, histogram in histograms},
+            "counters": dict(counters),
+        }
+
+    def to_prometheus(self) -> str:
+        name = f"{self.prefix}_stage_latency_seconds"
+        lines = [
+            f"# HELP {name} Latency of request handling stages",
+            f"# TYPE {name} histogram",
+        ]
+        histograms, counters = self._snapshot()
+        for stage, histogram in histograms:
+            counts = histogram.cumulative_counts(PROMETHEUS_BUCKETS)
+            for bound, count in zip(PROMETHEUS_BUCKETS, counts):
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {count}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.9g}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+        for counter, value in counters:
+            lines.append(f"# TYPE {self.prefix}_{counter}_total counter")
+            lines.append(f"{self.prefix}_{counter}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str, format: str = Formats.PROMETHEUS):
+        """
+        Writes metrics to a temporary file renamed to path, so a scraper never reads a partial dump.
+        """
+        if format == Formats.PROMETHEUS:
+            content = self.to_prometheus()
+        elif format == Formats.JSON:
+            content = json.dumps(self.to_json(), indent=4)
+        else:
+            raise ValueError(f"Cannot handle [{format}]")
+        temporary_path = f"{path}.tmp"
+        with open(temporary_path, "w") as dump_file:
+            dump_file.write(content)
+        os.replace(temporary_path, path)
+
+    def start_periodic_dump(self, path: str, interval: float = 10.0, format: str = Formats.PROMETHEUS):
+        """
+        Dumps metrics every interval seconds on a background thread.
+        """
+        self.stop_periodic_dump()
+        self._dump_stop.clear()
+
+        def dump_loop():
+            while not self._dump_stop.wait(interval):
+                try:
+                    self.dump(path, format)
+                except OSError:
+                    logger.exception("Dumping metrics to %s failed", path)
+
+        self._dump_thread = threading.Thread(target=dump_loop, name="metrics-dump", daemon=True)
+        self._dump_thread.start()
+
+    def stop_periodic_dump(self):
+        if self._dump_thread is not None:
+            self._dump_stop.set()
+            self._dump_thread.join()
+            self._dump_thread = None
+
+
+METRICS = Metrics()
+
+
+def metrics_from_env(metrics: Metrics = METRICS) -> Metrics:
+    """
+    Configures metrics of scoring scripts:
+    COBOT_METRICS=0 disables recording,
+    COBOT_METRICS_DUMP_PATH enables the periodic dump to the given file,
+    COBOT_METRICS_DUMP_INTERVAL_S sets its period (default 10 s),
+    COBOT_METRICS_FORMAT selects Formats.PROMETHEUS (default) or Formats.JSON.
+    """
+    metrics.enabled = os.getenv("COBOT_METRICS", "1") != "0"
+    dump_path = os.getenv("COBOT_METRICS_DUMP_PATH")
+    if metrics.enabled and dump_path:
+        interval = float(os.getenv("COBOT_METRICS_DUMP_INTERVAL_S", "10"))
+        format = os.getenv("COBOT_METRICS_FORMAT", Formats.PROMETHEUS)
+        if format not in (Formats.PROMETHEUS, Formats.JSON):
+            raise ValueError(f"Cannot handle [{format}]")
+        logger.info("Metrics dumped to %s every %s s (%s).", dump_path, interval, format)
+        metrics.start_periodic_dump(dump_path, interval, format)
+    return metrics
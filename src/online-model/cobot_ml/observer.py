@@ -1,21 +1,198 @@
+import collections
+import dataclasses
+import threading
+import time
 import typing
 
 
+class BackpressurePolicies:
+    BLOCK = "block"
+    DROP_NEWEST = "drop_newest"
+    DROP_OLDEST = "drop_oldest"
+
+
+@dataclasses.dataclass
+class DispatchStats:
+    published: int = 0
+    delivered: int = 0
+    dropped: int = 0
+    failed: int = 0
+    observer_time: float = 0.0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+
+
+class AsyncDispatcher:
+    """
+    Delivers published events to observers on a background thread, so that slow observers
+    (plots, database writes) do not add to the latency of the publishing detector.
+    Events are taken from the queue in batches, observers added with batched=True get
+    all events of a batch in a single call.
+    Published attributes are passed to observers as they are, they should not be modified after publishing.
+    Exceptions of observers are counted in stats and the last one is kept in last_error.
+    A dispatcher can be shared by many Observable objects (see Observable.set_dispatcher).
+    :param max_queue_size: Number of events waiting for delivery, above which the policy applies
+    :param policy: One of BackpressurePolicies, what publish does when the queue is full:
+        waits for free space, drops the published event or the oldest queued one.
+        Events published by observers themselves are delivered in place when the queue is full
+        under BLOCK, as waiting would block the thread freeing space.
+    :param max_batch_size: Maximum number of events delivered at once
+    """
+
+    def __init__(
+            self, max_queue_size: int = 1024, policy: str = BackpressurePolicies.DROP_NEWEST, max_batch_size: int = 64
+    ):
+        if policy not in (BackpressurePolicies.BLOCK, BackpressurePolicies.DROP_NEWEST,
+                          BackpressurePolicies.DROP_OLDEST):
+            raise ValueError(f"Cannot handle [{policy}]")
+        assert max_queue_size > 0 and max_batch_size > 0, "Queue and batch sizes should be positive"
+        self.max_queue_size = max_queue_size
+        self.policy = policy
+        self.max_batch_size = max_batch_size
+        self.last_error: typing.Optional[Exception] = None
+        self._stats = DispatchStats()
+        self._events = collections.deque()
+        self._in_delivery = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._thread = threading.Thread(target=self._deliver_loop, name="observer-dispatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, observers: typing.Sequence[typing.Callable],
+               batch_observers: typing.Sequence[typing.Callable], attrs: typing.Dict):
+        with self._lock:
+            assert not self._closed, "Dispatcher is closed"
+            self._stats.published += 1
+            while len(self._events) >= self.max_queue_size:
+                if self.policy == BackpressurePolicies.DROP_NEWEST:
+                    self._stats.dropped += 1
+                    return
+                if self.policy == BackpressurePolicies.DROP_OLDEST:
+                    self._events.popleft()
+                    self._stats.dropped += 1
+                elif threading.current_thread() is self._thread:
+                    break
+                else:
+                    self._not_full.wait()
+            else:
+                self._events.append((observers, batch_observers, attrs))
+                self._stats.max_queue_depth = max(self._stats.max_queue_depth, len(self._events))
+                self._not_empty.notify()
+                return
+        failed, elapsed = self._deliver([(observers, batch_observers, attrs)])
+        with self._lock:
+            self._record_delivery(1, failed, elapsed)
+
+    def stats(self) -> DispatchStats:
+        with self._lock:
+            return dataclasses.replace(self._stats, queue_depth=len(self._events))
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until all queued events are delivered.
+        :return: False if the timeout passed first
+        """
+        with self._lock:
+            return self._idle.wait_for(lambda: not self._events and not self._in_delivery, timeout)
+
+    def close(self):
+        """
+        Delivers queued events and stops the background thread.
+        """
+        with self._lock:
+            self._closed = True
+            self._not_empty.notify()
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _deliver_loop(self):
+        while True:
+            with self._lock:
+                self._not_empty.wait_for(lambda: self._events or self._closed)
+                if not self._events:
+                    return
+                batch = [self._events.popleft() for _ in range(min(len(self._events), self.max_batch_size))]
+                self._in_delivery = len(batch)
+                self._not_full.notify_all()
+            failed, elapsed = self._deliver(batch)
+            with self._lock:
+                self._in_delivery = 0
+                self._record_delivery(len(batch), failed, elapsed)
+                self._idle.notify_all()
+
+    def _record_delivery(self, delivered: int, failed: int, elapsed: float):
+        self._stats.delivered += delivered
+        self._stats.failed += failed
+        self._stats.observer_time += elapsed
+
+    def _deliver(self, batch) -> typing.Tuple[int, float]:
+        failed = 0
+        tick = time.perf_counter()
+        batches_of_observers = {}
+        for observers, batch_observers, attrs in batch:
+            for observer in observers:
+                try:
+                    observer(**attrs)
+                except Exception as err:
+                    failed += 1
+                    self.last_error = err
+            for observer in batch_observers:
+                batches_of_observers.setdefault(observer, []).append(attrs)
+        for observer, events in batches_of_observers.items():
+            try:
+                observer(events)
+            except Exception as err:
+                failed += 1
+                self.last_error = err
+        return failed, time.perf_counter() - tick
+
+
 class Observable:
     """
     Class used to publish intermediate results of the detectors.
+    By default observers are called synchronously in publish, with a dispatcher set
+    they are called on its background thread.
     """
 
     def __init__(self):
         self.published_events = {}
+        self.batch_observers = {}
+        self.dispatcher: typing.Optional[AsyncDispatcher] = None
 
-    def add_observer(self, event: str, observer: typing.Callable):
-        if event in self.published_events:
-            self.published_events[event].append(observer)
+    def add_observer(self, event: str, observer: typing.Callable, batched: bool = False):
+        """
+        :param batched: Observer takes a list of attributes of consecutive events instead of
+            attributes of a single event as keyword arguments
+        """
+        observers = self.batch_observers if batched else self.published_events
+        if event in observers:
+            observers[event].append(observer)
         else:
-            self.published_events[event] = [observer]
+            observers[event] = [observer]
+
+    def set_dispatcher(self, dispatcher: typing.Optional[AsyncDispatcher]):
+        """
+        :param dispatcher: Dispatcher delivering events asynchronously, None to call observers in publish
+        """
+        self.dispatcher = dispatcher
 
     def publish(self, event: str, **attrs):
-        if event in self.published_events:
-            for observer in self.published_events[event]:
-                observer(**attrs)
+        observers = self.published_events.get(event, ())
+        batch_observers = self.batch_observers.get(event, ())
+        if not observers and not batch_observers:
+            return
+        if self.dispatcher is not None:
+            self.dispatcher.submit(observers, batch_observers, attrs)
+            return
+        for observer in observers:
+            observer(**attrs)
+        for observer in batch_observers:
+            observer([attrs])
@@ -0,0 +1,129 @@
+"""
+Dynamic int8 quantization of recurrent forecasting models for CPU serving.
+Weights of LSTM / GRU / Linear layers are stored as int8 and activations are
+quantized on the fly, the quantized network is saved with torch.save, so it can be
+served by StepByStepPredictor like any other checkpoint.
+
+Usage (from src/online-model):
+    python -m cobot_ml.quantization model/mpc_200_model.pt --channel-file held_out.npy \
+        --window-length 50 --ds-mode WITH_MPC
+"""
+import argparse
+import copy
+import io
+import os
+import time
+import typing
+
+import numpy as np
+import torch
+from torch import nn
+from torch.utils import data
+
+from cobot_ml import models
+from cobot_ml.data import datasets
+from cobot_ml.data.utilities import DsMode, prepare_dataset
+from cobot_ml.evaluation import forecasting_metrics
+from cobot_ml.inference_utilities import unravel_vector
+from cobot_ml.training import runners
+from cobot_ml.utilities import dumps_file
+
+QUANTIZABLE_MODELS = (models.LSTM, models.GRU, models.BiLSTM, models.BiGRU)
+REPORTED_METRICS = ("mae", "mse", "rmse", "smape", "mase")
+
+
+def quantized_model_path(model_file: str) -> str:
+    return os.path.splitext(model_file)[0] + ".int8.pt"
+
+
+def quantize(model: nn.Module) -> nn.Module:
+    """
+    Returns dynamically quantized copy of the model, the original model is left untouched.
+    """
+    if not isinstance(model, QUANTIZABLE_MODELS):
+        raise ValueError(f"Cannot handle [{type(model).__name__}]")
+    model = copy.deepcopy(model).cpu().eval()
+    return torch.quantization.quantize_dynamic(model, {nn.LSTM, nn.GRU, nn.Linear}, dtype=torch.qint8)
+
+
+def serialized_size(model: nn.Module) -> int:
+    """
+    Size in bytes of the model state, as a proxy of its memory footprint.
+    """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.getbuffer().nbytes
+
+
+def measure_latency(model: nn.Module, input_shape: typing.Tuple[int, ...], repeat: int = 50) -> float:
+    """
+    Returns median forward pass latency in milliseconds.
+    """
+    x = torch.randn(*input_shape)
+    timings = []
+    with torch.no_grad():
+        model(x)
+        for _ in range(repeat):
+            tick = time.perf_counter()
+            model(x)
+            timings.append(time.perf_counter() - tick)
+    return float(np.median(timings) * 1e3)
+
+
+def compare(
+        fp32_model: nn.Module,
+        int8_model: nn.Module,
+        dataset: data.Dataset,
+        batch_size: int = 256,
+        latency_batch_sizes: typing.Sequence[int] = (1, 32),
+        metrics: typing.Sequence[str] = REPORTED_METRICS,
+) -> typing.Dict:
+    """
+    Evaluates both models on a held-out dataset and reports forecast errors,
+    their deltas (int8 - fp32), latency and memory footprint.
+    :param dataset: Dataset as built by cobot_ml.data.utilities.prepare_dataset
+    """
+    device = torch.device("cpu")
+    real_values = np.array(dataset.get_unraveled_targets())
+    window_shape = tuple(dataset[0][0].shape)
+
+    report = {}
+    for name, model in (("fp32", fp32_model), ("int8", int8_model)):
+        predictions = runners.run_inference(model, datasets.batch_loader(dataset, batch_size), device=device)
+        scores = forecasting_metrics.evaluate(real_values, unravel_vector(predictions), metrics)
+        report[name] = {
+            "metrics": {metric: float(score) for metric, score in scores.items()},
+            "latency_ms": {
+                batch: measure_latency(model, (batch, *window_shape)) for batch in latency_batch_sizes
+            },
+            "size_bytes": serialized_size(model),
+        }
+    report["metric_deltas"] = {
+        metric: report["int8"]["metrics"][metric] - report["fp32"]["metrics"][metric] for metric in metrics
+    }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("model_file", help="Checkpoint saved with torch.save(model)")
+    parser.add_argument("--channel-file", required=True, help=".npy with preprocessed held-out channel, target first")
+    parser.add_argument("--window-length", type=int, required=True)
+    parser.add_argument("--ds-mode", choices=[mode.name for mode in DsMode], default=DsMode.WITH_MPC.name)
+    parser.add_argument("--report-file", default=None, help="Where to dump the report as json")
+    args = parser.parse_args()
+
+    fp32_model = torch.load(args.model_file, map_location="cpu")
+    fp32_model.eval()
+    int8_model = quantize(fp32_model)
+    torch.save(int8_model, quantized_model_path(args.model_file))
+
+    held_out = prepare_dataset(
+        np.load(args.channel_file), args.window_length, fp32_model.forecast_length, DsMode[args.ds_mode]
+    )
+    report = compare(fp32_model, int8_model, held_out)
+    for name in ("fp32", "int8"):
+        print(f"{name}: {report[name]}")
+    print(f"metric deltas: {report['metric_deltas']}")
+    if args.report_file is not None:
+        dumps_file(args.report_file, report)
@@ -0,0 +1,245 @@
+"""
+Rolling statistics of all features of a (n_samples, n_features) array computed at once,
+with constant work per sample and feature regardless of the window size.
+Values of the first window_size - 1 samples, without a full window behind them, are nan
+(as in pandas rolling with default min_periods), as are statistics of windows holding nan or inf values.
+"""
+import functools
+import typing
+
+import numpy as np
+from scipy import signal
+
+CHUNK_SIZE = 4096
+
+
+class Statistics:
+    MEAN = "mean"
+    STD = "std"
+    MIN = "min"
+    MAX = "max"
+    ZSCORE = "zscore"
+    EWMA = "ewma"
+
+
+class RollingStatistics:
+    """
+    Rolling statistics over a trailing window of window_size samples (the current one included).
+    Intermediate results (cumulative sums, window extrema) are computed once and shared
+    between statistics, e.g. mean, std and zscore of the same window.
+    Signals are copied once to a features first layout, so that every pass runs over contiguous
+    memory, statistics are returned as (n_samples, n_features) views of it.
+    :param X: Signals in shape (n_samples, n_features)
+    :param window_size: Number of samples in the window
+    """
+
+    def __init__(self, X: np.ndarray, window_size: int):
+        assert X.ndim == 2, "Input should be two dimensional (n_samples, n_features)"
+        assert window_size > 0, "Window size should be positive"
+        self.X = X
+        self.window_size = window_size
+
+    @functools.cached_property
+    def _signals(self) -> np.ndarray:
+        """
+        Signals in shape (n_features, n_samples).
+        """
+        return np.ascontiguousarray(self.X.T, dtype=np.float64)
+
+    @functools.cached_property
+    def _non_finite(self) -> typing.Optional[np.ndarray]:
+        """
+        Mask of nan and inf values in shape (n_features, n_samples), None if there are none.
+        """
+        non_finite = ~np.isfinite(self._signals)
+        return non_finite if non_finite.any() else None
+
+    @functools.cached_property
+    def _incomplete_windows(self) -> typing.Optional[np.ndarray]:
+        """
+        Mask of windows holding non finite values in shape (n_features, n_windows), None if there are none.
+        """
+        if self._non_finite is None:
+            return None
+        counts = np.cumsum(self._non_finite, axis=-1)
+        window_counts = counts[:, self.window_size - 1:].copy()
+        window_counts[:, 1:] -= counts[:, :-self.window_size]
+        return window_counts > 0
+
+    def _mask_incomplete(self, values: np.ndarray) -> np.ndarray:
+        """
+        :param values: Statistic of full windows in shape (n_features, n_windows), modified in place
+        """
+        if self._incomplete_windows is not None:
+            values[self._incomplete_windows] = np.nan
+        return values
+
+    @functools.cached_property
+    def _window_sums(self) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sums and sums of squares of windows, from cumulative sums. To limit the rounding error
+        of long signals, cumulative sums are restarted every CHUNK_SIZE windows and values of
+        each chunk are shifted by its first sample.
+        Non finite values are replaced with the mean of finite values of their feature, so that they
+        neither spill over the rest of the chunk nor move its shift away, windows holding them are
+        masked with _mask_incomplete.
+        :return: Sums and sums of squares of shifted values and the shifts,
+            in shape (n_features, n_windows)
+        """
+        features_count, samples_count = self._signals.shape
+        windows_count = samples_count - self.window_size + 1
+        if windows_count <= 0:
+            empty = np.empty((features_count, 0))
+            return empty, empty, empty
+        chunk_size = max(min(CHUNK_SIZE, windows_count), self.window_size)
+        chunks_count = -(-windows_count // chunk_size)
+        padded = np.zeros((features_count, chunks_count * chunk_size + self.window_size - 1))
+        if self._non_finite is None:
+            padded[:, :samples_count] = self._signals
+        else:
+            finite_counts = np.maximum(samples_count - self._non_finite.sum(axis=-1), 1)
+            fill = np.where(self._non_finite, 0.0, self._signals).sum(axis=-1) / finite_counts
+            np.copyto(padded[:, :samples_count], np.where(self._non_finite, fill[:, np.newaxis], self._signals))
+        # features, chunks, samples of chunk windows
+        chunks = np.lib.stride_tricks.sliding_window_view(
+            padded, chunk_size + self.window_size - 1, axis=1
+        )[:, ::chunk_size]
+        shifts = chunks[..., :1]
+        shifted = chunks - shifts
+
+        def window_sums(values):
+            cumulative = np.cumsum(values, axis=-1, out=values)
+            sums = np.empty((features_count, chunks_count, chunk_size))
+            sums[..., 0] = cumulative[..., self.window_size - 1]
+            np.subtract(cumulative[..., self.window_size:], cumulative[..., :-self.window_size], out=sums[..., 1:])
+            return sums.reshape(features_count, -1)[:, :windows_count]
+
+        squared = np.square(shifted)
+        shifts = np.broadcast_to(shifts, (features_count, chunks_count, chunk_size))
+        return (
+            window_sums(shifted),
+            window_sums(squared),
+            shifts.reshape(features_count, -1)[:, :windows_count],
+        )
+
+    def _full_windows(self, values: np.ndarray) -> np.ndarray:
+        """
+        :param values: Statistic of full windows in shape (n_features, n_windows)
+        :return: Statistic of all samples in shape (n_samples, n_features)
+        """
+        result = np.full(self._signals.shape, np.nan)
+        result[:, self.window_size - 1:] = values
+        return result.T
+
+    @functools.cached_property
+    def mean(self) -> np.ndarray:
+        sums, _, shifts = self._window_sums
+        return self._full_windows(self._mask_incomplete(sums / self.window_size + shifts))
+
+    @functools.cached_property
+    def std(self) -> np.ndarray:
+        """
+        Sample standard deviation (ddof=1), as in pandas.
+        """
+        sums, squared_sums, _ = self._window_sums
+        if self.window_size == 1:
+            return self._full_windows(np.full(sums.shape, np.nan))
+        variance = (squared_sums - np.square(sums) / self.window_size) / (self.window_size - 1)
+        return self._full_windows(self._mask_incomplete(np.sqrt(np.maximum(variance, 0))))
+
+    @functools.cached_property
+    def min(self) -> np.ndarray:
+        return self._full_windows(
+            self._mask_incomplete(_window_extremes(self._signals, self.window_size, np.minimum, np.inf))
+        )
+
+    @functools.cached_property
+    def max(self) -> np.ndarray:
+        return self._full_windows(
+            self._mask_incomplete(_window_extremes(self._signals, self.window_size, np.maximum, -np.inf))
+        )
+
+    @functools.cached_property
+    def zscore(self) -> np.ndarray:
+        """
+        Distance of each sample from the mean of its window, in standard deviations of the window.
+        """
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return ((self._signals - self.mean.T) / self.std.T).T
+
+    def ewma(self, alpha: float) -> np.ndarray:
+        return _ewma(self._signals, alpha).T
+
+    def get(self, statistic: str, **kwargs) -> np.ndarray:
+        """
+        :param statistic: One of Statistics
+        :param kwargs: Parameters of the statistic (alpha of Statistics.EWMA)
+        """
+        if statistic == Statistics.EWMA:
+            return self.ewma(**kwargs)
+        if statistic in (Statistics.MEAN, Statistics.STD, Statistics.MIN, Statistics.MAX, Statistics.ZSCORE):
+            return getattr(self, statistic)
+        raise ValueError(f"Cannot handle [{statistic}]")
+
+
+def ewma(X: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    Exponentially weighted moving average of every feature, run as a single IIR filter:
+    y[0] = x[0], y[t] = alpha * x[t] + (1 - alpha) * y[t - 1]
+    (as pandas ewm(alpha=alpha, adjust=False).mean() of data without nans).
+    :param X: Signals in shape (n_samples, n_features)
+    :param alpha: Smoothing factor in (0, 1] range
+    """
+    return _ewma(np.ascontiguousarray(X.T, dtype=np.float64), alpha).T
+
+
+def rolling_mean(X: np.ndarray, window_size: int) -> np.ndarray:
+    return RollingStatistics(X, window_size).mean
+
+
+def rolling_std(X: np.ndarray, window_size: int) -> np.ndarray:
+    return RollingStatistics(X, window_size).std
+
+
+def rolling_min(X: np.ndarray, window_size: int) -> np.ndarray:
+    return RollingStatistics(X, window_size).min
+
+
+def rolling_max(X: np.ndarray, window_size: int) -> np.ndarray:
+    return RollingStatistics(X, window_size).max
+
+
+def _ewma(signals: np.ndarray, alpha: float) -> np.ndarray:
+    """
+    :param signals: Signals in shape (n_features, n_samples)
+    """
+    assert 0 < alpha <= 1, "Smoothing factor should be in (0, 1] range"
+    if signals.shape[1] == 0:
+        return signals.copy()
+    initial_state = (1 - alpha) * signals[:, :1]
+    smoothed, _ = signal.lfilter([alpha], [1, alpha - 1], signals, axis=-1, zi=initial_state)
+    return smoothed
+
+
+def _window_extremes(signals: np.ndarray, window_size: int, ufunc: np.ufunc, fill: float) -> np.ndarray:
+    """
+    Extremes of full windows with the van Herk / Gil-Werman algorithm: the signal is cut into blocks
+    of window_size samples, every window spans the end of one block and the beginning of the next,
+    so its extreme combines a suffix accumulation of the first block with a prefix one of the second.
+    :param signals: Signals in shape (n_features, n_samples)
+    :param ufunc: np.minimum or np.maximum
+    :param fill: Neutral value of ufunc, used to pad the last block
+    :return: Extremes in shape (n_features, n_windows)
+    """
+    features_count, samples_count = signals.shape
+    if samples_count < window_size:
+        return np.empty((features_count, 0))
+    blocks_count = -(-samples_count // window_size)
+    padded = np.full((features_count, blocks_count * window_size), fill)
+    padded[:, :samples_count] = signals
+    blocks = padded.reshape(features_count, blocks_count, window_size)
+    prefix = ufunc.accumulate(blocks, axis=-1).reshape(padded.shape)
+    suffix = np.empty_like(blocks)
+    ufunc.accumulate(blocks[..., ::-1], axis=-1, out=suffix[..., ::-1])
+    suffix = suffix.reshape(padded.shape)
+    return ufunc(suffix[:, : samples_count - window_size + 1], prefix[:, window_size - 1: samples_count])
@@ -0,0 +1,168 @@
+"""
+Logging of scoring scripts, kept off the request path:
+records are queued and formatted and written by a background thread,
+request payloads are logged only for a sample of requests and for failed ones.
+
+Configured with environment variables (see logging_from_env):
+    COBOT_LOG_LEVEL          Level of the scoring logger (default INFO)
+    COBOT_LOG_SAMPLE_RATE    Fraction of requests with payloads logged (default 0.01)
+    COBOT_LOG_FORMAT         "text" (default) or "json", one JSON object per line
+    COBOT_LOG_QUEUE_SIZE     Records waiting to be written, further ones are dropped (default 10000)
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import typing
+
+LOGGER_NAME = "cobot_ml.scoring"
+
+
+class LogFormats:
+    TEXT = "text"
+    JSON = "json"
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as a single line JSON object.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+_IMMUTABLE_ARGS = (str, bytes, int, float, bool, type(None))
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler leaving formatting of records (timestamps, JSON, ...) to the listener thread.
+    Messages with arguments other than immutable values (request payloads, arrays) are rendered
+    when logged, so that later changes of these objects do not show up in the log.
+    Records logged while the queue is full are dropped and counted.
+    """
+
+    def __init__(self, records: queue.Queue):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args.values() if isinstance(record.args, dict) else record.args or ()
+        if not all(isinstance(arg, _IMMUTABLE_ARGS) for arg in args):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _DrainingQueueListener(logging.handlers.QueueListener):
+    """
+    QueueListener waiting for free space in a full queue when stopped, instead of failing.
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class ScoringLogging:
+    """
+    Queue based logging of a scoring script.
+    :param level: Level of the logger
+    :param sample_rate: Fraction of requests for which should_log_payloads() is True
+    :param format: One of LogFormats
+    :param queue_size: Number of records waiting to be written
+    :param stream: Where records are written (default sys.stdout, as captured by the deployment)
+    """
+
+    def __init__(
+            self,
+            level: typing.Union[int, str] = logging.INFO,
+            sample_rate: float = 0.01,
+            format: str = LogFormats.TEXT,
+            queue_size: int = 10000,
+            stream: typing.TextIO = None,
+    ):
+        assert 0 <= sample_rate <= 1, "Sample rate should be in 0-1 range"
+        if format == LogFormats.JSON:
+            formatter = JsonFormatter()
+        elif format == LogFormats.TEXT:
+            formatter = logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s")
+        else:
+            raise ValueError(f"Cannot handle [{format}]")
+        self.sample_rate = sample_rate
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self.logger.setLevel(level)
+        self.logger.propagate = False
+
+        stream_handler = logging.StreamHandler(sys.stdout if stream is None else stream)
+        stream_handler.setFormatter(formatter)
+        self.handler = _DeferredQueueHandler(queue.Queue(queue_size))
+        self.listener = _DrainingQueueListener(self.handler.queue, stream_handler)
+        self.listener.start()
+        self.logger.addHandler(self.handler)
+        self._closed = False
+
+    @property
+    def dropped(self) -> int:
+        return self.handler.dropped
+
+    def should_log_payloads(self) -> bool:
+        """
+        Decides if payloads of the current request are logged.
+        """
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def close(self):
+        """
+        Writes queued records and detaches the handler from the logger.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.logger.removeHandler(self.handler)
+        self.listener.stop()
+
+
+_active: typing.Optional[ScoringLogging] = None
+
+
+def configure(**kwargs) -> ScoringLogging:
+    """
+    Sets up logging of scoring scripts, replacing the previous configuration.
+    :param kwargs: Passed to ScoringLogging
+    """
+    global _active
+    if _active is not None:
+        _active.close()
+    else:
+        atexit.register(lambda: _active.close())
+    _active = ScoringLogging(**kwargs)
+    return _active
+
+
+def logging_from_env() -> ScoringLogging:
+    return configure(
+        level=os.getenv("COBOT_LOG_LEVEL", "INFO").upper(),
+        sample_rate=float(os.getenv("COBOT_LOG_SAMPLE_RATE", "0.01")),
+        format=os.getenv("COBOT_LOG_FORMAT", LogFormats.TEXT),
+        queue_size=int(os.getenv("COBOT_LOG_QUEUE_SIZE", "10000")),
+    )
@@ -0,0 +1,227 @@
+"""
+Backtesting of forecasting models on folds of cobot_ml.evaluation.model_selection.TimeSeriesSplit,
+with folds trained in parallel worker processes.
+The channel array is saved once to a .npy file and memory mapped read-only by every worker,
+instead of being pickled to each of them.
+
+Example:
+    result = run_backtest(
+        channel_values,
+        TimeSeriesSplit(n_splits=10),
+        model_factory=functools.partial(models.LSTM, features_count=24, forecast_length=10),
+        prepare_dataset_fn=functools.partial(
+            prepare_dataset, input_steps=50, output_steps=10, ds_mode=DsMode.WITH_MPC
+        ),
+    )
+    print(result.summary())
+Model factory and dataset preparation function are sent to workers, so they must be picklable
+(module level functions, classes or functools.partial of them).
+"""
+import concurrent.futures
+import dataclasses
+import multiprocessing
+import os
+import tempfile
+import time
+import typing
+
+import numpy as np
+import torch
+from torch import nn
+from torch.utils import data
+
+from cobot_ml.data import datasets
+from cobot_ml.evaluation import forecasting_metrics
+from cobot_ml.evaluation.model_selection import TimeSeriesSplit
+from cobot_ml.inference_utilities import unravel_vector
+from cobot_ml.training import runners
+
+
+@dataclasses.dataclass
+class TrainingConfig:
+    number_of_epochs: int = 20
+    patience: int = 3
+    batch_size: int = 256
+    learning_rate: float = 1e-3
+    valid_fraction: float = 0.2
+    metrics: typing.Tuple[str, ...] = ("mae", "mse", "rmse", "smape", "mase")
+    seed: int = 0
+
+
+@dataclasses.dataclass
+class FoldResult:
+    fold: int
+    train_samples: int
+    test_samples: int
+    metrics: typing.Dict[str, float]
+    best_epoch: int
+    epoch_count: int
+    prepare_time: float
+    train_time: float
+    evaluate_time: float
+    worker_pid: int
+
+    @property
+    def total_time(self) -> float:
+        return self.prepare_time + self.train_time + self.evaluate_time
+
+
+@dataclasses.dataclass
+class BacktestResult:
+    folds: typing.List[FoldResult]
+    wall_time: float
+
+    def summary(self) -> typing.Dict[str, typing.Dict[str, float]]:
+        """
+        Mean and standard deviation of each metric over folds.
+        """
+        names = self.folds[0].metrics.keys() if self.folds else []
+        return {
+            name: {
+                "mean": float(np.mean([fold.metrics[name] for fold in self.folds])),
+                "std": float(np.std([fold.metrics[name] for fold in self.folds])),
+            }
+            for name in names
+        }
+
+    @property
+    def speedup(self) -> float:
+        """
+        Sum of fold times divided by the wall time of the whole backtest.
+        """
+        return sum(fold.total_time for fold in self.folds) / self.wall_time
+
+
+def run_fold(
+        values: np.ndarray,
+        fold: int,
+        train_indices: typing.Union[slice, np.ndarray],
+        test_indices: typing.Union[slice, np.ndarray],
+        model_factory: typing.Callable[[], nn.Module],
+        prepare_dataset_fn: typing.Callable[[np.ndarray], data.Dataset],
+        config: TrainingConfig,
+) -> FoldResult:
+    """
+    Trains a new model on the train part of a fold (its tail used for early stopping)
+    and evaluates it on the test part.
+    """
+    torch.manual_seed(config.seed + fold)
+    tick = time.perf_counter()
+    train_values = np.asarray(values[train_indices])
+    valid_start = int(len(train_values) * (1 - config.valid_fraction))
+    train_dataset = prepare_dataset_fn(train_values[:valid_start])
+    valid_dataset = prepare_dataset_fn(train_values[valid_start:])
+    test_dataset = prepare_dataset_fn(np.asarray(values[test_indices]))
+    prepare_time = time.perf_counter() - tick
+
+    tick = time.perf_counter()
+    model = model_factory()
+    best_model_state, train_logs = runners.run_training(
+        model,
+        nn.MSELoss(),
+        torch.optim.Adam(model.parameters(), lr=config.learning_rate),
+        datasets.batch_loader(train_dataset, config.batch_size, shuffle=True),
+        datasets.batch_loader(valid_dataset, config.batch_size),
+        config.number_of_epochs,
+        config.patience,
+    )
+    model.load_state_dict(best_model_state)
+    train_time = time.perf_counter() - tick
+
+    tick = time.perf_counter()
+    predictions = runners.run_inference(
+        model, datasets.batch_loader(test_dataset, config.batch_size), device=torch.device("cpu")
+    )
+    scores = forecasting_metrics.evaluate(
+        np.asarray(test_dataset.get_unraveled_targets()), unravel_vector(predictions), config.metrics
+    )
+    evaluate_time = time.perf_counter() - tick
+
+    return FoldResult(
+        fold=fold,
+        train_samples=len(train_values),
+        test_samples=len(test_dataset),
+        metrics={name: float(score) for name, score in scores.items()},
+        best_epoch=train_logs["best_epoch"],
+        epoch_count=train_logs["epoch_count"],
+        prepare_time=prepare_time,
+        train_time=train_time,
+        evaluate_time=evaluate_time,
+        worker_pid=os.getpid(),
+    )
+
+
+_shared_values: typing.Optional[np.ndarray] = None
+
+
+def _init_worker(values_file: str, threads_per_worker: int):
+    global _shared_values
+    torch.set_num_threads(threads_per_worker)
+    _shared_values = np.load(values_file, mmap_mode="r")
+
+
+def _run_fold_in_worker(*args) -> FoldResult:
+    return run_fold(_shared_values, *args)
+
+
+def _compact_indices(indices: np.ndarray) -> typing.Union[slice, np.ndarray]:
+    """
+    Contiguous indices (as yielded by TimeSeriesSplit) are sent to workers as slices.
+    """
+    if len(indices) > 0 and indices[-1] - indices[0] == len(indices) - 1 and np.all(np.diff(indices) == 1):
+        return slice(int(indices[0]), int(indices[-1]) + 1)
+    return indices
+
+
+def run_backtest(
+        values: np.ndarray,
+        splitter: TimeSeriesSplit,
+        model_factory: typing.Callable[[], nn.Module],
+        prepare_dataset_fn: typing.Callable[[np.ndarray], data.Dataset],
+        config: TrainingConfig = None,
+        max_workers: int = None,
+        threads_per_worker: int = None,
+) -> BacktestResult:
+    """
+    Trains and evaluates a model on every fold of the splitter.
+    :param values: Channel values, in shape (n_samples, n_features)
+    :param splitter: Splitter yielding (train, test) indices
+    :param model_factory: Creates a new, untrained model
+    :param prepare_dataset_fn: Builds a dataset from a part of values,
+        e.g. functools.partial of cobot_ml.data.utilities.prepare_dataset
+    :param config: Training and evaluation parameters shared by all folds
+    :param max_workers: Number of worker processes (default: one per fold, at most cpu count),
+        with 1 folds are run sequentially in the current process
+    :param threads_per_worker: Torch intra-op threads of each worker (default: cpu count / workers)
+    """
+    config = config or TrainingConfig()
+    splits = [(_compact_indices(train), _compact_indices(test)) for train, test in splitter.split(values)]
+    cpu_count = os.cpu_count() or 1
+    max_workers = max_workers or min(len(splits), cpu_count)
+    threads_per_worker = threads_per_worker or max(1, cpu_count // max_workers)
+
+    tick = time.perf_counter()
+    if max_workers == 1:
+        folds = [
+            run_fold(values, fold, train, test, model_factory, prepare_dataset_fn, config)
+            for fold, (train, test) in enumerate(splits)
+        ]
+        return BacktestResult(folds, time.perf_counter() - tick)
+
+    with tempfile.TemporaryDirectory() as shared_dir:
+        values_file = os.path.join(shared_dir, "values.npy")
+        np.save(values_file, np.ascontiguousarray(values))
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(values_file, threads_per_worker),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _run_fold_in_worker, fold, train, test, model_factory, prepare_dataset_fn, config
+                )
+                for fold, (train, test) in enumerate(splits)
+            ]
+            folds = [future.result() for future in futures]
+    return BacktestResult(folds, time.perf_counter() - tick)
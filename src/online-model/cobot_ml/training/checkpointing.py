@@ -0,0 +1,105 @@
+"""
+Asynchronous checkpointing of the training state, used by runners.run_training to resume
+interrupted trainings.
+The training loop only copies tensors of the state to CPU, serialisation and writing to disk
+happen on a background thread.
+"""
+import inspect
+import os
+import queue
+import threading
+import typing
+
+import torch
+
+CHECKPOINT_FILE = "checkpoint.pt"
+
+
+def detached_copy(obj):
+    """
+    Copy of nested dicts / lists / tuples with all tensors detached and copied to CPU.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: detached_copy(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(detached_copy(value) for value in obj)
+    return obj
+
+
+class AsyncCheckpointer:
+    """
+    Writes training state to directory/checkpoint.pt on a background thread.
+    At most one write is pending, if the disk is slower than training, save() waits for it.
+    Files are written to a temporary path and renamed, so the checkpoint on disk is always complete.
+    :param directory: Where the checkpoint is kept
+    :param every_n_epochs: How often the state is checkpointed (the last epoch always is)
+    """
+
+    def __init__(self, directory: str, every_n_epochs: int = 1):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, CHECKPOINT_FILE)
+        self.every_n_epochs = every_n_epochs
+        self._queue = queue.Queue(maxsize=1)
+        self._error = None
+        self._thread = threading.Thread(target=self._write_loop, name="checkpointer", daemon=True)
+        self._thread.start()
+
+    def is_due(self, epoch: int) -> bool:
+        return (epoch + 1) % self.every_n_epochs == 0
+
+    def save(self, state: typing.Dict):
+        """
+        Copies the state and queues it for writing.
+        """
+        self._raise_if_failed()
+        self._queue.put(detached_copy(state))
+
+    def wait(self):
+        """
+        Blocks until all queued checkpoints are written.
+        """
+        self._queue.join()
+        self._raise_if_failed()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._raise_if_failed()
+
+    def load(self, map_location="cpu") -> typing.Optional[typing.Dict]:
+        """
+        :return: Last written state, None if there is no checkpoint yet
+        """
+        if not os.path.exists(self.path):
+            return None
+        kwargs = {}
+        if "weights_only" in inspect.signature(torch.load).parameters:
+            # checkpoint holds training logs and RNG states besides tensors
+            kwargs["weights_only"] = False
+        return torch.load(self.path, map_location=map_location, **kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write_loop(self):
+        while True:
+            state = self._queue.get()
+            try:
+                if state is None:
+                    return
+                temporary_path = self.path + ".tmp"
+                torch.save(state, temporary_path)
+                os.replace(temporary_path, self.path)
+            except Exception as err:
+                self._error = err
+            finally:
+                self._queue.task_done()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError(f"Writing checkpoint to {self.path} failed") from self._error
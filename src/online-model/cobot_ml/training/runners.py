@@ -1,4 +1,6 @@
 import copy
+import dataclasses
+import random
 import time
 import typing
 
@@ -9,6 +11,68 @@ from torch import nn
 from torch.optim.optimizer import Optimizer
 from torch.utils import data
 
+from cobot_ml.training.checkpointing import AsyncCheckpointer
+
+
+@dataclasses.dataclass
+class FastPath:
+    """
+    Switches of the optimized training mode, all disabled by default (eager fp32 training as before).
+    :param compile: Compile the model with torch.compile (ignored on PyTorch without it)
+    :param bf16_autocast: Run forward passes and losses under bfloat16 autocast
+    :param non_blocking: Asynchronous host to device copies, pair with DataLoader(pin_memory=True)
+    :param device_loss: Accumulate losses on device and synchronise once per epoch, not every step
+    :param cheap_snapshots: Copy the best state into preallocated tensors instead of deep copying it
+    """
+    compile: bool = False
+    bf16_autocast: bool = False
+    non_blocking: bool = False
+    device_loss: bool = False
+    cheap_snapshots: bool = False
+
+    @classmethod
+    def enabled(cls) -> "FastPath":
+        return cls(compile=True, bf16_autocast=True, non_blocking=True, device_loss=True, cheap_snapshots=True)
+
+
+def _run_epoch(
+        model: typing.Callable,
+        data_loader: data.DataLoader,
+        criterion: typing.Callable,
+        device: torch.device,
+        fast_path: FastPath,
+        optimizer: Optimizer = None,
+) -> typing.Tuple[float, int]:
+    """
+    Training (with optimizer) or validation epoch.
+    :return: Mean of batch losses and number of processed samples
+    """
+    device = torch.device(device)
+    losses = []
+    loss_sum = torch.zeros((), dtype=torch.float64, device=device)
+    batches_count = 0
+    samples_count = 0
+    for input, target in data_loader:
+        input = input.to(device, non_blocking=fast_path.non_blocking)
+        target = target.to(device, non_blocking=fast_path.non_blocking)
+        if optimizer is not None:
+            optimizer.zero_grad()
+        with torch.autocast(device_type=device.type, dtype=torch.bfloat16, enabled=fast_path.bf16_autocast):
+            output = model(input)
+            loss = criterion(output, target)
+        if optimizer is not None:
+            loss.backward()
+            optimizer.step()
+        if fast_path.device_loss:
+            loss_sum += loss.detach()
+        else:
+            losses.append(loss.item())
+        batches_count += 1
+        samples_count += len(input)
+    if fast_path.device_loss:
+        return loss_sum.item() / batches_count if batches_count else np.nan, samples_count
+    return np.mean(losses), samples_count
+
 
 def run_training_epoch(
         model: nn.Module,
@@ -16,6 +80,7 @@ def run_training_epoch(
         optimizer: Optimizer,
         criterion: typing.Callable,
         device: torch.device,
+        fast_path: FastPath = None,
 ):
     """
     Function performing one training epoch.
@@ -25,19 +90,10 @@ def run_training_epoch(
         :param optimizer: Optimizer which performs optimization of the training loss.
         :param criterion: Function to calculate training loss.
         :param device: Device where the data will be send.
+        :param fast_path: Optimizations to apply, none by default.
     """
     model.train(True)
-    losses = []
-    for input, target in data_loader:
-        input = input.to(device)
-        target = target.to(device)
-        optimizer.zero_grad()
-        output = model(input)
-        loss = criterion(output, target)
-        loss.backward()
-        optimizer.step()
-        losses.append(loss.item())
-    return np.mean(losses)
+    return _run_epoch(model, data_loader, criterion, device, fast_path or FastPath(), optimizer)[0]
 
 
 def run_validation_epoch(
@@ -45,6 +101,7 @@ def run_validation_epoch(
         data_loader: data.DataLoader,
         criterion: typing.Callable,
         device: torch.device,
+        fast_path: FastPath = None,
 ):
     """
     Function performing one validation epoch.
@@ -54,17 +111,11 @@ def run_validation_epoch(
         :param data_loader: Loader providing data on which model is validated.
         :param criterion: Function to calculate validation loss.
         :param device: Device where the data will be send.
+        :param fast_path: Optimizations to apply, none by default.
     """
     model.train(False)
-    losses = []
     with torch.no_grad():
-        for input, target in data_loader:
-            input = input.to(device)
-            target = target.to(device)
-            output = model(input)
-            loss = criterion(output, target)
-            losses.append(loss.item())
-    return np.mean(losses)
+        return _run_epoch(model, data_loader, criterion, device, fast_path or FastPath())[0]
 
 
 def run_inference(
@@ -87,6 +138,35 @@ def run_inference(
     return torch.cat(outputs)
 
 
+def _snapshot_state(model: nn.Module, fast_path: FastPath, previous: typing.Dict = None) -> typing.Dict:
+    """
+    Copy of the model state dict, with cheap_snapshots copied into tensors of the previous snapshot.
+    """
+    if not fast_path.cheap_snapshots:
+        return copy.deepcopy(model.state_dict())
+    if previous is None:
+        return {name: tensor.detach().clone() for name, tensor in model.state_dict().items()}
+    with torch.no_grad():
+        for name, tensor in model.state_dict().items():
+            previous[name].copy_(tensor)
+    return previous
+
+
+def _get_rng_states() -> typing.Dict:
+    states = {"torch": torch.get_rng_state(), "numpy": np.random.get_state(), "python": random.getstate()}
+    if torch.cuda.is_available():
+        states["cuda"] = torch.cuda.get_rng_state_all()
+    return states
+
+
+def _set_rng_states(states: typing.Dict):
+    torch.set_rng_state(states["torch"])
+    np.random.set_state(states["numpy"])
+    random.setstate(states["python"])
+    if "cuda" in states and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(states["cuda"])
+
+
 def run_training(
         model: nn.Module,
         loss: typing.Callable,
@@ -97,6 +177,10 @@ def run_training(
         patience: int,
         scheduler=None,
         device: torch.device = torch.device("cpu"),
+        on_epoch_end: typing.Callable[[int, typing.Dict], bool] = None,
+        fast_path: FastPath = None,
+        checkpointer: AsyncCheckpointer = None,
+        resume: bool = False,
 ) -> typing.Tuple[typing.Dict, typing.Dict]:
     """
     Run training on provided dataset
@@ -110,18 +194,55 @@ def run_training(
         if the loss on validation dataset does not improve.
     :param scheduler: Learning rate scheduler
     :param device: Device to execute on
+    :param on_epoch_end: Called with epoch number and training logs after every epoch,
+        training is terminated if it returns True (e.g. trial pruned by a hyperparameter sweep)
+    :param fast_path: Optimizations of the training loop, none by default
+    :param checkpointer: If given, model, optimizer, scheduler, early stopping counters, training logs
+        and RNG states are checkpointed in the background every checkpointer.every_n_epochs epochs
+    :param resume: Continue from the checkpointer's last checkpoint, if there is one
     :return: Best model's state dict and dict with training logs
     """
+    fast_path = fast_path or FastPath()
+    forward_model = model
+    if fast_path.compile:
+        if hasattr(torch, "compile"):
+            forward_model = torch.compile(model)
+        else:
+            print(f"torch.compile is not available in PyTorch {torch.__version__}, training eagerly")
+
     best_loss = np.inf
-    best_model_state = copy.deepcopy(model.state_dict())
+    best_model_state = _snapshot_state(model, fast_path)
     epochs_without_improvement = 0
-    train_logs = {"train_loss": [], "valid_loss": [], "epoch_times": [], "best_epoch": 0, "epoch_count": 0}
-    for epoch in tqdm.tqdm(range(number_of_epochs), desc="Training", unit="epoch"):
+    train_logs = {
+        "train_loss": [], "valid_loss": [], "epoch_times": [], "samples_per_second": [], "best_epoch": 0,
+        "epoch_count": 0,
+    }
+    first_epoch = 0
+    checkpoint = checkpointer.load() if checkpointer is not None and resume else None
+    if checkpoint is not None:
+        model.load_state_dict(checkpoint["model"])
+        optimizer.load_state_dict(checkpoint["optimizer"])
+        if scheduler is not None:
+            scheduler.load_state_dict(checkpoint["scheduler"])
+        for name, tensor in checkpoint["best_model_state"].items():
+            best_model_state[name].copy_(tensor)
+        best_loss = checkpoint["best_loss"]
+        epochs_without_improvement = checkpoint["epochs_without_improvement"]
+        train_logs = checkpoint["train_logs"]
+        _set_rng_states(checkpoint["rng_states"])
+        first_epoch = checkpoint["epoch"] + 1
+        print(f"Resumed training from {checkpointer.path} after epoch {checkpoint['epoch']}")
+        if checkpoint["stopped"]:
+            return best_model_state, train_logs
+
+    for epoch in tqdm.tqdm(range(first_epoch, number_of_epochs), desc="Training", unit="epoch"):
         tick = time.time()
-        train_loss = run_training_epoch(
-            model, train_loader, optimizer, loss, device=device
-        )
-        valid_loss = run_validation_epoch(model, valid_loader, loss, device=device)
+        forward_model.train(True)
+        train_loss, train_samples = _run_epoch(forward_model, train_loader, loss, device, fast_path, optimizer)
+        train_time = time.time() - tick
+        forward_model.train(False)
+        with torch.no_grad():
+            valid_loss, _ = _run_epoch(forward_model, valid_loader, loss, device, fast_path)
         if scheduler is not None:
             scheduler.step(valid_loss)
 
@@ -129,29 +250,55 @@ def run_training(
         train_logs["train_loss"].append(train_loss)
         train_logs["valid_loss"].append(valid_loss)
         train_logs["epoch_times"].append(tock - tick)
+        train_logs["samples_per_second"].append(train_samples / train_time)
         train_logs["epoch_count"] = epoch
 
         print(f"train_loss={train_loss}, valid_loss={valid_loss}")
+        stop = False
         if valid_loss < best_loss:
             best_loss = valid_loss
             train_logs["best_epoch"] = epoch
-            best_model_state = copy.deepcopy(model.state_dict())
+            best_model_state = _snapshot_state(model, fast_path, best_model_state)
             epochs_without_improvement = 0
         else:
             epochs_without_improvement += 1
             if epochs_without_improvement >= patience:
                 print(f"Early stopping activated after {epoch} epochs")
-                break
+                stop = True
+        # called on the early stopped epoch too, so that observers see every epoch
+        if on_epoch_end is not None and on_epoch_end(epoch, train_logs) and not stop:
+            print(f"Training stopped by on_epoch_end after {epoch} epochs")
+            stop = True
+
+        if checkpointer is not None and (stop or epoch == number_of_epochs - 1 or checkpointer.is_due(epoch)):
+            checkpointer.save({
+                "epoch": epoch,
+                "stopped": stop,
+                "model": model.state_dict(),
+                "optimizer": optimizer.state_dict(),
+                "scheduler": scheduler.state_dict() if scheduler is not None else None,
+                "best_model_state": best_model_state,
+                "best_loss": best_loss,
+                "epochs_without_improvement": epochs_without_improvement,
+                "train_logs": train_logs,
+                "rng_states": _get_rng_states(),
+            })
+        if stop:
+            break
+    if checkpointer is not None:
+        checkpointer.wait()
     return best_model_state, train_logs
 
 
 def run_prediction(
-        model: torch.nn.Module, data_loader: data.DataLoader
+        model: torch.nn.Module, data_loader: data.DataLoader, device: torch.device = None
 ) -> torch.Tensor:
     model.train(False)
     outputs = []
     with torch.no_grad():
         for input in data_loader:
+            if device is not None:
+                input = input.to(device)
             output = model(input)
             outputs.append(output)
     return torch.cat(outputs)
@@ -0,0 +1,350 @@
+"""
+Hyperparameter sweeps over recurrent cobot_ml.models networks.
+Trials run concurrently in CPU worker processes, losing trials are pruned with the median
+stopping rule on per-epoch valid_loss and results are kept in a local SQLite database.
+Windowed datasets are cached in each worker per (input_length, forecast, DsMode).
+
+Example:
+    store = SweepStore("sweeps.sqlite")
+    trials = grid(model=["LSTM", "GRU"], n_layers=[1, 2], forecast=[10], input_length=[30, 50])
+    run_sweep("mpc_300", channel_values, trials, store, DsMode.WITH_MPC, max_workers=8)
+    store.results("mpc_300")[:5]  # best trials first
+"""
+import concurrent.futures
+import contextlib
+import dataclasses
+import itertools
+import json
+import multiprocessing
+import os
+import sqlite3
+import tempfile
+import time
+import typing
+
+import numpy as np
+import torch
+from torch import nn
+from torch.utils import data
+
+from cobot_ml import models
+from cobot_ml.data import datasets
+from cobot_ml.data.utilities import DsMode, prepare_dataset
+from cobot_ml.training import runners
+from cobot_ml.training.backtesting import TrainingConfig
+
+SWEEPABLE_MODELS = {
+    "LSTM": models.LSTM,
+    "GRU": models.GRU,
+    "BiLSTM": models.BiLSTM,
+    "BiGRU": models.BiGRU,
+}
+
+
+class TrialStatus:
+    RUNNING = "running"
+    COMPLETED = "completed"
+    PRUNED = "pruned"
+    FAILED = "failed"
+
+
+def grid(**space: typing.Sequence) -> typing.List[typing.Dict]:
+    """
+    All combinations of given parameter values, e.g. grid(model=["LSTM", "GRU"], n_layers=[1, 2]).
+    Trial parameters: model, n_layers, forecast, input_length and optional hidden_size, dropout_rate,
+    learning_rate.
+    """
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+# optional trial parameters, in the order they are added to trial names
+OPTIONAL_PARAMS = ("hidden_size", "dropout_rate", "learning_rate")
+
+
+def trial_name(model: nn.Module, params: typing.Dict) -> str:
+    """
+    Name following the model files convention, with optional parameters set by the trial appended,
+    e.g. model=LSTM,layers=2,forecast=10,input_length=50,hidden_size=32
+    """
+    optional = "".join(f",{param}={params[param]}" for param in OPTIONAL_PARAMS if param in params)
+    return f"{model},input_length={params['input_length']}{optional}"
+
+
+class SweepStore:
+    """
+    SQLite database of sweep trials and their per-epoch losses, shared by worker processes.
+    Besides results(), it can be queried directly, e.g.
+        SELECT name, best_valid_loss FROM trials WHERE status = 'completed' ORDER BY best_valid_loss
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS trials (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    sweep TEXT NOT NULL,
+                    name TEXT,
+                    params TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    best_valid_loss REAL,
+                    best_epoch INTEGER,
+                    epoch_count INTEGER,
+                    train_time REAL,
+                    model_file TEXT
+                );
+                CREATE TABLE IF NOT EXISTS epochs (
+                    trial_id INTEGER NOT NULL REFERENCES trials(id),
+                    epoch INTEGER NOT NULL,
+                    train_loss REAL,
+                    valid_loss REAL,
+                    PRIMARY KEY (trial_id, epoch)
+                );
+            """)
+
+    @contextlib.contextmanager
+    def _connect(self) -> typing.Iterator[sqlite3.Connection]:
+        """
+        Connection committing on success and closed on exit.
+        """
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def add_trial(self, sweep: str, params: typing.Dict) -> int:
+        with self._connect() as connection:
+            cursor = connection.execute(
+                "INSERT INTO trials (sweep, params, status) VALUES (?, ?, ?)",
+                (sweep, json.dumps(params, sort_keys=True), TrialStatus.RUNNING),
+            )
+            return cursor.lastrowid
+
+    def record_epoch(self, trial_id: int, epoch: int, train_loss: float, valid_loss: float):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO epochs VALUES (?, ?, ?, ?)",
+                (trial_id, epoch, float(train_loss), float(valid_loss)),
+            )
+
+    def finish_trial(self, trial_id: int, **columns):
+        assignments = ", ".join(f"{column} = ?" for column in columns)
+        with self._connect() as connection:
+            connection.execute(f"UPDATE trials SET {assignments} WHERE id = ?", (*columns.values(), trial_id))
+
+    def best_losses_at(self, sweep: str, epoch: int, exclude_trial_id: int) -> typing.List[float]:
+        """
+        Best valid_loss up to epoch of other trials of the sweep which reached that epoch.
+        """
+        with self._connect() as connection:
+            rows = connection.execute(
+                """
+                SELECT MIN(epochs.valid_loss) FROM epochs JOIN trials ON trials.id = epochs.trial_id
+                WHERE trials.sweep = ? AND trials.id != ? AND epochs.epoch <= ?
+                GROUP BY trials.id HAVING MAX(epochs.epoch) >= ?
+                """,
+                (sweep, exclude_trial_id, epoch, epoch),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def results(self, sweep: str) -> typing.List[typing.Dict]:
+        """
+        Trials of the sweep, best first.
+        """
+        with self._connect() as connection:
+            connection.row_factory = sqlite3.Row
+            rows = connection.execute(
+                "SELECT * FROM trials WHERE sweep = ? ORDER BY best_valid_loss IS NULL, best_valid_loss",
+                (sweep,),
+            ).fetchall()
+        return [{**dict(row), "params": json.loads(row["params"])} for row in rows]
+
+
+@dataclasses.dataclass(frozen=True)
+class MedianStoppingRule:
+    """
+    Prunes a trial whose best valid_loss so far is worse than the median of best losses
+    of other trials at the same epoch.
+    :param min_epochs: Trials are never pruned before this epoch
+    :param min_trials: Minimal number of other trials reaching the epoch to compare with
+    """
+    min_epochs: int = 2
+    min_trials: int = 3
+
+    def should_prune(self, store: SweepStore, sweep: str, trial_id: int, epoch: int, best_loss: float) -> bool:
+        if epoch < self.min_epochs:
+            return False
+        others = store.best_losses_at(sweep, epoch, trial_id)
+        return len(others) >= self.min_trials and best_loss > np.median(others)
+
+
+_datasets_cache: typing.Dict[typing.Tuple, typing.Tuple[data.Dataset, data.Dataset]] = {}
+_datasets_values: typing.Optional[np.ndarray] = None
+_shared_values: typing.Optional[np.ndarray] = None
+
+
+def cached_datasets(
+        values: np.ndarray, input_length: int, forecast: int, ds_mode: DsMode, valid_fraction: float
+) -> typing.Tuple[data.Dataset, data.Dataset]:
+    """
+    Train and validation datasets, built once per process for each (input_length, forecast, DsMode)
+    of the same values array.
+    """
+    global _datasets_values
+    if values is not _datasets_values:
+        _datasets_cache.clear()
+        _datasets_values = values
+    key = (input_length, forecast, ds_mode, valid_fraction)
+    if key not in _datasets_cache:
+        valid_start = int(len(values) * (1 - valid_fraction))
+        _datasets_cache[key] = (
+            prepare_dataset(np.asarray(values[:valid_start]), input_length, forecast, ds_mode),
+            prepare_dataset(np.asarray(values[valid_start:]), input_length, forecast, ds_mode),
+        )
+    return _datasets_cache[key]
+
+
+def run_trial(
+        values: np.ndarray,
+        sweep: str,
+        params: typing.Dict,
+        store: SweepStore,
+        ds_mode: DsMode,
+        config: TrainingConfig,
+        stopping_rule: typing.Optional[MedianStoppingRule],
+        model_dir: str = None,
+) -> int:
+    """
+    Trains a single trial, recording its epochs in the store.
+    :return: Trial id in the store
+    """
+    trial_id = store.add_trial(sweep, params)
+    try:
+        train_dataset, valid_dataset = cached_datasets(
+            values, params["input_length"], params["forecast"], ds_mode, config.valid_fraction
+        )
+        if params["model"] not in SWEEPABLE_MODELS:
+            raise ValueError(f"Cannot handle [{params['model']}]")
+        torch.manual_seed(config.seed)
+        model = SWEEPABLE_MODELS[params["model"]](
+            features_count=train_dataset[0][0].shape[-1],
+            hidden_size=params.get("hidden_size", 80),
+            n_layers=params["n_layers"],
+            forecast_length=params["forecast"],
+            dropout_rate=params.get("dropout_rate", 0.3),
+        )
+        name = trial_name(model, params)
+        store.finish_trial(trial_id, name=name)
+
+        pruned = []
+
+        def on_epoch_end(epoch: int, train_logs: typing.Dict) -> bool:
+            store.record_epoch(trial_id, epoch, train_logs["train_loss"][-1], train_logs["valid_loss"][-1])
+            if stopping_rule is not None and stopping_rule.should_prune(
+                    store, sweep, trial_id, epoch, min(train_logs["valid_loss"])
+            ):
+                pruned.append(epoch)
+            return bool(pruned)
+
+        tick = time.perf_counter()
+        best_model_state, train_logs = runners.run_training(
+            model,
+            nn.MSELoss(),
+            torch.optim.Adam(model.parameters(), lr=params.get("learning_rate", config.learning_rate)),
+            datasets.batch_loader(train_dataset, config.batch_size, shuffle=True),
+            datasets.batch_loader(valid_dataset, config.batch_size),
+            config.number_of_epochs,
+            config.patience,
+            on_epoch_end=on_epoch_end,
+        )
+        model_file = None
+        if model_dir is not None and not pruned:
+            model.load_state_dict(best_model_state)
+            model_file = os.path.join(model_dir, f"{name}.pt")
+            # trials with equal parameters may finish at the same time in different workers
+            temporary_file = f"{model_file}.{trial_id}.tmp"
+            torch.save(model, temporary_file)
+            os.replace(temporary_file, model_file)
+        store.finish_trial(
+            trial_id,
+            status=TrialStatus.PRUNED if pruned else TrialStatus.COMPLETED,
+            best_valid_loss=float(min(train_logs["valid_loss"])),
+            best_epoch=train_logs["best_epoch"],
+            epoch_count=train_logs["epoch_count"],
+            train_time=time.perf_counter() - tick,
+            model_file=model_file,
+        )
+    except Exception:
+        store.finish_trial(trial_id, status=TrialStatus.FAILED)
+        raise
+    return trial_id
+
+
+def _init_worker(values_file: str, threads_per_worker: int):
+    global _shared_values
+    torch.set_num_threads(threads_per_worker)
+    _shared_values = np.load(values_file, mmap_mode="r")
+
+
+def _run_trial_in_worker(*args) -> int:
+    return run_trial(_shared_values, *args)
+
+
+def run_sweep(
+        sweep: str,
+        values: np.ndarray,
+        trials: typing.Sequence[typing.Dict],
+        store: SweepStore,
+        ds_mode: DsMode = DsMode.WITH_MPC,
+        config: TrainingConfig = None,
+        stopping_rule: typing.Optional[MedianStoppingRule] = MedianStoppingRule(),
+        max_workers: int = None,
+        threads_per_worker: int = None,
+        model_dir: str = None,
+) -> typing.List[typing.Dict]:
+    """
+    Runs all trials of a sweep. Trials sharing (input_length, forecast) are submitted next to each other,
+    so they tend to reuse datasets cached by the workers.
+    :param sweep: Name of the sweep in the store
+    :param values: Preprocessed channel values, in shape (n_samples, n_features)
+    :param trials: Parameters of each trial, e.g. from grid()
+    :param store: Where trials and their epochs are recorded
+    :param config: Training parameters shared by all trials
+    :param stopping_rule: Rule pruning losing trials, None disables pruning
+    :param max_workers: Number of worker processes, with 1 trials are run in the current process
+    :param threads_per_worker: Torch intra-op threads of each worker (default: cpu count / workers)
+    :param model_dir: If given, best models of completed trials are saved there
+    :return: Results of the sweep, best trial first
+    """
+    config = config or TrainingConfig()
+    trials = sorted(trials, key=lambda params: (params["input_length"], params["forecast"]))
+    cpu_count = os.cpu_count() or 1
+    max_workers = max_workers or min(len(trials), cpu_count)
+    threads_per_worker = threads_per_worker or max(1, cpu_count // max_workers)
+
+    if max_workers == 1:
+        for params in trials:
+            run_trial(values, sweep, params, store, ds_mode, config, stopping_rule, model_dir)
+        return store.results(sweep)
+
+    with tempfile.TemporaryDirectory() as shared_dir:
+        values_file = os.path.join(shared_dir, "values.npy")
+        np.save(values_file, np.ascontiguousarray(values))
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(values_file, threads_per_worker),
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _run_trial_in_worker, sweep, params, store, ds_mode, config, stopping_rule, model_dir
+                )
+                for params in trials
+            ]
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+    return store.results(sweep)
@@ -1,27 +1,51 @@
+import contextlib
+import contextvars
 import json
 
 import numpy as np
 
 
+_windows_cache = contextvars.ContextVar("cobot_ml_windows_cache", default=None)
+
+
+@contextlib.contextmanager
+def cached_windows():
+    """
+    Within the context get_windows_limits_idxs computes windows of each array only once,
+    e.g. when several metrics are evaluated on the same labels. Arrays are matched by identity,
+    so they must not be modified in place inside the context. Nested contexts share the cache.
+    """
+    if _windows_cache.get() is not None:
+        yield
+        return
+    token = _windows_cache.set({})
+    try:
+        yield
+    finally:
+        _windows_cache.reset(token)
+
+
 def get_windows_limits_idxs(y: np.ndarray):
     """
     Returns tuple containing indices of windows beginning and end
     :param y: Array with labels
-    :return tuple with 2 lists, first one containing indices of windows start
-    and the second one with indices of windows stop.
-    """
-    anomalies_start = []
-    anomalies_stop = []
-    previous = False
-    for idx, is_anomaly in enumerate(y):
-        if not previous and is_anomaly:  # 0 --> 1
-            anomalies_start.append(idx)
-        elif previous and not is_anomaly:  # 1 --> 0
-            anomalies_stop.append(idx - 1)
-        previous = is_anomaly
-    if previous:
-        anomalies_stop.append(len(y) - 1)
-    return anomalies_start, anomalies_stop
+    :return tuple with 2 int arrays, first one containing indices of windows start
+    and the second one with indices of windows stop (inclusive).
+    """
+    cache = _windows_cache.get()
+    if cache is None or not isinstance(y, np.ndarray):
+        return _windows_limits_idxs(y)
+    cached = cache.get(id(y))
+    # the cache keeps a reference to y, so its id cannot be reused within the context
+    if cached is None or cached[0] is not y:
+        cached = cache[id(y)] = (y, _windows_limits_idxs(y))
+    return cached[1]
+
+
+def _windows_limits_idxs(y: np.ndarray):
+    is_anomaly = np.concatenate(([False], np.asarray(y) != 0, [False]))
+    edges = np.flatnonzero(is_anomaly[1:] != is_anomaly[:-1])
+    return edges[0::2], edges[1::2] - 1
 
 
 def create_01_mask_in_ranges(desired_mask_length: int, ranges):
@@ -37,6 +61,33 @@ def create_01_mask_in_ranges(desired_mask_length: int, ranges):
     return result
 
 
+def create_01_mask_from_intervals(desired_mask_length: int, starts: np.ndarray, stops: np.ndarray):
+    """
+    Vectorized create_01_mask_in_ranges taking interval boundaries as arrays.
+    Overlapping intervals are merged, then the mask is written in a single np.repeat pass.
+    :param desired_mask_length: length of mask to be created
+    :param starts: Intervals beginnings
+    :param stops: Intervals ends (exclusive)
+    :return 1D int ndarray
+    """
+    starts = np.clip(np.asarray(starts, dtype=np.intp), 0, desired_mask_length)
+    stops = np.clip(np.asarray(stops, dtype=np.intp), 0, desired_mask_length)
+    non_empty = starts < stops
+    starts, stops = starts[non_empty], stops[non_empty]
+    order = np.argsort(starts, kind="stable")
+    starts, stops = starts[order], np.maximum.accumulate(stops[order])
+    merged_first = np.ones(len(starts), dtype=bool)
+    merged_first[1:] = starts[1:] > stops[:-1]
+    merged_last = np.ones(len(starts), dtype=bool)
+    merged_last[:-1] = merged_first[1:]
+
+    boundaries = np.column_stack((starts[merged_first], stops[merged_last])).ravel()
+    lengths = np.diff(boundaries, prepend=0, append=desired_mask_length)
+    values = np.zeros(len(lengths), dtype=int)
+    values[1::2] = 1
+    return np.repeat(values, lengths)
+
+
 class NumpyEncoder(json.JSONEncoder):
     """ Special json encoder for numpy types """
 
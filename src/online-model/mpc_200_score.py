@@ -4,11 +4,17 @@ from inference_schema.schema_decorators import input_schema, output_schema
 from inference_schema.parameter_types.standard_py_parameter_type import StandardPythonParameterType
 
 import os
+import logging
 import numpy as np
 import torch
 import json
 
-from cobot_ml.inference_utilities import StepByStepPredictor
+from cobot_ml.export import exported_model_path
+from cobot_ml.instrumentation import METRICS, Counters, Stages, metrics_from_env
+from cobot_ml.scoring_logging import LOGGER_NAME, logging_from_env
+from cobot_ml.quantization import quantized_model_path
+from cobot_ml.inference_utilities import AffinePreprocessor, StepByStepPredictor, StreamingPredictor, WindowEncodings, \
+    batching_from_env, records_to_windows
 from sklearn.preprocessing import StandardScaler
 
 selected_columns = [
@@ -121,8 +127,13 @@ class Preprocessor:
         self.scaler.mean_ = np.array(ds_mean)
         self.scaler.scale_ = np.array(ds_scale)
         self.scaler.var_ = np.array(ds_var)
+        self.affine = AffinePreprocessor.from_scaler(self.scaler, self.weights)
 
     def preprocessing(self, input_data):
+        return self.affine(input_data)
+
+    def scaler_preprocessing(self, input_data):
+        """ Reference implementation of preprocessing(), kept for validation and benchmarks """
         B, H, F = input_data.shape
         reshaped = input_data.reshape(-1, F)
         scaled_data = self.scaler.transform(reshaped)
@@ -130,18 +141,38 @@ class Preprocessor:
         return scaled_data * self.weights
 
 
+logger = logging.getLogger(LOGGER_NAME)
+
+
 def init():
-    global model_wrapper
+    global model_wrapper, streaming_wrapper, request_logging
+    request_logging = logging_from_env()
     preprocess = Preprocessor()
     preprocessing = preprocess.preprocessing
     model_file_path = os.path.join(str(os.getenv("AZUREML_MODEL_DIR")), "model/mpc_200_model.pt")
 
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    # "torchscript" and "onnx" serve artifacts exported with `python -m cobot_ml.export`
+    backend = os.getenv("COBOT_MODEL_BACKEND", "torch")
+    if os.getenv("COBOT_MODEL_QUANTIZED", "0") == "1":
+        # int8 checkpoint produced by `python -m cobot_ml.quantization`,
+        # dynamically quantized modules run only on CPU in eager torch
+        if backend != "torch":
+            raise ValueError(f"Cannot handle [{backend}] backend of a quantized model, use torch")
+        model_file_path = quantized_model_path(model_file_path)
+        device = 'cpu'
+    else:
+        model_file_path = exported_model_path(model_file_path, backend)
+        device = 'cuda' if torch.cuda.is_available() and backend != "onnx" else 'cpu'
 
     model_wrapper = StepByStepPredictor(model_file_path, device=device,
                                     columns=selected_columns,
-                                    preprocessing=preprocessing)
-    print("Init completed")
+                                    preprocessing=preprocessing,
+                                    backend=backend)
+    streaming_wrapper = StreamingPredictor(model_wrapper, history_length=50,
+                                           carry_state=os.getenv("COBOT_STREAMING_CARRY_STATE", "0") == "1")
+    model_wrapper = batching_from_env(model_wrapper)
+    metrics_from_env()
+    logger.info("Init completed")
 
 
 standard_sample_input = StandardPythonParameterType({
@@ -149,6 +180,7 @@ standard_sample_input = StandardPythonParameterType({
 })
 sample_input = StandardPythonParameterType({
     'record': [standard_sample_input],
+    'encoding': 'json',
 })
 
 sample_output = StandardPythonParameterType([1.0])
@@ -156,23 +188,44 @@ sample_output = StandardPythonParameterType([1.0])
 @input_schema('Inputs', sample_input)
 @output_schema(sample_output)
 def run(Inputs):
-    print("Received request")
-    print("Received raw data")
-    print(Inputs)
-
-    input_data = np.zeros((1, 50, 56))
-    try:
-        input_data[0] = np.array(json.loads(Inputs["record"][0]["data"]))
-    except Exception as e:
-        print('Encountered error, fallback to 0', e)
-        # TODO: Address this hack
-        return [0.0]
-
-    print("Input data")
-    print(input_data)
-    output_data = model_wrapper.step(input_data)
-    print(output_data[0])
-    print("Finished")
-    return [(float(output_data[0][0]) * 73.6188028) + 331.105838]
-
-
+    METRICS.increment(Counters.REQUESTS)
+    with METRICS.stage(Stages.REQUEST):
+        log_payloads = request_logging.should_log_payloads()
+        logger.debug("Received request")
+        if log_payloads:
+            logger.info("Received raw data: %s", Inputs)
+        try:
+            return predict(Inputs, log_payloads)
+        except Exception:
+            logger.exception("Request failed, raw data: %s", Inputs)
+            raise
+
+
+def predict(Inputs, log_payloads: bool):
+    records = Inputs["record"]
+    encoding = Inputs.get("encoding", WindowEncodings.JSON)
+    streaming = ["agv_id" in record for record in records]
+    if any(streaming) and not all(streaming):
+        raise ValueError("Cannot handle [records with and without agv_id in one request]")
+    if any(streaming):
+        # incremental requests carry only the newest samples of an AGV, None asks for a full window
+        outputs = streaming_wrapper.step_records(records, encoding)
+        with METRICS.stage(Stages.POSTPROCESSING):
+            return [None if output is None else (float(output[0]) * 73.6188028) + 331.105838 for output in outputs]
+
+    input_data, decoded = records_to_windows(records, history_length=50, feature_count=len(selected_columns),
+                                             encoding=encoding)
+    # TODO: Address this hack, records that could not be decoded are answered with 0
+    predictions = np.zeros(len(decoded))
+    if not decoded.any():
+        return predictions.tolist()
+
+    if log_payloads:
+        logger.info("Input data: %s", input_data)
+    output_data = model_wrapper.step(input_data[decoded])
+    if log_payloads:
+        logger.info("Output data: %s", output_data[:, 0])
+    logger.debug("Finished")
+    with METRICS.stage(Stages.POSTPROCESSING):
+        predictions[decoded] = (output_data[:, 0] * 73.6188028) + 331.105838
+        return predictions.tolist()
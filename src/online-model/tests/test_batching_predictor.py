@@ -0,0 +1,147 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+import torch
+
+from cobot_ml import models
+from cobot_ml.inference_utilities import BatchingPredictor, StepByStepPredictor, batching_from_env
+
+FEATURES_COUNT = 3
+HISTORY_LENGTH = 10
+TIMEOUT = 10
+
+
+@pytest.fixture
+def predictor(tmp_path, monkeypatch):
+    monkeypatch.setenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", "1")
+    torch.manual_seed(0)
+    model_file = str(tmp_path / "model.pt")
+    torch.save(models.LSTM(features_count=FEATURES_COUNT, forecast_length=2, n_layers=1), model_file)
+    return StepByStepPredictor(model_file, "cpu", [f"f{idx}" for idx in range(FEATURES_COUNT)], lambda x: x)
+
+
+class RecordingPredictor:
+    """
+    Returns the last value of each window, records sizes of the batches it was called with.
+    """
+
+    def __init__(self, fail_on: float = None):
+        self.fail_on = fail_on
+        self.batch_sizes = []
+
+    def get_columns(self):
+        return ["f0"]
+
+    def step(self, input_data: np.ndarray) -> np.ndarray:
+        self.batch_sizes.append(len(input_data))
+        if self.fail_on is not None and np.any(input_data == self.fail_on):
+            raise RuntimeError("forward pass failed")
+        return input_data[:, -1, :]
+
+
+def window(value: float, batch_size: int = 1) -> np.ndarray:
+    return np.full((batch_size, 1, 1), value)
+
+
+def step_concurrently(predictor, windows):
+    results, errors = [None] * len(windows), [None] * len(windows)
+    start = threading.Barrier(len(windows))
+
+    def call(index):
+        start.wait(TIMEOUT)
+        try:
+            results[index] = predictor.step(windows[index])
+        except Exception as err:
+            errors[index] = err
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(len(windows))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert not any(thread.is_alive() for thread in threads), "step() calls did not return"
+    return results, errors
+
+
+def test_concurrent_steps_equal_unbatched_predictions(predictor):
+    rng = np.random.default_rng(0)
+    windows = [rng.normal(size=(batch_size, HISTORY_LENGTH, FEATURES_COUNT)).astype(np.float32)
+               for batch_size in (1, 1, 3, 1, 2, 1, 1, 5, 1, 1, 1, 2)]
+    batching = BatchingPredictor(predictor, max_batch_size=8, max_wait_ms=20)
+    try:
+        results, errors = step_concurrently(batching, windows)
+    finally:
+        batching.close()
+    assert errors == [None] * len(windows)
+    for input_data, result in zip(windows, results):
+        np.testing.assert_allclose(result, predictor.step(input_data), rtol=1e-5, atol=1e-6)
+    distribution = batching.batch_size_distribution()
+    assert sum(size * count for size, count in distribution.items()) == sum(map(len, windows))
+
+
+def test_batch_is_flushed_at_max_size():
+    recording = RecordingPredictor()
+    # a long wait, batches can only be closed by their size
+    batching = BatchingPredictor(recording, max_batch_size=4, max_wait_ms=60_000)
+    try:
+        results, errors = step_concurrently(batching, [window(value) for value in range(8)])
+    finally:
+        batching.close()
+    assert recording.batch_sizes == [4, 4]
+    assert [result.item() for result in results] == list(range(8))
+
+
+def test_batch_is_flushed_after_max_wait():
+    recording = RecordingPredictor()
+    batching = BatchingPredictor(recording, max_batch_size=100, max_wait_ms=50)
+    try:
+        tick = time.perf_counter()
+        assert batching.step(window(1.0, batch_size=3)).tolist() == [[1.0]] * 3
+        assert 0.04 <= time.perf_counter() - tick < TIMEOUT
+    finally:
+        batching.close()
+    assert recording.batch_sizes == [3]
+    assert batching.batch_size_distribution() == {3: 1}
+
+
+def test_forward_pass_exception_reaches_callers_of_the_batch():
+    recording = RecordingPredictor(fail_on=-1.0)
+    batching = BatchingPredictor(recording, max_batch_size=2, max_wait_ms=60_000)
+    try:
+        results, errors = step_concurrently(batching, [window(-1.0), window(1.0)])
+        assert all(isinstance(err, RuntimeError) for err in errors)
+        # the worker keeps serving following requests
+        results, errors = step_concurrently(batching, [window(2.0), window(3.0)])
+        assert errors == [None, None]
+        assert sorted(result.item() for result in results) == [2.0, 3.0]
+    finally:
+        batching.close()
+
+
+def test_mismatched_predictor_output_is_raised():
+    recording = RecordingPredictor()
+    recording.step = lambda input_data: input_data[:1, -1, :]
+    batching = BatchingPredictor(recording, max_batch_size=1)
+    try:
+        with pytest.raises(AssertionError):
+            batching.step(window(1.0, batch_size=2))
+    finally:
+        batching.close()
+
+
+def test_batching_from_env(monkeypatch):
+    recording = RecordingPredictor()
+    assert batching_from_env(recording) is recording
+    monkeypatch.setenv("COBOT_BATCH_MAX_SIZE", "1")
+    assert batching_from_env(recording) is recording
+    monkeypatch.setenv("COBOT_BATCH_MAX_SIZE", "16")
+    monkeypatch.setenv("COBOT_BATCH_MAX_WAIT_MS", "2.5")
+    batching = batching_from_env(recording)
+    try:
+        assert isinstance(batching, BatchingPredictor)
+        assert (batching.max_batch_size, batching.max_wait) == (16, 0.0025)
+        assert batching.get_columns() == ["f0"]
+    finally:
+        batching.close()
@@ -0,0 +1,42 @@
+import torch
+from torch.utils import data
+
+from cobot_ml.data import datasets
+
+
+def _tensors(count: int = 10):
+    generator = torch.Generator().manual_seed(0)
+    inputs = [torch.randn(5, 3, generator=generator) for _ in range(count)]
+    targets = [torch.randn(2, generator=generator) for _ in range(count)]
+    return inputs, targets
+
+
+def test_batch_loader_matches_per_sample_loader():
+    inputs, targets = _tensors()
+    expected = list(data.DataLoader(datasets.TensorPairsDataset(inputs, targets), batch_size=4))
+    batches = list(datasets.batch_loader(datasets.ContiguousTensorPairsDataset(inputs, targets), 4))
+    assert len(batches) == len(expected)
+    for (batch_inputs, batch_targets), (expected_inputs, expected_targets) in zip(batches, expected):
+        assert torch.equal(batch_inputs, expected_inputs)
+        assert torch.equal(batch_targets, expected_targets)
+
+
+def test_batch_loader_shuffles_whole_dataset():
+    inputs, targets = _tensors()
+    dataset = datasets.ContiguousTensorPairsDataset(inputs, targets)
+    torch.manual_seed(0)
+    shuffled = torch.cat([batch_targets for _, batch_targets in datasets.batch_loader(dataset, 4, shuffle=True)])
+    assert sorted(shuffled[:, 0].tolist()) == sorted(dataset.targets[:, 0].tolist())
+
+
+def test_batch_loader_falls_back_to_data_loader():
+    inputs, targets = _tensors()
+    loader = datasets.batch_loader(datasets.TensorPairsDataset(inputs, targets), 4)
+    assert loader.batch_size == 4
+    assert sum(len(batch_inputs) for batch_inputs, _ in loader) == len(inputs)
+
+
+def test_contiguous_unraveled_targets_match_list_backed():
+    inputs, targets = _tensors()
+    assert torch.equal(datasets.ContiguousTensorPairsDataset(inputs, targets).get_unraveled_targets(),
+                       datasets.TensorPairsDataset(inputs, targets).get_unraveled_targets())
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from cobot_ml.detectors import ProbabilityDetector, Thresholded
+
+THRESHOLD = 0.3
+
+
+class SampleFirstFeatureDetector(ProbabilityDetector):
+    """
+    Probability equal to the first feature, predicted sample by sample only.
+    """
+
+    def _predict_sample(self, X: np.ndarray) -> float:
+        return float(X[0])
+
+
+class BatchFirstFeatureDetector(SampleFirstFeatureDetector):
+    def _predict_batch(self, X: np.ndarray) -> np.ndarray:
+        return X[:, 0].copy()
+
+
+def make_samples(samples_count: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    X = rng.uniform(size=(samples_count, 4))
+    # probabilities at and around the threshold, and at the ends of the range
+    X[:5, 0] = [THRESHOLD, np.nextafter(THRESHOLD, 0), np.nextafter(THRESHOLD, 1), 0.0, 1.0][:samples_count]
+    return X
+
+
+def per_sample(detector, X: np.ndarray) -> np.ndarray:
+    return np.array([detector._predict_sample(sample) for sample in X])
+
+
+@pytest.mark.parametrize("samples_count", [0, 1, 5, 1000])
+def test_predict_batch_equals_per_sample_predictions(samples_count):
+    X = make_samples(samples_count)
+    assert SampleFirstFeatureDetector()._predict_batch(X) is None
+    expected = per_sample(SampleFirstFeatureDetector(), X)
+    np.testing.assert_array_equal(BatchFirstFeatureDetector()._predict_batch(X), expected)
+    np.testing.assert_array_equal(BatchFirstFeatureDetector().predict(X), expected)
+    np.testing.assert_array_equal(SampleFirstFeatureDetector().predict(X), expected)
+
+
+@pytest.mark.parametrize("detector_type", [SampleFirstFeatureDetector, BatchFirstFeatureDetector])
+@pytest.mark.parametrize("samples_count", [0, 1, 5, 1000])
+def test_thresholded_predict_batch_equals_per_sample_predictions(detector_type, samples_count):
+    X = make_samples(samples_count)
+    detector = Thresholded(detector_type(), THRESHOLD)
+    expected = per_sample(detector, X)
+    predictions = detector._predict_batch(X)
+    np.testing.assert_array_equal(predictions, expected)
+    assert predictions.dtype.kind == "i"
+    np.testing.assert_array_equal(detector.predict(X), expected)
+    if samples_count:
+        # probability equal to the threshold is detected, as in _predict_sample
+        assert predictions[:3].tolist() == [1, 1, 0][:samples_count]
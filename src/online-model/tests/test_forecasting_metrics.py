@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from cobot_ml.evaluation.forecasting_metrics import METRICS, ForecastEvaluator, evaluate, evaluate_all
+
+
+def _series(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    actual = 10 + rng.normal(size=shape)
+    return actual, actual + rng.normal(0, 0.5, size=shape)
+
+
+def _reference(actual, predicted, names):
+    results = {}
+    for name in names:
+        try:
+            results[name] = METRICS[name](actual, predicted)
+        except Exception:
+            results[name] = np.nan
+    return results
+
+
+def _assert_results_equal(results, expected):
+    assert results.keys() == expected.keys()
+    for name in expected:
+        assert np.shape(results[name]) == np.shape(expected[name]), name
+        np.testing.assert_allclose(results[name], expected[name], rtol=1e-10, equal_nan=True, err_msg=name)
+
+
+def test_evaluate_all_matches_metric_functions():
+    actual, predicted = _series(200)
+    _assert_results_equal(evaluate_all(actual, predicted), _reference(actual, predicted, set(METRICS)))
+
+
+def test_evaluate_2d_inputs_give_global_scalars():
+    actual, predicted = _series((20, 10))
+    results = evaluate(actual, predicted, METRICS)
+    _assert_results_equal(results, _reference(actual, predicted, METRICS))
+    assert np.ndim(results["mae"]) == 0
+
+
+@pytest.mark.parametrize("predicted_shape", [(10, 1), (9,)])
+def test_evaluate_mismatched_shapes_like_metric_functions(predicted_shape, capsys):
+    actual, _ = _series(10)
+    _, predicted = _series(predicted_shape, seed=1)
+    _assert_results_equal(evaluate(actual, predicted, METRICS), _reference(actual, predicted, METRICS))
+
+
+def test_evaluate_unknown_metric_is_nan(capsys):
+    actual, predicted = _series(10)
+    results = evaluate(actual, predicted, ("mae", "unknown"))
+    assert np.isnan(results["unknown"]) and not np.isnan(results["mae"])
+    assert "Unable to compute metric unknown" in capsys.readouterr().out
+
+
+def test_forecast_evaluator_reduces_stacked_series_along_time():
+    actual, predicted = _series((4, 30))
+    stacked = ForecastEvaluator(actual, predicted).evaluate(METRICS)
+    for idx in range(len(actual)):
+        for name, value in ForecastEvaluator(actual[idx], predicted[idx]).evaluate(METRICS).items():
+            np.testing.assert_allclose(stacked[name][idx], value, rtol=1e-10, err_msg=name)
+
+
+def test_forecast_evaluator_rejects_mismatched_shapes():
+    with pytest.raises(AssertionError):
+        ForecastEvaluator(np.zeros(10), np.zeros((10, 1)))
+    with pytest.raises(ValueError):
+        ForecastEvaluator(np.zeros(10), np.zeros(10)).metric("unknown")
@@ -0,0 +1,85 @@
+"""
+Parity of searchsorted interval matching in KPBeginDifferencesForTP and get_group_*
+with the former nested / per-window loops (kept below as reference).
+"""
+import numpy as np
+import pytest
+
+from cobot_ml.evaluation import metrics
+from cobot_ml.utilities import get_windows_limits_idxs
+
+
+def reference_group_true_positives(y_true, y_pred):
+    return sum(1 in y_pred[start: stop + 1] for start, stop in zip(*get_windows_limits_idxs(y_true)))
+
+
+def reference_group_false_positives(y_true, y_pred):
+    return sum(1 not in y_true[start: stop + 1] for start, stop in zip(*get_windows_limits_idxs(y_pred)))
+
+
+def reference_group_false_negatives(y_true, y_pred):
+    return sum(1 not in y_pred[start: stop + 1] for start, stop in zip(*get_windows_limits_idxs(y_true)))
+
+
+def reference_kp_begin_differences(metric, y_true, y_pred):
+    yt_beg, yt_end = get_windows_limits_idxs(y_true)
+    yp_beg, yp_end = get_windows_limits_idxs(y_pred)
+    at_least_one_TP = False
+    result = 0
+    for t_beg, t_end in zip(yt_beg, yt_end):
+        for p_beg, p_end in zip(yp_beg, yp_end):
+            if max(t_beg, p_beg) <= min(t_end, p_end):
+                result += metric.weight(t_beg, p_beg) * abs(t_beg - p_beg)
+                at_least_one_TP = True
+                break
+    return result if at_least_one_TP else len(y_true)
+
+
+PAIRS = {
+    "group tp": (reference_group_true_positives, metrics.get_group_true_positives),
+    "group fp": (reference_group_false_positives, metrics.get_group_false_positives),
+    "group fn": (reference_group_false_negatives, metrics.get_group_false_negatives),
+}
+KP_METRICS = {
+    "kp const": metrics.KPBeginDifferencesForTP(),
+    "kp bell": metrics.KPBeginDifferencesForTP("bell", 5.0),
+    "kp triangle": metrics.KPBeginDifferencesForTP("triangle", 10.0),
+}
+
+
+def random_labels(rng: np.random.Generator, samples_count: int) -> np.ndarray:
+    """
+    Mix of isolated points and runs of random lengths, including all-zero and all-one series.
+    """
+    density = rng.choice([0.0, 0.02, 0.2, 0.5, 0.9, 1.0])
+    run_length = int(rng.integers(1, 12))
+    runs = rng.random(samples_count // run_length + 1) < density
+    return np.repeat(runs, run_length)[:samples_count].astype(int)
+
+
+def random_label_pairs(trials: int = 500):
+    rng = np.random.default_rng(0)
+    for _ in range(trials):
+        samples_count = int(rng.integers(1, 300))
+        yield random_labels(rng, samples_count), random_labels(rng, samples_count)
+
+
+@pytest.mark.parametrize("name", sorted(PAIRS))
+def test_group_counts_match_reference(name):
+    reference, vectorized = PAIRS[name]
+    for y_true, y_pred in random_label_pairs():
+        assert reference(y_true, y_pred) == vectorized(y_true, y_pred)
+
+
+@pytest.mark.parametrize("name", sorted(KP_METRICS))
+def test_kp_begin_differences_match_reference(name):
+    metric = KP_METRICS[name]
+    for y_true, y_pred in random_label_pairs():
+        expected, actual = reference_kp_begin_differences(metric, y_true, y_pred), metric(y_true, y_pred)
+        assert np.isclose(expected, actual, rtol=1e-12, atol=0), (expected, actual)
+
+
+def test_kp_begin_differences_without_overlap_is_series_length():
+    y_true = np.array([1, 1, 0, 0, 0, 0])
+    y_pred = np.array([0, 0, 0, 1, 1, 0])
+    assert KP_METRICS["kp const"](y_true, y_pred) == len(y_true)
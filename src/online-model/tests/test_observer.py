@@ -0,0 +1,147 @@
+import threading
+
+import pytest
+
+from cobot_ml.observer import AsyncDispatcher, BackpressurePolicies, Observable
+
+TIMEOUT = 10
+
+
+class BlockingObserver:
+    """
+    Records values of events, holds the dispatcher thread on the first one until released.
+    """
+
+    def __init__(self):
+        self.values = []
+        self.started = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self, value):
+        self.started.set()
+        assert self.released.wait(TIMEOUT)
+        self.values.append(value)
+
+
+def hold_dispatcher(dispatcher: AsyncDispatcher, observable: Observable) -> BlockingObserver:
+    # the first event occupies the dispatcher thread, so following ones stay queued
+    observer = BlockingObserver()
+    observable.add_observer("value", observer)
+    observable.set_dispatcher(dispatcher)
+    observable.publish("value", value=-1)
+    assert observer.started.wait(TIMEOUT)
+    return observer
+
+
+def test_block_delivers_all_events_in_order():
+    observable = Observable()
+    values = []
+    observable.add_observer("value", lambda value: values.append(value))
+    with AsyncDispatcher(max_queue_size=4, policy=BackpressurePolicies.BLOCK, max_batch_size=3) as dispatcher:
+        observable.set_dispatcher(dispatcher)
+        for value in range(1000):
+            observable.publish("value", value=value)
+    assert values == list(range(1000))
+    stats = dispatcher.stats()
+    assert (stats.published, stats.delivered, stats.dropped, stats.failed) == (1000, 1000, 0, 0)
+    assert stats.max_queue_depth <= 4
+
+
+@pytest.mark.parametrize("policy, expected", [
+    (BackpressurePolicies.DROP_NEWEST, [-1, 0, 1, 2]),
+    (BackpressurePolicies.DROP_OLDEST, [-1, 7, 8, 9]),
+])
+def test_drop_policies(policy, expected):
+    observable = Observable()
+    with AsyncDispatcher(max_queue_size=3, policy=policy) as dispatcher:
+        observer = hold_dispatcher(dispatcher, observable)
+        for value in range(10):
+            observable.publish("value", value=value)
+        assert dispatcher.stats().queue_depth == 3
+        observer.released.set()
+    assert observer.values == expected
+    stats = dispatcher.stats()
+    assert (stats.published, stats.delivered, stats.dropped) == (11, 4, 7)
+
+
+def test_batched_observers_get_events_of_a_batch_at_once():
+    observable = Observable()
+    batches = []
+    observable.add_observer("value", lambda events: batches.append([event["value"] for event in events]),
+                            batched=True)
+    with AsyncDispatcher(max_batch_size=4) as dispatcher:
+        observer = hold_dispatcher(dispatcher, observable)
+        for value in range(10):
+            observable.publish("value", value=value)
+        observer.released.set()
+    assert batches == [[-1], [0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert observer.values == list(range(-1, 10))
+
+
+def test_flush_and_close_drain_the_queue():
+    observable = Observable()
+    dispatcher = AsyncDispatcher()
+    observer = hold_dispatcher(dispatcher, observable)
+    for value in range(5):
+        observable.publish("value", value=value)
+    assert not dispatcher.flush(timeout=0.01)
+    observer.released.set()
+    assert dispatcher.flush(timeout=TIMEOUT)
+    assert observer.values == list(range(-1, 5))
+    assert dispatcher.stats().queue_depth == 0
+
+    observer.released.clear()
+    for value in range(5, 10):
+        observable.publish("value", value=value)
+    threading.Timer(0.05, observer.released.set).start()
+    dispatcher.close()
+    assert observer.values == list(range(-1, 10))
+    with pytest.raises(AssertionError):
+        observable.publish("value", value=10)
+
+
+def test_observer_exceptions_are_counted():
+    observable = Observable()
+    values = []
+
+    def failing(value):
+        if value % 3 == 0:
+            raise RuntimeError(f"failed on {value}")
+
+    observable.add_observer("value", failing)
+    observable.add_observer("value", lambda value: values.append(value))
+    observable.add_observer("value", lambda events: 1 / 0, batched=True)
+    with AsyncDispatcher(max_batch_size=100) as dispatcher:
+        observable.set_dispatcher(dispatcher)
+        for value in range(10):
+            observable.publish("value", value=value)
+        assert dispatcher.flush(timeout=TIMEOUT)
+        stats = dispatcher.stats()
+        assert stats.delivered == 10
+        assert stats.failed >= 4 + 1
+        assert isinstance(dispatcher.last_error, (RuntimeError, ZeroDivisionError))
+    # other observers still get every event
+    assert values == list(range(10))
+
+
+def test_observer_publishing_on_a_full_blocking_dispatcher():
+    observable = Observable()
+    values = []
+
+    def republish(value):
+        values.append(value)
+        for _ in range(2):
+            observable.publish("nested", value=value)
+
+    observable.add_observer("value", republish)
+    observable.add_observer("nested", lambda value: values.append(("nested", value)))
+    with AsyncDispatcher(max_queue_size=1, policy=BackpressurePolicies.BLOCK) as dispatcher:
+        observable.set_dispatcher(dispatcher)
+        for value in range(10):
+            observable.publish("value", value=value)
+        assert dispatcher.flush(timeout=TIMEOUT)
+    assert [value for value in values if not isinstance(value, tuple)] == list(range(10))
+    assert sorted(value for value in values if isinstance(value, tuple)) == \
+        sorted(("nested", value) for value in range(10) for _ in range(2))
+    stats = dispatcher.stats()
+    assert (stats.published, stats.delivered, stats.dropped) == (30, 30, 0)
@@ -0,0 +1,97 @@
+"""
+Detections of OnlineDetector.update called sample by sample are equal to predictions of the whole signal.
+"""
+import functools
+
+import numpy as np
+import pytest
+
+from cobot_ml.detectors import AllowedValuesDetector, DetectorMultiplexer, MinMaxDetector, MovingStdDetector
+
+
+def make_signal(samples_count: int = 500, seed: int = 0, non_finite=()) -> np.ndarray:
+    signal = np.random.default_rng(seed).normal(1, 1, samples_count)
+    for idx, value in non_finite:
+        signal[idx] = value
+    return signal
+
+
+def online(detector, signal: np.ndarray) -> np.ndarray:
+    detector.reset()
+    return np.array([detector.update(value) for value in signal])
+
+
+def batch(detector, signal: np.ndarray) -> np.ndarray:
+    return detector.predict(signal[:, np.newaxis])
+
+
+NON_FINITE_CASES = {
+    "finite": (),
+    "nan": ((45, np.nan),),
+    "nan while filling": ((3, np.nan),),
+    "nans in one window": ((100, np.nan), (110, np.inf)),
+    "nans in consecutive windows": ((100, np.nan), (125, np.nan), (499, -np.inf)),
+}
+
+
+@pytest.mark.parametrize("case", sorted(NON_FINITE_CASES))
+@pytest.mark.parametrize("window_size", [1, 2, 20, 64])
+def test_moving_std_update_matches_predict(window_size, case):
+    signal = make_signal(non_finite=NON_FINITE_CASES[case])
+    detector = MovingStdDetector(window_size, 0.8, 1.2)
+    expected = batch(detector, signal)
+    # std of a single sample is nan, never detected
+    assert expected.any() != (window_size == 1)
+    np.testing.assert_array_equal(online(detector, signal), expected)
+
+
+def test_moving_std_update_does_not_drift_on_long_streams():
+    signal = 1e6 + make_signal(200_000, seed=1)
+    detector = MovingStdDetector(50, 0.8, 1.2)
+    np.testing.assert_array_equal(online(detector, signal), batch(detector, signal))
+
+
+def test_moving_std_update_accepts_single_feature_arrays():
+    signal = make_signal(100)
+    detector = MovingStdDetector(10, 0.8, 1.2)
+    detector.reset()
+    detections = [detector.update(np.array([value])) for value in signal]
+    np.testing.assert_array_equal(detections, batch(detector, signal))
+
+
+@pytest.mark.parametrize("case", sorted(NON_FINITE_CASES))
+def test_min_max_update_matches_predict(case):
+    signal = make_signal(non_finite=NON_FINITE_CASES[case])
+    detector = MinMaxDetector(-0.5, 2.5)
+    np.testing.assert_array_equal(online(detector, signal), batch(detector, signal))
+
+
+def test_allowed_values_update_matches_predict():
+    signal = np.random.default_rng(0).integers(0, 8, 300).astype(float)
+    signal[[10, 20]] = np.nan
+    detector = AllowedValuesDetector([0, 1, 2, 3, 5])
+    expected = batch(detector, signal)
+    assert expected[10] == expected[20] == 1
+    np.testing.assert_array_equal(online(detector, signal), expected)
+
+
+def test_multiplexer_matches_per_source_predictions():
+    rng = np.random.default_rng(0)
+    sources = rng.choice(["agv_1", "agv_2", "agv_3"], 1500)
+    samples = make_signal(1500, non_finite=((700, np.nan),))
+    factory = functools.partial(MovingStdDetector, 20, 0.8, 1.2)
+    detections = DetectorMultiplexer(factory).update_many(sources, samples)
+    for source in np.unique(sources):
+        mask = sources == source
+        np.testing.assert_array_equal(detections[mask], batch(factory(), samples[mask]))
+
+
+def test_multiplexer_forgets_least_recently_updated_source():
+    multiplexer = DetectorMultiplexer(functools.partial(MovingStdDetector, 5, 0.8, 1.2), max_sources=2)
+    for source in ("agv_1", "agv_2", "agv_1", "agv_3"):
+        multiplexer.update(source, 1.0)
+    assert list(multiplexer.detectors) == ["agv_1", "agv_3"]
+    multiplexer.reset("agv_1")
+    assert list(multiplexer.detectors) == ["agv_3"]
+    multiplexer.reset()
+    assert not multiplexer.detectors
@@ -0,0 +1,41 @@
+import json
+
+import numpy as np
+
+from cobot_ml.inference_utilities import WindowEncodings, decode_window, encode_window, records_to_windows
+
+HISTORY_LENGTH = 4
+FEATURES_COUNT = 2
+
+
+def _record(window) -> dict:
+    return {"data": json.dumps(window)}
+
+
+def test_json_window_is_decoded_as_float():
+    window = decode_window(json.dumps([[1, "2"], [None, 4.5]]))
+    assert window.dtype == np.float64
+    np.testing.assert_array_equal(window, [[1.0, 2.0], [np.nan, 4.5]])
+
+
+def test_non_numeric_record_falls_back_to_zeros():
+    valid = np.arange(HISTORY_LENGTH * FEATURES_COUNT, dtype=float).reshape(HISTORY_LENGTH, FEATURES_COUNT)
+    invalid = valid.tolist()
+    invalid[1][0] = "a"
+    input_data, decoded = records_to_windows(
+        [_record(valid.tolist()), _record(invalid)], history_length=HISTORY_LENGTH, feature_count=FEATURES_COUNT
+    )
+    assert input_data.dtype == np.float64
+    np.testing.assert_array_equal(decoded, [True, False])
+    np.testing.assert_array_equal(input_data[0], valid)
+    np.testing.assert_array_equal(input_data[1], np.zeros((HISTORY_LENGTH, FEATURES_COUNT)))
+
+
+def test_binary_encodings_round_trip():
+    windows = np.random.default_rng(0).normal(size=(3, HISTORY_LENGTH, FEATURES_COUNT)).astype(np.float32)
+    for encoding in (WindowEncodings.F32, WindowEncodings.NPY):
+        input_data, decoded = records_to_windows([{"data": encode_window(windows, encoding)}],
+                                                 history_length=HISTORY_LENGTH, feature_count=FEATURES_COUNT,
+                                                 encoding=encoding)
+        assert decoded.all()
+        np.testing.assert_array_equal(input_data, windows)
@@ -0,0 +1,83 @@
+"""
+Parity of the rolling statistics engine with pandas rolling, on signals longer than rolling.CHUNK_SIZE
+and with nan / inf values.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from cobot_ml import rolling
+from cobot_ml.detectors import MinMaxDetector, MovingStdDetector, RollingCheck, RollingStatisticsDetector
+
+SAMPLES_COUNT = 10_000
+
+
+def make_signals(with_gaps: bool) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    X = 100 + rng.normal(0, 1, (SAMPLES_COUNT, 3)).cumsum(axis=0) * 0.05 + rng.normal(0, 2, (SAMPLES_COUNT, 3))
+    if with_gaps:
+        X[rng.integers(0, SAMPLES_COUNT, 5), 0] = np.nan
+        X[[0, 4095, 4096, SAMPLES_COUNT - 1], 1] = np.nan
+        X[[17, 5000], 2] = np.inf
+    return X
+
+
+@pytest.mark.parametrize("with_gaps", [False, True])
+@pytest.mark.parametrize("window_size", [1, 2, 7, 50, 1000])
+@pytest.mark.parametrize("statistic", ["mean", "std", "min", "max"])
+def test_statistics_match_pandas(statistic, window_size, with_gaps):
+    X = make_signals(with_gaps)
+    expected = getattr(pd.DataFrame(X).rolling(window_size), statistic)().to_numpy()
+    actual = rolling.RollingStatistics(X, window_size).get(statistic)
+    assert actual.shape == X.shape
+    np.testing.assert_allclose(actual, expected, rtol=1e-7, atol=1e-7)
+
+
+def test_nan_masks_only_windows_holding_it():
+    X = np.arange(20, dtype=float)[:, np.newaxis]
+    X[10] = np.nan
+    std = rolling.rolling_std(X, 4)[:, 0]
+    np.testing.assert_array_equal(np.flatnonzero(np.isnan(std)), [0, 1, 2, 10, 11, 12, 13])
+
+
+def test_zscore_matches_pandas():
+    X = make_signals(with_gaps=True)
+    frame = pd.DataFrame(X)
+    expected = ((frame - frame.rolling(50).mean()) / frame.rolling(50).std()).to_numpy()
+    np.testing.assert_allclose(rolling.RollingStatistics(X, 50).zscore, expected, rtol=1e-6, atol=1e-9)
+
+
+def test_ewma_matches_pandas():
+    X = make_signals(with_gaps=False)
+    expected = pd.DataFrame(X).ewm(alpha=0.1, adjust=False).mean().to_numpy()
+    np.testing.assert_allclose(rolling.ewma(X, 0.1), expected, rtol=1e-10)
+
+
+def test_statistics_of_signal_shorter_than_window_are_nan():
+    X = make_signals(with_gaps=False)[:5]
+    statistics = rolling.RollingStatistics(X, 10)
+    for statistic in ("mean", "std", "min", "max"):
+        assert np.isnan(statistics.get(statistic)).all()
+
+
+@pytest.mark.parametrize("with_gaps", [False, True])
+def test_moving_std_detector_matches_pandas_detections(with_gaps):
+    X = make_signals(with_gaps)[:, :1]
+    expected_stds = pd.Series(X.flatten()).rolling(50).std().values[:, np.newaxis]
+    expected = MinMaxDetector(1.5, 2.5).predict(expected_stds)
+    np.testing.assert_array_equal(MovingStdDetector(50, 1.5, 2.5).predict(X), expected)
+
+
+def test_rolling_statistics_detector_matches_pandas():
+    X = make_signals(with_gaps=True)
+    checks = [
+        RollingCheck(rolling.Statistics.STD, window_size=50, min=1.5, max=2.5),
+        RollingCheck(rolling.Statistics.MAX, window_size=200, max=110.0),
+    ]
+    expected = np.zeros(X.shape, dtype=int)
+    for feature in range(X.shape[1]):
+        window = pd.Series(X[:, feature]).rolling(50)
+        stds = window.std().values
+        maxes = pd.Series(X[:, feature]).rolling(200).max().values
+        expected[:, feature] = (stds < 1.5) | (stds > 2.5) | (maxes > 110.0)
+    np.testing.assert_array_equal(RollingStatisticsDetector(checks).predict_per_feature(X), expected)
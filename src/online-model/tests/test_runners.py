@@ -0,0 +1,36 @@
+import torch
+from torch import nn
+from torch.utils import data
+
+from cobot_ml.training import runners
+
+
+def _train(patience: int, on_epoch_end, number_of_epochs: int = 10):
+    torch.manual_seed(0)
+    dataset = data.TensorDataset(torch.randn(32, 4), torch.randn(32, 1))
+    model = nn.Linear(4, 1)
+    # zero learning rate, so that validation loss never improves after the first epoch
+    return runners.run_training(
+        model, nn.MSELoss(), torch.optim.SGD(model.parameters(), lr=0.0),
+        data.DataLoader(dataset, batch_size=8), data.DataLoader(dataset, batch_size=8),
+        number_of_epochs=number_of_epochs, patience=patience, on_epoch_end=on_epoch_end,
+    )
+
+
+def test_on_epoch_end_sees_early_stopped_epoch():
+    seen = []
+    _, train_logs = _train(patience=2, on_epoch_end=lambda epoch, logs: seen.append(epoch))
+    assert seen == [0, 1, 2]
+    assert len(train_logs["valid_loss"]) == 3
+
+
+def test_on_epoch_end_stops_training():
+    seen = []
+
+    def on_epoch_end(epoch, logs):
+        seen.append(epoch)
+        return epoch == 1
+
+    _, train_logs = _train(patience=10, on_epoch_end=on_epoch_end)
+    assert seen == [0, 1]
+    assert len(train_logs["train_loss"]) == 2
@@ -0,0 +1,75 @@
+"""
+Parity of the channels first SCINet tree with vectorized interleaving of even / odd sub-series
+with the original implementation (per node permutes and a Python loop of unsqueezed slices), kept below as reference.
+"""
+import pytest
+import torch
+
+from cobot_ml import models
+from cobot_ml.SCINet import SCINet_Tree
+
+
+def reference_zip_up_the_pants(even, odd):
+    even = even.permute(1, 0, 2)
+    odd = odd.permute(1, 0, 2)  # L, B, D
+    even_len = even.shape[0]
+    odd_len = odd.shape[0]
+    mlen = min((odd_len, even_len))
+    _ = []
+    for i in range(mlen):
+        _.append(even[i].unsqueeze(0))
+        _.append(odd[i].unsqueeze(0))
+    if odd_len < even_len:
+        _.append(even[-1].unsqueeze(0))
+    return torch.cat(_, 0).permute(1, 0, 2)  # B, L, D
+
+
+def reference_tree_forward(tree: SCINet_Tree, x):
+    """
+    Forward pass of the tree as originally implemented, on B, T, D input.
+    """
+    interactor = tree.workingblock.interact.level
+    x_even = x[:, ::2, :].permute(0, 2, 1)
+    x_odd = x[:, 1::2, :].permute(0, 2, 1)
+    if interactor.modified:
+        d = x_odd.mul(torch.exp(interactor.phi(x_even)))
+        c = x_even.mul(torch.exp(interactor.psi(x_odd)))
+        x_even_update, x_odd_update = c + interactor.U(d), d - interactor.P(c)
+    else:
+        d = x_odd - interactor.P(x_even)
+        x_even_update, x_odd_update = x_even + interactor.U(d), d
+    x_even_update, x_odd_update = x_even_update.permute(0, 2, 1), x_odd_update.permute(0, 2, 1)
+    if tree.current_level == 0:
+        return reference_zip_up_the_pants(x_even_update, x_odd_update)
+    return reference_zip_up_the_pants(
+        reference_tree_forward(tree.SCINet_Tree_even, x_even_update),
+        reference_tree_forward(tree.SCINet_Tree_odd, x_odd_update),
+    )
+
+
+def use_reference_tree(model):
+    encoder = model.scinet.blocks1
+    encoder.forward = lambda x: reference_tree_forward(encoder.SCINet_Tree, x)
+
+
+@pytest.mark.parametrize("even_len, odd_len", [(1, 1), (5, 5), (6, 5), (1, 0)])
+def test_zip_up_the_pants_matches_reference(even_len, odd_len):
+    torch.manual_seed(0)
+    tree = SCINet_Tree(in_planes=3, current_level=0, kernel_size=5, dropout=0.0, groups=1, hidden_size=1, INN=True)
+    even, odd = torch.randn(4, even_len, 3), torch.randn(4, odd_len, 3)
+    zipped = tree.zip_up_the_pants(even.permute(0, 2, 1), odd.permute(0, 2, 1)).permute(0, 2, 1)
+    assert torch.equal(zipped, reference_zip_up_the_pants(even, odd))
+
+
+@pytest.mark.parametrize("model_class", [models.SCINet, models.SCINet2])
+@pytest.mark.parametrize("window_length, batch_size", [(16, 1), (64, 8)])
+def test_forward_matches_reference(model_class, window_length, batch_size):
+    torch.manual_seed(0)
+    features_count, forecast_length = 6, 4
+    model = model_class(features_count, forecast_length, window_length).eval()
+    reference = model_class(features_count, forecast_length, window_length).eval()
+    reference.load_state_dict(model.state_dict())
+    use_reference_tree(reference)
+    x = torch.randn(batch_size, window_length, features_count)
+    with torch.no_grad():
+        assert torch.allclose(model(x), reference(x), atol=1e-6)
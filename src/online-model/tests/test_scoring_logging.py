@@ -0,0 +1,90 @@
+import io
+import json
+import logging
+import logging.handlers
+import time
+
+import numpy as np
+import pytest
+
+from cobot_ml import scoring_logging
+
+
+class _SlowStream(io.StringIO):
+    def write(self, text):
+        time.sleep(0.01)
+        return super().write(text)
+
+
+@pytest.fixture
+def configure():
+    configured = []
+
+    def _configure(**kwargs):
+        configured.append(scoring_logging.configure(**kwargs))
+        return configured[-1]
+
+    yield _configure
+    for scoring_log in configured:
+        scoring_log.close()
+
+
+def test_payloads_are_logged_as_they_were_when_logged(configure):
+    stream = io.StringIO()
+    scoring_log = configure(stream=stream)
+    payload = {"record": [{"data": "[1, 2]"}]}
+    window = np.zeros(3)
+    scoring_log.logger.info("Received raw data: %s, input data: %s", payload, window)
+    payload["record"].clear()
+    window[:] = 7
+    scoring_log.close()
+    assert "Received raw data: {'record': [{'data': '[1, 2]'}]}, input data: [0. 0. 0.]" in stream.getvalue()
+
+
+def test_json_format_writes_one_object_per_record(configure):
+    stream = io.StringIO()
+    scoring_log = configure(format=scoring_logging.LogFormats.JSON, stream=stream)
+    scoring_log.logger.info("Record %d", 1)
+    try:
+        raise RuntimeError("failed")
+    except RuntimeError:
+        scoring_log.logger.exception("Request failed")
+    scoring_log.close()
+    entries = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [entry["message"] for entry in entries] == ["Record 1", "Request failed"]
+    assert entries[0]["level"] == "INFO"
+    assert "RuntimeError: failed" in entries[1]["exception"]
+
+
+def test_full_queue_drops_records_and_close_writes_the_rest(configure):
+    stream = _SlowStream()
+    scoring_log = configure(queue_size=4, stream=stream)
+    for idx in range(100):
+        scoring_log.logger.info("Record %d", idx)
+    scoring_log.close()
+    scoring_log.close()
+    assert 0 < scoring_log.dropped < 100
+    assert len(stream.getvalue().splitlines()) == 100 - scoring_log.dropped
+
+
+def test_level_and_sample_rate(configure):
+    stream = io.StringIO()
+    scoring_log = configure(level="WARNING", sample_rate=0.0, stream=stream)
+    scoring_log.logger.info("Hidden")
+    scoring_log.logger.warning("Shown")
+    assert not any(scoring_log.should_log_payloads() for _ in range(1000))
+    scoring_log.close()
+    assert stream.getvalue().splitlines()[0].endswith("WARNING cobot_ml.scoring: Shown")
+    assert configure(sample_rate=1.0, stream=io.StringIO()).should_log_payloads()
+
+
+def test_reconfiguring_replaces_handler(configure):
+    configure(stream=io.StringIO())
+    configure(stream=io.StringIO())
+    handlers = logging.getLogger(scoring_logging.LOGGER_NAME).handlers
+    assert sum(isinstance(handler, logging.handlers.QueueHandler) for handler in handlers) == 1
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        scoring_logging.ScoringLogging(format="xml")
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from cobot_ml.evaluation import forecasting_metrics
+from cobot_ml.evaluation.streaming_metrics import KeyedStreamingMetrics, QuantileSketch, StreamingForecastMetrics
+
+EXACT_METRICS = ("me", "mae", "mse", "rmse", "mpe", "mape", "smape", "mase")
+APPROXIMATE_METRICS = ("mdae", "mdape")
+
+
+def make_series(samples_count: int = 2001, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    actual = 331 + 74 * np.sin(np.arange(samples_count) / 50) + rng.normal(0, 5, samples_count)
+    predicted = actual + rng.normal(0, 8, samples_count)
+    return actual, predicted
+
+
+def streamed(actual, predicted, chunk_size: int, **kwargs) -> StreamingForecastMetrics:
+    accumulator = StreamingForecastMetrics(**kwargs)
+    for start in range(0, len(actual), chunk_size):
+        accumulator.update(actual[start: start + chunk_size], predicted[start: start + chunk_size])
+    return accumulator
+
+
+def assert_matches_evaluate(snapshot, actual, predicted, seasonality: int = 1, relative_accuracy: float = 0.01):
+    expected = forecasting_metrics.evaluate(actual, predicted, metrics=EXACT_METRICS + APPROXIMATE_METRICS)
+    expected["mase"] = forecasting_metrics.mase(actual, predicted, seasonality)
+    assert snapshot["count"] == len(actual)
+    for name in EXACT_METRICS:
+        assert snapshot[name] == pytest.approx(expected[name], rel=1e-9), name
+    for name in APPROXIMATE_METRICS:
+        assert snapshot[name] == pytest.approx(expected[name], rel=relative_accuracy), name
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 500, 5000])
+@pytest.mark.parametrize("seasonality", [1, 3])
+def test_snapshot_matches_evaluate(chunk_size, seasonality):
+    actual, predicted = make_series()
+    snapshot = streamed(actual, predicted, chunk_size, seasonality=seasonality).snapshot()
+    assert_matches_evaluate(snapshot, actual, predicted, seasonality)
+    assert snapshot["non_finite_count"] == 0
+
+
+@pytest.mark.parametrize("seasonality", [1, 3])
+def test_non_finite_pairs_are_skipped_and_counted(seasonality):
+    actual, predicted = make_series()
+    actual[[0, 10, 11, 499, 500, 1500]] = np.nan
+    predicted[[10, 20, 700]] = np.nan
+    actual[30] = np.inf
+    predicted[40] = -np.inf
+    finite = np.isfinite(actual) & np.isfinite(predicted)
+
+    snapshot = streamed(actual, predicted, 500, seasonality=seasonality).snapshot()
+    assert snapshot["non_finite_count"] == 10
+    assert_matches_evaluate(snapshot, actual[finite], predicted[finite], seasonality)
+
+
+def test_only_non_finite_values():
+    accumulator = StreamingForecastMetrics()
+    accumulator.update(np.full(3, np.nan), np.ones(3))
+    assert accumulator.snapshot() == {"count": 0, "non_finite_count": 3}
+    actual, predicted = make_series(101)
+    accumulator.update(actual, predicted)
+    assert_matches_evaluate(accumulator.snapshot(), actual, predicted)
+
+
+def test_merge_matches_evaluate_of_concatenated_series():
+    chunks = [make_series(samples_count, seed) for seed, samples_count in enumerate((301, 500, 1200))]
+    chunks[1][0][5] = np.nan
+    keyed = KeyedStreamingMetrics()
+    for agv_id, (actual, predicted) in enumerate(chunks):
+        keyed.update(agv_id, actual, predicted)
+    total = keyed.total()
+
+    actual = np.concatenate([actual for actual, _ in chunks])
+    predicted = np.concatenate([predicted for _, predicted in chunks])
+    finite = np.isfinite(actual)
+    assert total["non_finite_count"] == 1
+    assert total["count"] == finite.sum()
+    for name in ("me", "mae", "mse", "rmse", "mpe", "mape", "smape"):
+        assert total[name] == pytest.approx(forecasting_metrics.METRICS[name](actual[finite], predicted[finite]))
+    assert total["mdae"] == pytest.approx(forecasting_metrics.mdae(actual[finite], predicted[finite]), rel=0.01)
+    # naive benchmark is not continued across series of different AGVs
+    naive_errors = np.concatenate([np.abs(np.diff(actual[np.isfinite(actual)])) for actual, _ in chunks])
+    assert total["mase"] == pytest.approx(total["mae"] / naive_errors.mean())
+
+
+def test_quantile_sketch_skips_non_finite_values():
+    sketch = QuantileSketch()
+    sketch.update(np.array([np.nan, 0.0, 1.0, 2.0, np.inf, 3.0, -np.inf]))
+    assert sketch.count == 4
+    assert sketch.zero_count == 1
+    assert sketch.quantile(1.0) == pytest.approx(3.0, rel=0.01)
+
+
+def test_quantile_sketch_merge():
+    values = np.random.default_rng(0).exponential(size=10001)
+    merged, other = QuantileSketch(), QuantileSketch()
+    merged.update(values[:3000])
+    other.update(values[3000:])
+    merged.merge(other)
+    assert merged.count == len(values)
+    for q in (0.1, 0.5, 0.9):
+        assert merged.quantile(q) == pytest.approx(np.quantile(values, q), rel=0.01)
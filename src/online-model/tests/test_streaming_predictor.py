@@ -0,0 +1,129 @@
+import numpy as np
+import pytest
+import torch
+
+from cobot_ml import models
+from cobot_ml.inference_utilities import StepByStepPredictor, StreamingPredictor, WindowEncodings, encode_window
+
+FEATURES_COUNT = 3
+HISTORY_LENGTH = 5
+
+
+@pytest.fixture
+def predictor(tmp_path, monkeypatch):
+    monkeypatch.setenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", "1")
+    torch.manual_seed(0)
+    model_file = str(tmp_path / "model.pt")
+    torch.save(models.LSTM(features_count=FEATURES_COUNT, forecast_length=2, n_layers=1), model_file)
+    # row-wise preprocessing, as applied by StreamingPredictor to new samples only
+    return StepByStepPredictor(model_file, "cpu", [f"f{idx}" for idx in range(FEATURES_COUNT)],
+                               lambda x: (x - 1.0) * 2.0)
+
+
+@pytest.fixture
+def streaming_predictor(predictor):
+    streaming_predictor = StreamingPredictor(predictor, history_length=HISTORY_LENGTH)
+    for agv_id in ("agv_1", "agv_2"):
+        streaming_predictor.update(agv_id, np.arange(HISTORY_LENGTH, dtype=float), np.ones((HISTORY_LENGTH, 3)))
+    return streaming_predictor
+
+
+def test_failed_record_without_agv_id_keeps_other_histories(streaming_predictor):
+    outputs = streaming_predictor.step_records([{"ts": [6.0], "data": "not json"}])
+    assert outputs == [None]
+    assert sorted(streaming_predictor._states) == ["agv_1", "agv_2"]
+
+
+def test_failed_record_drops_only_its_agv_history(streaming_predictor):
+    outputs = streaming_predictor.step_records([{"agv_id": "agv_1", "ts": [6.0], "data": "not json"}])
+    assert outputs == [None]
+    assert sorted(streaming_predictor._states) == ["agv_2"]
+
+
+def test_empty_update_returns_none(streaming_predictor):
+    assert streaming_predictor.update("agv_1", [], np.zeros((0, FEATURES_COUNT))) is None
+    record = {"agv_id": "agv_1", "ts": [], "data": encode_window(np.zeros((0, FEATURES_COUNT)), WindowEncodings.JSON)}
+    assert streaming_predictor.step_records([record]) == [None]
+    assert sorted(streaming_predictor._states) == ["agv_1", "agv_2"]
+
+
+def make_stream(samples_count: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    return np.arange(samples_count, dtype=float), rng.normal(size=(samples_count, FEATURES_COUNT)).astype(np.float32)
+
+
+def feed(streaming_predictor, agv_id, timestamps, samples, chunk_sizes):
+    """ Yields end of the stream after each chunk and the returned prediction """
+    end = 0
+    for chunk_size in chunk_sizes:
+        output = streaming_predictor.update(agv_id, timestamps[end: end + chunk_size], samples[end: end + chunk_size])
+        end += chunk_size
+        yield end, output
+
+
+def test_sliding_window_equals_full_window_predictions(predictor):
+    streaming_predictor = StreamingPredictor(predictor, history_length=HISTORY_LENGTH)
+    chunk_sizes = [2, 2, 1, 1, 3, 4, 1, 7, 2, 1, 1, 1, 4]
+    timestamps, samples = make_stream(sum(chunk_sizes))
+    for end, output in feed(streaming_predictor, "agv", timestamps, samples, chunk_sizes):
+        if end < HISTORY_LENGTH:
+            assert output is None
+            continue
+        expected = predictor.step(samples[np.newaxis, end - HISTORY_LENGTH: end])[0]
+        np.testing.assert_allclose(output, expected, rtol=1e-5, atol=1e-6)
+
+
+def test_gap_drops_history(streaming_predictor):
+    # agv_1 has samples at 0-4 s
+    assert streaming_predictor.update("agv_1", [5.0], np.ones((1, FEATURES_COUNT))) is not None
+    assert streaming_predictor.update("agv_1", [7.0], np.ones((1, FEATURES_COUNT))) is None
+    assert streaming_predictor.update("agv_1", [6.5], np.ones((1, FEATURES_COUNT))) is None
+    timestamps = np.arange(7.5, 7.5 + HISTORY_LENGTH - 2)
+    assert streaming_predictor.update("agv_1", timestamps, np.ones((len(timestamps), FEATURES_COUNT))) is None
+    assert streaming_predictor.update("agv_1", [timestamps[-1] + 1], np.ones((1, FEATURES_COUNT))) is not None
+    # other AGVs are not affected
+    assert streaming_predictor.update("agv_2", [5.0], np.ones((1, FEATURES_COUNT))) is not None
+
+
+def test_gap_within_update_keeps_newest_consecutive_samples(streaming_predictor):
+    timestamps, samples = make_stream(HISTORY_LENGTH + 3)
+    timestamps[3:] += 10
+    output = streaming_predictor.update("agv_1", timestamps, samples)
+    expected = streaming_predictor.predictor.step(samples[np.newaxis, 3:])[0]
+    np.testing.assert_allclose(output, expected, rtol=1e-5, atol=1e-6)
+    assert streaming_predictor.update("agv_2", timestamps[:4] + 100, samples[:4]) is None
+
+
+def test_carry_state_continues_the_recurrent_state(predictor):
+    streaming_predictor = StreamingPredictor(predictor, history_length=HISTORY_LENGTH, carry_state=True,
+                                             resync_every=1000)
+    chunk_sizes = [HISTORY_LENGTH, 1, 2, 1, 3, 1]
+    timestamps, samples = make_stream(sum(chunk_sizes))
+    for end, output in feed(streaming_predictor, "agv", timestamps, samples, chunk_sizes):
+        # the network has seen every sample since the first full window
+        expected = predictor.step(samples[np.newaxis, :end])[0]
+        np.testing.assert_allclose(output, expected, rtol=1e-5, atol=1e-6)
+
+
+def test_carry_state_resyncs_to_the_window(predictor):
+    resync_every = 2
+    streaming_predictor = StreamingPredictor(predictor, history_length=HISTORY_LENGTH, carry_state=True,
+                                             resync_every=resync_every)
+    chunk_sizes = [HISTORY_LENGTH] + [1] * 7
+    timestamps, samples = make_stream(sum(chunk_sizes))
+    for update_index, (end, output) in enumerate(feed(streaming_predictor, "agv", timestamps, samples, chunk_sizes)):
+        window = predictor.step(samples[np.newaxis, end - HISTORY_LENGTH: end])[0]
+        if update_index % (resync_every + 1) == 0:
+            np.testing.assert_allclose(output, window, rtol=1e-5, atol=1e-6)
+        else:
+            assert not np.allclose(output, window, rtol=1e-5, atol=1e-6)
+
+
+def test_carry_state_requires_unidirectional_recurrent_model(tmp_path, monkeypatch):
+    monkeypatch.setenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", "1")
+    model_file = str(tmp_path / "bilstm.pt")
+    torch.save(models.BiLSTM(features_count=FEATURES_COUNT, forecast_length=2, n_layers=1), model_file)
+    predictor = StepByStepPredictor(model_file, "cpu", [f"f{idx}" for idx in range(FEATURES_COUNT)], lambda x: x)
+    with pytest.raises(ValueError):
+        StreamingPredictor(predictor, history_length=HISTORY_LENGTH, carry_state=True)
+    StreamingPredictor(predictor, history_length=HISTORY_LENGTH)
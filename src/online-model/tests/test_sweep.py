@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+
+from cobot_ml import models
+from cobot_ml.data.utilities import DsMode
+from cobot_ml.training import sweep
+from cobot_ml.training.backtesting import TrainingConfig
+
+
+@pytest.fixture
+def store(tmp_path):
+    return sweep.SweepStore(str(tmp_path / "sweeps.sqlite"))
+
+
+def _values(samples_count: int = 300) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    time_steps = np.arange(samples_count)
+    return np.column_stack([np.sin(time_steps / 10), rng.normal(size=(samples_count, 2))]).astype(np.float32)
+
+
+def _add_trial_with_losses(store, sweep_name, losses):
+    trial_id = store.add_trial(sweep_name, {"model": "LSTM"})
+    for epoch, loss in enumerate(losses):
+        store.record_epoch(trial_id, epoch, loss, loss)
+    return trial_id
+
+
+def test_trial_names_include_swept_parameters():
+    model = models.LSTM(features_count=3, n_layers=2, forecast_length=10)
+    params = {"model": "LSTM", "n_layers": 2, "forecast": 10, "input_length": 50}
+    assert sweep.trial_name(model, params) == "model=LSTM,layers=2,forecast=10,input_length=50"
+    names = {
+        sweep.trial_name(model, {**params, **optional})
+        for optional in ({"hidden_size": 8}, {"hidden_size": 32}, {"dropout_rate": 0.1}, {"learning_rate": 0.01})
+    }
+    assert len(names) == 4
+
+
+def test_store_results_best_first(store):
+    worse = _add_trial_with_losses(store, "sweep", [3.0, 2.0])
+    better = _add_trial_with_losses(store, "sweep", [1.0, 0.5])
+    unfinished = _add_trial_with_losses(store, "sweep", [0.1])
+    _add_trial_with_losses(store, "other", [0.01])
+    store.finish_trial(worse, status=sweep.TrialStatus.COMPLETED, best_valid_loss=2.0)
+    store.finish_trial(better, status=sweep.TrialStatus.COMPLETED, best_valid_loss=0.5)
+    assert [result["id"] for result in store.results("sweep")] == [better, worse, unfinished]
+    assert store.results("sweep")[0]["params"] == {"model": "LSTM"}
+
+
+def test_best_losses_at_epoch_of_other_trials(store):
+    first = _add_trial_with_losses(store, "sweep", [3.0, 1.0, 2.0])
+    _add_trial_with_losses(store, "sweep", [4.0, 5.0])
+    _add_trial_with_losses(store, "sweep", [0.5])
+    assert sorted(store.best_losses_at("sweep", 1, exclude_trial_id=-1)) == [1.0, 4.0]
+    assert store.best_losses_at("sweep", 2, exclude_trial_id=first) == []
+
+
+def test_median_stopping_rule(store):
+    for losses in ([1.0, 0.8, 0.6], [2.0, 1.5, 1.0], [3.0, 2.5, 2.0]):
+        _add_trial_with_losses(store, "sweep", losses)
+    trial_id = _add_trial_with_losses(store, "sweep", [])
+    rule = sweep.MedianStoppingRule(min_epochs=1, min_trials=3)
+    assert not rule.should_prune(store, "sweep", trial_id, 0, 100.0)
+    assert rule.should_prune(store, "sweep", trial_id, 2, 1.1)
+    assert not rule.should_prune(store, "sweep", trial_id, 2, 0.9)
+    assert not sweep.MedianStoppingRule(min_epochs=1, min_trials=4).should_prune(store, "sweep", trial_id, 2, 1.1)
+
+
+def test_run_sweep_records_trials_and_saves_distinct_models(store, tmp_path, monkeypatch):
+    monkeypatch.setenv("TORCH_FORCE_NO_WEIGHTS_ONLY_LOAD", "1")
+    trials = sweep.grid(model=["LSTM", "GRU"], n_layers=[1], hidden_size=[4, 8], forecast=[2], input_length=[5])
+    model_dir = str(tmp_path / "models")
+    os.makedirs(model_dir)
+    results = sweep.run_sweep(
+        "test", _values(), trials, store, DsMode.WITH_MPC, TrainingConfig(number_of_epochs=2, patience=2),
+        stopping_rule=None, max_workers=1, model_dir=model_dir,
+    )
+    assert len(results) == len(trials)
+    assert all(result["status"] == sweep.TrialStatus.COMPLETED for result in results)
+    assert len({result["name"] for result in results}) == len(trials)
+    assert sorted(os.listdir(model_dir)) == sorted(f"{result['name']}.pt" for result in results)
+    losses = [result["best_valid_loss"] for result in results]
+    assert losses == sorted(losses)
+    assert len(store.best_losses_at("test", 1, exclude_trial_id=-1)) == len(trials)
+    for result in results:
+        model = torch.load(result["model_file"])
+        assert model.rnn.hidden_size == result["params"]["hidden_size"]
+
+
+def test_run_sweep_prunes_losing_trials(store):
+    trials = sweep.grid(model=["LSTM"], n_layers=[1], hidden_size=[2, 4, 8, 16], learning_rate=[1e-6, 1e-2],
+                        forecast=[2], input_length=[5])
+    results = sweep.run_sweep(
+        "test", _values(), trials, store, DsMode.WITH_MPC, TrainingConfig(number_of_epochs=4, patience=4),
+        stopping_rule=sweep.MedianStoppingRule(min_epochs=1, min_trials=2), max_workers=1,
+    )
+    pruned = [result for result in results if result["status"] == sweep.TrialStatus.PRUNED]
+    assert pruned
+    assert all(result["epoch_count"] < 3 for result in pruned)
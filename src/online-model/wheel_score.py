@@ -1,5 +1,6 @@
 # 20240310_wheel_problems_july_august_2023.py
 
+import logging
 import os
 from typing import List, Callable
 import json
@@ -9,6 +10,11 @@ from inference_schema.parameter_types.standard_py_parameter_type import Standard
 import joblib
 import numpy as np
 
+from cobot_ml.instrumentation import METRICS, Counters, Stages, metrics_from_env
+from cobot_ml.scoring_logging import LOGGER_NAME, logging_from_env
+
+logger = logging.getLogger(LOGGER_NAME)
+
 class Preprocessor:
     def __init__(self, preprocessing_path):
         self.scaler = joblib.load(preprocessing_path)
@@ -32,8 +38,8 @@ class ClassifierStepByStepPredictor:
         self.preprocessing = preprocessing
         self.feature_count = len(columns)
 
-        print(f"Model loaded from {model_file}.")
-        print(f"Feature count: {self.feature_count}.")
+        logger.info("Model loaded from %s.", model_file)
+        logger.info("Feature count: %d.", self.feature_count)
 
     def get_columns(self):
         """
@@ -54,8 +60,12 @@ class ClassifierStepByStepPredictor:
         assert F == self.feature_count, f"Expected {self.feature_count} features, got {F}."
         assert D == 1, f"No history expected here, got {D} elements of history."
 
-        preprocessed_data = self.preprocessing(input_data)
-        output = self.model.predict(preprocessed_data.reshape(N, F))
+        with METRICS.stage(Stages.PREPROCESSING):
+            preprocessed_data = self.preprocessing(input_data)
+        with METRICS.stage(Stages.FORWARD):
+            output = self.model.predict(preprocessed_data.reshape(N, F))
+        METRICS.increment(Counters.BATCHES)
+        METRICS.increment(Counters.WINDOWS, N)
         return output
 
 
@@ -66,15 +76,17 @@ selected_columns = [
 
 
 def init():
-    global model_wrapper
+    global model_wrapper, request_logging
+    request_logging = logging_from_env()
     preprocessing_file_path = os.path.join(str(os.getenv("AZUREML_MODEL_DIR")), "model/20240310_wheel_problems_july_august_2023.scaler.dump")
     preprocess = Preprocessor(preprocessing_file_path)
     preprocessing = preprocess.preprocessing
 
     model_file_path = os.path.join(str(os.getenv("AZUREML_MODEL_DIR")), "model/20240310_wheel_problems_july_august_2023.RF.dump")
     model_wrapper = ClassifierStepByStepPredictor(model_file_path, selected_columns, preprocessing)
+    metrics_from_env()
 
-    print("Init completed")
+    logger.info("Init completed")
 
 standard_sample_input = StandardPythonParameterType({
     'nn_diff_heading_avg_correction': 1.0,
@@ -89,17 +101,32 @@ sample_output = StandardPythonParameterType([1.0])
 @input_schema('Inputs', sample_input)
 @output_schema(sample_output)
 def run(Inputs):
-    print("Received request")
-    print("Received raw data")
-    print(Inputs)
-    input_data = np.zeros((1, 1, 2))
-    input_data[0] = np.array([[Inputs["record"][0]["nn_diff_heading_avg_correction"], Inputs["record"][0]["nn_distance_avg_correction"]]])
-
-    print("Input data")
-    print(input_data)
+    METRICS.increment(Counters.REQUESTS)
+    METRICS.increment(Counters.RECORDS, len(Inputs["record"]))
+    with METRICS.stage(Stages.REQUEST):
+        log_payloads = request_logging.should_log_payloads()
+        logger.debug("Received request")
+        if log_payloads:
+            logger.info("Received raw data: %s", Inputs)
+        try:
+            return predict(Inputs, log_payloads)
+        except Exception:
+            logger.exception("Request failed, raw data: %s", Inputs)
+            raise
+
+
+def predict(Inputs, log_payloads: bool):
+    with METRICS.stage(Stages.ARRAY_BUILD):
+        input_data = np.zeros((1, 1, 2))
+        input_data[0] = np.array([[Inputs["record"][0]["nn_diff_heading_avg_correction"], Inputs["record"][0]["nn_distance_avg_correction"]]])
+
+    if log_payloads:
+        logger.info("Input data: %s", input_data)
     output_data = model_wrapper.step(input_data)
-    print(output_data[0])
-    print("Finished")
-    return output_data.tolist()
+    if log_payloads:
+        logger.info("Output data: %s", output_data[0])
+    logger.debug("Finished")
+    with METRICS.stage(Stages.POSTPROCESSING):
+        return output_data.tolist()
 
 